@@ -0,0 +1,407 @@
+"""Benchmark the PCX tools against synthetic exports
+
+Usage::
+
+    python -m benchmarks.run --size 10 --size 100
+    python -m benchmarks.run --size 1024 --only scan --only insert_fast
+    python -m benchmarks.run --size 100 --compare old_results.json
+
+Each benchmark runs in a fresh process so its peak RSS is its own.
+Results go to a JSON file (data/generated/ by default) with seconds,
+MB/s, blocks/s and peak RSS per benchmark and export size.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, TypedDict
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import SyntheticExport, SyntheticSpec
+
+RESULTS_VERSION = 1
+
+# The in-memory parser keeps every line; skip it for larger exports
+IN_MEMORY_MAX_MB = 512
+
+# A benchmark is reported as a regression when it loses this much MB/s
+REGRESSION_THRESHOLD = 0.10
+
+# (bytes processed, blocks processed)
+Work = Tuple[int, int]
+
+
+class BenchmarkResult(TypedDict, total=False):
+    """One benchmark run against one export, as saved to JSON"""
+    benchmark: str
+    seconds: float
+    bytes: int
+    blocks: int
+    mb_per_s: float
+    blocks_per_s: float
+    peak_rss_mb: Optional[float]
+    # Shape of the export, added by run_benchmarks
+    size_mb: int
+    rulesets: int
+    companies: int
+
+
+# Benchmarks get the export, a scratch directory and the export's block
+# count, which the parent process works out once per export
+
+
+def bench_parse(export: Path, scratch: Path, blocks: int) -> Work:
+    """PCXSchemaManager streaming parse"""
+    from utils.pcx_schema import PCXSchemaManager
+    PCXSchemaManager(export, streaming=True)
+    return export.stat().st_size, blocks
+
+
+def bench_parse_memory(export: Path, scratch: Path, blocks: int) -> Work:
+    """PCXSchemaManager in-memory parse"""
+    from utils.pcx_schema import PCXSchemaManager
+    PCXSchemaManager(export)
+    return export.stat().st_size, blocks
+
+
+def bench_validate(export: Path, scratch: Path, blocks: int) -> Work:
+    """PCXValidator serial streaming validation, every issue consumed"""
+    from utils.pcx_validator import PCXValidator
+    for _ in PCXValidator.iter_issues(export):
+        pass
+    return export.stat().st_size, blocks
+
+
+def bench_validate_parallel(
+    export: Path, scratch: Path, blocks: int
+) -> Work:
+    """PCXValidator process-pool validation"""
+    from utils.pcx_validator import PCXValidator
+    PCXValidator.validate_file(export, parallel=True)
+    return export.stat().st_size, blocks
+
+
+def bench_scan(export: Path, scratch: Path, blocks: int) -> Work:
+    """Cold block index build - the mmap scan behind every fast path"""
+    from utils.pcx_index import PCXBlockIndex
+    copy = _scratch_copy(export, scratch)
+    index = PCXBlockIndex(copy)
+    index.build()
+    return copy.stat().st_size, len(index.entries)
+
+
+def bench_find_sections(export: Path, scratch: Path, blocks: int) -> Work:
+    """FastPCXEditor section lookup from a saved index"""
+    from utils.fast_pcx_editor import FastPCXEditor
+    # The parent saved the sidecar index when counting blocks
+    editor = FastPCXEditor(export)
+    for section in ('DESTINATION', 'RULESET', 'RULE'):
+        editor.find_section_positions(section)
+    return export.stat().st_size, blocks
+
+
+def bench_insert_fast(export: Path, scratch: Path, blocks: int) -> Work:
+    """FastPCXEditor.insert_rules_fast, including its backup"""
+    from templates.tax_report import TaxReportTemplate
+    from utils.backup_store import BackupStore
+    from utils.fast_pcx_editor import FastPCXEditor
+    copy = _scratch_copy(export, scratch)
+    rules = TaxReportTemplate().generate_consolidated(['999'], ['TAX001'])
+    editor = FastPCXEditor(copy, BackupStore(scratch / 'backups'))
+    with redirect_stdout(io.StringIO()):
+        editor.insert_rules_fast(rules)
+    return copy.stat().st_size, blocks
+
+
+def bench_insert_large(export: Path, scratch: Path, blocks: int) -> Work:
+    """LargePCXFileHandler insertion point lookup and insert"""
+    from templates.destination import DestinationTemplate
+    from utils.large_file_handler import LargePCXFileHandler
+    copy = _scratch_copy(export, scratch)
+    content = DestinationTemplate().generate_folder('RPT999', 'JOB', '9999')
+    handler = LargePCXFileHandler(copy)
+    with redirect_stdout(io.StringIO()):
+        position = handler.find_insertion_point('DESTINATION')
+        handler.append_content(content, at_position=position)
+    return copy.stat().st_size, blocks
+
+
+def bench_generate_rules(export: Path, scratch: Path, blocks: int) -> Work:
+    """Rule and destination templates streamed to disk"""
+    from templates.compiler import BlockWriter
+    from templates.destination import DestinationTemplate
+    from templates.rule import RuleTemplate
+    rules = RuleTemplate()
+    destinations = DestinationTemplate()
+    target_bytes = export.stat().st_size
+    output = scratch / 'generated_rules.txt'
+    written = 0
+
+    with open(output, 'w', encoding='utf-8', buffering=1024 * 1024) as f:
+        with BlockWriter(f) as writer:
+            store = 1000
+            while f.tell() < target_bytes:
+                number = str(store)
+                destinations.write_folder(writer, 'RPT', 'PBKOC01R', number)
+                rules.write_commitment_rule(
+                    writer, 'RPT', 'PBKOC01R', number, '&RPT_X', 'OPW2'
+                )
+                written += 2
+                store += 1
+    return output.stat().st_size, written
+
+
+def bench_generate_consolidated(
+    export: Path, scratch: Path, blocks: int
+) -> Work:
+    """TaxReportTemplate.write_consolidated, sharded across processes"""
+    from templates.tax_report import TaxReportTemplate
+    template = TaxReportTemplate()
+    reports = list(TaxReportTemplate.TAX_REPORT_JOBS)
+    per_company = len(template.generate_consolidated(['100'], reports))
+    count = max(1, export.stat().st_size // per_company)
+    companies = [str(100 + n) for n in range(count)]
+    output = scratch / 'generated_consolidated.txt'
+
+    with open(output, 'w', encoding='utf-8', buffering=1024 * 1024) as f:
+        rules = template.write_consolidated(f, companies, reports)
+    return output.stat().st_size, rules
+
+
+BENCHMARKS: Dict[str, Callable[[Path, Path, int], Work]] = {
+    'parse': bench_parse,
+    'parse_memory': bench_parse_memory,
+    'validate': bench_validate,
+    'validate_parallel': bench_validate_parallel,
+    'scan': bench_scan,
+    'find_sections': bench_find_sections,
+    'insert_fast': bench_insert_fast,
+    'insert_large': bench_insert_large,
+    'generate_rules': bench_generate_rules,
+    'generate_consolidated': bench_generate_consolidated,
+}
+
+# Seconds to leave out of the timing (setup done inside a benchmark)
+_EXCLUDED = [0.0]
+
+
+def _scratch_copy(export: Path, scratch: Path) -> Path:
+    """Private copy of the export, made outside the timed region"""
+    from utils.file_commit import copy_file
+    start = time.perf_counter()
+    copy = scratch / export.name
+    copy_file(export, copy, durable=False)
+    _EXCLUDED[0] += time.perf_counter() - start
+    return copy
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak RSS of this process and its children, if measurable"""
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+    # Linux reports kilobytes, macOS bytes
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / scale, 1)
+
+
+def run_one(
+    name: str, export: Path, scratch: Path, export_blocks: int
+) -> BenchmarkResult:
+    """Run a single benchmark - called in a fresh worker process"""
+    scratch.mkdir(exist_ok=True, parents=True)
+    _EXCLUDED[0] = 0.0
+    try:
+        start = time.perf_counter()
+        size, blocks = BENCHMARKS[name](export, scratch, export_blocks)
+        seconds = time.perf_counter() - start - _EXCLUDED[0]
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    seconds = max(seconds, 1e-9)
+    return {
+        'benchmark': name,
+        'seconds': round(seconds, 4),
+        'bytes': size,
+        'blocks': blocks,
+        'mb_per_s': round(size / (1024 * 1024) / seconds, 2),
+        'blocks_per_s': round(blocks / seconds, 1),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def worker_context() -> multiprocessing.context.BaseContext:
+    """Process context for benchmark workers
+
+    Linux carries a process's peak RSS over fork and exec, so workers
+    are forked from a forkserver started before anything is loaded.
+    Windows falls back to spawn.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def run_benchmarks(
+    specs: List[SyntheticSpec],
+    names: List[str],
+    workdir: Path
+) -> List[BenchmarkResult]:
+    """Run every benchmark against an export for every spec"""
+    from utils.formatters import print_header
+    from utils.pcx_index import PCXBlockIndex
+
+    context = worker_context()
+    results: List[BenchmarkResult] = []
+
+    for spec in specs:
+        print_header(f"{spec.size_mb}MB export")
+        start = time.perf_counter()
+        export = SyntheticExport(spec).ensure(workdir)
+        export_blocks = len(PCXBlockIndex.open(export).entries)
+        print(
+            f"Export ready: {export} ({export_blocks} blocks, "
+            f"{time.perf_counter() - start:.1f}s)"
+        )
+
+        for name in names:
+            if name == 'parse_memory' and spec.size_mb > IN_MEMORY_MAX_MB:
+                print(f"  {name:<22} skipped (> {IN_MEMORY_MAX_MB}MB)")
+                continue
+            scratch = workdir / f"scratch_{os.getpid()}_{name}"
+            with ProcessPoolExecutor(1, mp_context=context) as executor:
+                result = executor.submit(
+                    run_one, name, export, scratch, export_blocks
+                ).result()
+            result['size_mb'] = spec.size_mb
+            result['rulesets'] = spec.rulesets
+            result['companies'] = spec.companies
+            results.append(result)
+            print(
+                f"  {name:<22} {result['seconds']:>9.3f}s "
+                f"{result['mb_per_s']:>9.1f} MB/s "
+                f"{result['blocks_per_s']:>12.0f} blocks/s "
+                f"{result['peak_rss_mb'] or '-':>8} MB RSS"
+            )
+
+    return results
+
+
+def compare(
+    baseline: List[BenchmarkResult], current: List[BenchmarkResult]
+) -> int:
+    """Print MB/s changes against a baseline, returning regressions"""
+    from utils.formatters import print_header, print_warning
+
+    print_header("Comparison")
+    previous = {
+        (r['benchmark'], r['size_mb']): r['mb_per_s'] for r in baseline
+    }
+    regressions = 0
+    for result in current:
+        old = previous.get((result['benchmark'], result['size_mb']))
+        if not old:
+            continue
+        change = (result['mb_per_s'] - old) / old
+        line = (
+            f"{result['benchmark']:<22} {result['size_mb']:>6}MB "
+            f"{old:>9.1f} -> {result['mb_per_s']:>9.1f} MB/s "
+            f"({change:+.1%})"
+        )
+        if change < -REGRESSION_THRESHOLD:
+            regressions += 1
+            print_warning(line)
+        else:
+            print(f"  {line}")
+    return regressions
+
+
+def main() -> None:
+    # Start the forkserver while this process is still small
+    context = worker_context()
+    if context.get_start_method() == 'forkserver':
+        from multiprocessing import forkserver
+        forkserver.ensure_running()
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark PCX tools against synthetic exports'
+    )
+    parser.add_argument(
+        '--size', type=int, action='append', metavar='MB',
+        help='Export size in MB, repeatable (default: 10)'
+    )
+    parser.add_argument(
+        '--only', action='append', choices=sorted(BENCHMARKS),
+        help='Run only this benchmark, repeatable'
+    )
+    parser.add_argument('--rulesets', type=int, default=20)
+    parser.add_argument('--companies', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--workdir', type=Path,
+        default=Path(tempfile.gettempdir()) / 'pcx_benchmarks',
+        help='Where synthetic exports are cached between runs'
+    )
+    parser.add_argument(
+        '--output', '-o', type=Path,
+        help='Results file (default: data/generated/)'
+    )
+    parser.add_argument(
+        '--compare', type=Path, metavar='RESULTS',
+        help='Earlier results file to compare against'
+    )
+    args = parser.parse_args()
+
+    from config.settings import (
+        FILE_NAMING, GENERATED_DIR, PCX_CONFIG, ensure_data_dirs
+    )
+    from utils.formatters import print_success
+
+    specs = [
+        SyntheticSpec(size, args.rulesets, args.companies, args.seed)
+        for size in args.size or [10]
+    ]
+    names = args.only or list(BENCHMARKS)
+    results = run_benchmarks(specs, names, args.workdir)
+
+    if args.output is None:
+        ensure_data_dirs()
+    timestamp = datetime.now().strftime(PCX_CONFIG['date_format'])
+    output = args.output or GENERATED_DIR / FILE_NAMING['benchmark'].format(
+        timestamp=timestamp
+    )
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': RESULTS_VERSION,
+            'created': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'results': results,
+        }, f, indent=2)
+    print_success(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        if compare(baseline, results):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""Synthetic PCX export generator for benchmarks
+
+Exports are built from the real template generators, so block shapes
+match what the tools produce: commitment book printers and folders,
+commitment and company rules with nested RULECOMPONENTs, and a few
+blocks of every other section from PRINTSERVER through VARIABLE.
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List
+import io
+import random
+
+from config.mappings import COMMITMENT_BOOKS
+from templates.compiler import BlockWriter, compile_block
+from templates.destination import DestinationTemplate
+from templates.rule import RuleTemplate
+from templates.tax_report import TaxReportTemplate
+
+# Blocks for the sections the templates do not generate
+SIMPLE_LAYOUTS = {
+    'PRINTSERVER': compile_block('PRINTSERVER', (
+        'NAME', ('HOST', 'vpsx.local'), ('PORT', '5001'),
+    )),
+    'RETENTIONPOLICY': compile_block('RETENTIONPOLICY', (
+        'NAME', 'DAYS', ('PURGE', 'Y'),
+    )),
+    'INDEXTEMPLATE': compile_block('INDEXTEMPLATE', (
+        'NAME', ('DESCRIPTION', 'Synthetic index template'),
+    )),
+    'INDEXFIELD': compile_block('INDEXFIELD', (
+        'NAME', 'TEMPLATENAME', ('TYPE', 'Text'), ('LENGTH', '20'),
+    )),
+    'TEMPLATELOCATION': compile_block('TEMPLATELOCATION', (
+        'NAME', 'TEMPLATENAME', 'ROW', 'COLUMN',
+    )),
+    'RULESET': compile_block('RULESET', (
+        'NAME', 'DESCRIPTION', ('INACTIVE', 'N'),
+    )),
+    'REPORTDEFN': compile_block('REPORTDEFN', (
+        'NAME', 'RULESETNAME', ('RETENTIONPOLICY', 'RP001'),
+    )),
+    'VARIABLE': compile_block('VARIABLE', (
+        'NAME', 'ROW', 'COLUMN', 'LENGTH',
+    )),
+}
+
+# Blocks per minor section - enough to exercise them, small in bytes
+MINOR_BLOCKS = 20
+
+
+@dataclass
+class SyntheticSpec:
+    """Shape of a synthetic export
+
+    ``rulesets`` is the number of commitment book rulesets each store
+    belongs to and ``companies`` the number of companies added to every
+    tax report. Stores are added until the file reaches ``size_mb``.
+    """
+    size_mb: int
+    rulesets: int = 20
+    companies: int = 100
+    seed: int = 0
+
+    @property
+    def file_name(self) -> str:
+        return (
+            f"synthetic_{self.size_mb}mb_r{self.rulesets}"
+            f"_c{self.companies}_s{self.seed}.txt"
+        )
+
+
+class SyntheticExport:
+    """Write a synthetic export matching a SyntheticSpec"""
+
+    def __init__(self, spec: SyntheticSpec) -> None:
+        self.spec = spec
+        self.random = random.Random(spec.seed)
+        self.destinations = DestinationTemplate()
+        self.rules = RuleTemplate()
+        self.tax = TaxReportTemplate()
+        books = list(COMMITMENT_BOOKS)
+        self.rulesets = [
+            (f"RPT{number:03d}", books[number % len(books)])
+            for number in range(spec.rulesets)
+        ]
+
+    def ensure(self, directory: Path) -> Path:
+        """Path of the export in ``directory``, generating it if needed"""
+        path = directory / self.spec.file_name
+        if not path.exists():
+            directory.mkdir(exist_ok=True, parents=True)
+            temp_path = path.with_suffix('.partial')
+            self.write(temp_path)
+            temp_path.replace(path)
+        return path
+
+    def write(self, path: Path) -> Dict[str, int]:
+        """Write the export, returning block counts per section"""
+        target_bytes = self.spec.size_mb * 1024 * 1024
+        store_count = max(1, (
+            target_bytes - self._company_bytes()
+        ) // self._store_bytes())
+        stores = [str(1000 + number) for number in range(store_count)]
+        counts: Dict[str, int] = {}
+
+        with open(path, 'w', encoding='utf-8', buffering=1024 * 1024) as f:
+            f.write("* PCX Export File - Synthetic benchmark data\n")
+            f.write(f"* Spec: {self.spec}\n\n")
+            writer = BlockWriter(f)
+
+            for section in (
+                'PRINTSERVER', 'RETENTIONPOLICY', 'INDEXTEMPLATE',
+                'INDEXFIELD', 'TEMPLATELOCATION'
+            ):
+                counts[section] = self._write_minor(writer, section)
+
+            before = writer.count
+            for store in stores:
+                self._write_store_destinations(writer, store)
+            counts['DESTINATION'] = writer.count - before
+
+            before = writer.count
+            for report, book in self.rulesets:
+                writer.write(
+                    SIMPLE_LAYOUTS['RULESET'], f"{report}-{book}",
+                    f"Commitment book {book}"
+                )
+            for report, jobs in TaxReportTemplate.TAX_REPORT_JOBS.items():
+                for job in jobs:
+                    writer.write(
+                        SIMPLE_LAYOUTS['RULESET'], f"{report}-{job}",
+                        f"Tax report {report}"
+                    )
+            counts['RULESET'] = writer.count - before
+
+            before = writer.count
+            for store in stores:
+                self._write_store_rules(writer, store)
+            companies = [str(100 + n) for n in range(self.spec.companies)]
+            self.tax.write_rules(
+                writer, companies, list(TaxReportTemplate.TAX_REPORT_JOBS)
+            )
+            counts['RULE'] = writer.count - before
+
+            for report, book in self.rulesets:
+                writer.write(
+                    SIMPLE_LAYOUTS['REPORTDEFN'], f"{report}-{book}",
+                    f"{report}-{book}"
+                )
+            counts['REPORTDEFN'] = len(self.rulesets)
+            counts['VARIABLE'] = self._write_minor(writer, 'VARIABLE')
+            writer.finish()
+
+        return counts
+
+    def _write_minor(self, writer: BlockWriter, section: str) -> int:
+        layout = SIMPLE_LAYOUTS[section]
+        for number in range(MINOR_BLOCKS):
+            values: List[str] = [f"{section[:3]}{number:03d}"]
+            values.extend(
+                str(self.random.randint(1, 200))
+                for _ in range(layout.slots - 1)
+            )
+            writer.write(layout, *values)
+        return MINOR_BLOCKS
+
+    def _write_store_destinations(
+        self, writer: BlockWriter, store: str
+    ) -> None:
+        queues = set()
+        for report, book in self.rulesets:
+            queue = COMMITMENT_BOOKS[book]['queue']
+            if queue not in queues:
+                self.destinations.write_printer(
+                    writer, queue, store, f"Store {store}",
+                    f"{self.random.randint(1, 9999)} Main St",
+                    f"Town, ST {self.random.randint(10000, 99999)}"
+                )
+                queues.add(queue)
+            self.destinations.write_folder(writer, report, book, store)
+
+    def _write_store_rules(self, writer: BlockWriter, store: str) -> None:
+        for report, book in self.rulesets:
+            mapping = COMMITMENT_BOOKS[book]
+            self.rules.write_commitment_rule(
+                writer, report, book, store,
+                mapping['variable'], mapping['queue']
+            )
+
+    def _store_bytes(self) -> int:
+        """Size of one store's destinations and rules"""
+        buffer = io.StringIO()
+        writer = BlockWriter(buffer)
+        self._write_store_destinations(writer, '1000')
+        self._write_store_rules(writer, '1000')
+        return len(buffer.getvalue().encode('utf-8'))
+
+    def _company_bytes(self) -> int:
+        """Size of the company rules, which do not scale with size"""
+        rule = self.tax.generate_rule_for_company('TAX001', 'PPA0771R', '100')
+        return (len(rule) + 2) * self.tax.rule_count(
+            [''] * self.spec.companies,
+            list(TaxReportTemplate.TAX_REPORT_JOBS)
+        )
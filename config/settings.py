@@ -8,10 +8,17 @@ BASE_DIR: Path = Path(__file__).parent.parent
 DATA_DIR: Path = BASE_DIR / 'data'
 EXPORT_DIR: Path = DATA_DIR / 'exports'
 GENERATED_DIR: Path = DATA_DIR / 'generated'
+BACKUP_DIR: Path = DATA_DIR / 'backups'
 
-# Ensure directories exist
-for dir_path in [DATA_DIR, EXPORT_DIR, GENERATED_DIR]:
-    dir_path.mkdir(exist_ok=True, parents=True)
+
+def ensure_data_dirs() -> None:
+    """Create the data directories; call before writing into them
+
+    Not done at import time, so commands that never write to data/
+    start without touching the filesystem.
+    """
+    for dir_path in [DATA_DIR, EXPORT_DIR, GENERATED_DIR]:
+        dir_path.mkdir(exist_ok=True, parents=True)
 
 
 # Define typed configuration structures
@@ -27,6 +34,8 @@ class FileNamingType(TypedDict):
     destinations: str
     rules: str
     combined: str
+    delta: str
+    benchmark: str
 
 
 # PCX Configuration with strong typing
@@ -40,5 +49,7 @@ PCX_CONFIG: PCXConfigType = {
 FILE_NAMING: FileNamingType = {
     'destinations': 'destinations_{timestamp}.txt',
     'rules': 'rules_{timestamp}.txt',
-    'combined': 'pcx_import_{timestamp}.txt'
+    'combined': 'pcx_import_{timestamp}.txt',
+    'delta': 'pcx_delta_{timestamp}.txt',
+    'benchmark': 'benchmark_{timestamp}.json'
 }
@@ -0,0 +1,258 @@
+"""
+Batch runner - many ticket-style jobs in one process
+Groups jobs by target export so each file is parsed and rewritten once
+"""
+
+from datetime import datetime
+from functools import cached_property
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+import json
+
+from config.mappings import COMMITMENT_BOOKS
+from utils.formatters import (
+    print_header, print_success, print_error, print_warning
+)
+from utils.pcx_validator import PCXValidator
+
+if TYPE_CHECKING:
+    from templates.destination import DestinationTemplate
+    from templates.rule import RuleTemplate
+    from templates.tax_report import TaxReportTemplate
+
+Job = Dict[str, Any]
+
+
+class BatchRunner:
+    """Run a job spec file against one or more PCX exports
+
+    A spec is JSON or TOML with a list of jobs, for example::
+
+        [[jobs]]
+        type = "tax_consolidation"
+        target = "data/exports/server_export.txt"
+        companies = ["120", "121", "147"]
+        reports = ["TAX001", "TAX004"]
+
+    Supported job types are ``tax_consolidation`` (companies, reports),
+    ``commitment_books`` (report, stores, optional books) and
+    ``validate`` (optional max_errors, and ``references = true`` to
+    also check that rules name existing destinations and rulesets).
+    Stores are numbers or tables with number/name/address/city_state_zip;
+    a printer destination is only generated when the store has a name.
+
+    Edits for the same target are collected into one patch set and
+    applied in a single rewrite; validations run after the edits for
+    their target.
+    """
+
+    EDIT_JOBS = ('tax_consolidation', 'commitment_books')
+    JOB_TYPES = EDIT_JOBS + ('validate',)
+
+    def __init__(self, spec_path: Path) -> None:
+        self.spec_path = spec_path
+        self.jobs = self.load_spec(spec_path)
+
+    # Templates and editors are imported by the first edit job, so a
+    # validate-only spec starts without them
+
+    @cached_property
+    def rule_template(self) -> 'RuleTemplate':
+        from templates.rule import RuleTemplate
+        return RuleTemplate()
+
+    @cached_property
+    def destination_template(self) -> 'DestinationTemplate':
+        from templates.destination import DestinationTemplate
+        return DestinationTemplate()
+
+    @cached_property
+    def tax_template(self) -> 'TaxReportTemplate':
+        from templates.tax_report import TaxReportTemplate
+        return TaxReportTemplate()
+
+    @classmethod
+    def load_spec(cls, spec_path: Path) -> List[Job]:
+        """Read and check the job list from a JSON or TOML spec"""
+        if spec_path.suffix.lower() == '.toml':
+            import tomllib
+            with open(spec_path, 'rb') as f:
+                spec = tomllib.load(f)
+        else:
+            with open(spec_path, 'r', encoding='utf-8') as f:
+                spec = json.load(f)
+
+        jobs = spec.get('jobs', []) if isinstance(spec, dict) else spec
+        if not isinstance(jobs, list):
+            raise ValueError("Job spec must contain a list of jobs")
+
+        for number, job in enumerate(jobs, 1):
+            if job.get('type') not in cls.JOB_TYPES:
+                raise ValueError(
+                    f"Job {number}: unknown type {job.get('type')!r} "
+                    f"(expected one of {', '.join(cls.JOB_TYPES)})"
+                )
+            if not job.get('target'):
+                raise ValueError(f"Job {number}: missing 'target'")
+        return jobs
+
+    def group_jobs(self) -> Dict[Path, List[Job]]:
+        """Jobs grouped by target file, keeping spec order within each"""
+        groups: Dict[Path, List[Job]] = {}
+        for job in self.jobs:
+            groups.setdefault(Path(job['target']), []).append(job)
+        return groups
+
+    def run(self) -> bool:
+        """Run every job, returning True if all of them succeeded"""
+        print_header("Batch Mode")
+        groups = self.group_jobs()
+        print(
+            f"{len(self.jobs)} jobs against {len(groups)} file(s) "
+            f"from {self.spec_path}"
+        )
+
+        success = True
+        for target, jobs in groups.items():
+            try:
+                success = self.run_group(target, jobs) and success
+            except (OSError, ValueError, KeyError) as e:
+                print_error(f"{target}: {e}")
+                success = False
+        return success
+
+    def run_group(self, target: Path, jobs: List[Job]) -> bool:
+        """Apply all edit jobs for one file in one pass, then validate"""
+        print(f"\n📄 {target} ({len(jobs)} jobs)")
+        edits = [job for job in jobs if job['type'] in self.EDIT_JOBS]
+
+        if edits:
+            if target.exists():
+                self._edit_existing(target, edits)
+            else:
+                self._create_new(target, edits)
+
+        success = True
+        for job in jobs:
+            if job['type'] == 'validate':
+                success = self._validate(target, job) and success
+        return success
+
+    def _edit_existing(self, target: Path, jobs: List[Job]) -> None:
+        """Collect every edit into one patch set and rewrite once"""
+        from utils.fast_pcx_editor import FastPCXEditor
+        from utils.pcx_duplicates import filter_duplicates
+        from utils.pcx_patch import PCXPatchSet
+
+        editor = FastPCXEditor(target)
+        patches = PCXPatchSet(target)
+        destinations: List[str] = []
+        rules: List[str] = []
+
+        for job in jobs:
+            if job['type'] == 'tax_consolidation':
+                # Same per-company rules as the interactive ticket flow
+                rules.extend(self._tax_rules(job))
+            else:
+                new_destinations, new_rules = self._commitment_blocks(job)
+                destinations.extend(new_destinations)
+                rules.extend(new_rules)
+
+        # Skip blocks the export (or an earlier job) already has
+        blocks, skipped = filter_duplicates(patches.index, [
+            ('DESTINATION', block) for block in destinations
+        ] + [('RULE', block) for block in rules])
+        if skipped:
+            print(f"  Skipping {len(skipped)} blocks that already exist")
+
+        patches.insert_blocks(blocks)
+        if not patches:
+            print("  Nothing to change")
+            return
+
+        added = sum(1 for kind, _ in blocks if kind == 'DESTINATION')
+        edit_count = len(patches)
+        backup = editor.apply_patches(patches)
+        print_success(
+            f"  {edit_count} edits applied in one pass: {added} "
+            f"destinations and {len(blocks) - added} rules added"
+        )
+        print(f"  Backup: {backup}")
+
+    def _create_new(self, target: Path, jobs: List[Job]) -> None:
+        """Write a new import file for a target that does not exist yet"""
+        target.parent.mkdir(exist_ok=True, parents=True)
+        destinations: List[str] = []
+        rules: List[str] = []
+
+        for job in jobs:
+            if job['type'] == 'tax_consolidation':
+                rules.append(self.tax_template.generate_consolidated(
+                    [str(c) for c in job['companies']], job['reports']
+                ))
+            else:
+                new_destinations, new_rules = self._commitment_blocks(job)
+                destinations.extend(new_destinations)
+                rules.extend(new_rules)
+
+        with open(target, 'w', encoding='utf-8') as f:
+            f.write("* PCX Import File - Batch Generation\n")
+            f.write(f"* Generated: {datetime.now().isoformat()}\n")
+            f.write(f"* Spec: {self.spec_path}\n\n")
+            # Destinations must exist before the rules that use them
+            for block in destinations + rules:
+                f.write(block.rstrip('\n') + '\n\n')
+
+        print_success(f"  Created {target}")
+
+    def _tax_rules(self, job: Job) -> List[str]:
+        """Rule blocks for a tax consolidation job, one per company"""
+        return [
+            self.tax_template.generate_rule_for_company(
+                report, job_name, str(company)
+            )
+            for company in job['companies']
+            for report in job['reports']
+            for job_name in self.tax_template.TAX_REPORT_JOBS.get(report, [])
+        ]
+
+    def _commitment_blocks(self, job: Job) -> Tuple[List[str], List[str]]:
+        """Destination and rule blocks for a commitment book job"""
+        from utils.bulk_import import store_blocks
+
+        destinations: List[str] = []
+        rules: List[str] = []
+        books = job.get('books') or list(COMMITMENT_BOOKS)
+
+        for store in job['stores']:
+            if not isinstance(store, dict):
+                store = {'number': store}
+            store = {key: str(value) for key, value in store.items()}
+            new_destinations, new_rules = store_blocks(
+                store, job['report'], books,
+                self.destination_template, self.rule_template
+            )
+            destinations.extend(new_destinations)
+            rules.extend(new_rules)
+
+        return destinations, rules
+
+    def _validate(self, target: Path, job: Job) -> bool:
+        """Run a validation job, printing at most max_errors problems"""
+        max_errors = job.get('max_errors', 10)
+        is_valid, errors = PCXValidator.validate_file(
+            target, parallel=True, max_errors=max_errors
+        )
+        if job.get('references') and target.exists():
+            from utils.pcx_integrity import check_file
+            result = check_file(target)
+            errors.extend(str(ref) for ref in result.dangling[:max_errors])
+            is_valid = is_valid and result.is_valid
+        if is_valid:
+            print_success(f"  ✅ {target.name} is valid")
+            return True
+
+        print_warning(f"{target.name} has validation errors:")
+        for error in errors:
+            print(f"    - {error}")
+        return False
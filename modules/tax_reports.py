@@ -6,15 +6,17 @@ Handles consolidated tax reports for multiple companies
 from datetime import datetime
 from pathlib import Path
 from typing import List
-import shutil
 
 # Import from your existing modules structure
+from config.settings import BACKUP_DIR
 from modules import BaseModule
 from utils.formatters import (
     print_header, print_success, print_error, print_warning
 )
 from templates.tax_report import TaxReportTemplate
 from utils.fast_pcx_editor import FastPCXEditor
+from utils.backup_store import BackupStore
+from utils.pcx_index import PCXBlockIndex
 
 
 class TaxReportModule(BaseModule):
@@ -22,8 +24,8 @@ class TaxReportModule(BaseModule):
 
     def __init__(self):
         super().__init__("Tax Report Consolidation")
-        self.backup_dir = Path("data/backups")
-        self.backup_dir.mkdir(exist_ok=True, parents=True)
+        # Same store FastPCXEditor uses; created on first backup
+        self.backup_dir = BACKUP_DIR
 
     def display_menu(self):
         """Display tax report menu"""
@@ -187,14 +189,8 @@ class TaxReportModule(BaseModule):
             print_error("Failed to generate configuration")
 
     def create_backup(self, file_path: Path) -> Path:
-        """Create timestamped backup"""
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_path = (
-            self.backup_dir /
-            f"{file_path.stem}_backup_{timestamp}{file_path.suffix}"
-        )
-        shutil.copy2(file_path, backup_path)
-        return backup_path
+        """Create deduplicated backup, returning its manifest path"""
+        return BackupStore(self.backup_dir).backup(file_path)
 
     def generate_consolidated_reports(
         self, file_path: Path,
@@ -204,13 +200,10 @@ class TaxReportModule(BaseModule):
         """Generate the actual consolidated reports"""
         try:
             generator = TaxReportTemplate()
-            new_content = generator.generate_consolidated(
-                companies, reports
-            )
 
-            # Append to file
+            # Append to file, rendering large runs across all cores
             with open(file_path, 'a') as f:
-                f.write(new_content)
+                generator.write_consolidated(f, companies, reports)
 
             # Print summary
             print("\n📊 Generated configuration for:")
@@ -275,24 +268,12 @@ class TaxReportModule(BaseModule):
             print_error("File not found!")
             return
 
-        # Basic validation using fast scanning
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            sections_found: set[str] = set()  # Explicit type annotation
-            rule_count = 0
-            destination_count = 0
-
-            for line in f:
-                if line.startswith('ADD RULE'):
-                    rule_count += 1
-                    sections_found.add('RULE')
-                elif line.startswith('ADD DESTINATION'):
-                    destination_count += 1
-                    sections_found.add('DESTINATION')
-                elif line.startswith('ADD '):
-                    # Extract section name
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        sections_found.add(parts[1])
+        # Block counts come from the sidecar index - only rescanned
+        # when the export has changed since the last run
+        stats = PCXBlockIndex.open(Path(file_path)).statistics()
+        sections_found = set(stats)
+        rule_count = stats.get('RULE', 0)
+        destination_count = stats.get('DESTINATION', 0)
 
         print("\n📋 File Statistics (Fast Scan):")
         print(f"  Sections found: {', '.join(sorted(sections_found))}")
@@ -2,16 +2,56 @@
 """
 PCX Automation CLI
 Main entry point for PCX import/export automation tools
+
+Scripts call this thousands of times, so only argparse and the output
+helpers load up front; modules, templates and file utilities are
+imported by the command that needs them.
+
+The subcommands (validate, stats, duplicates, references, insert,
+generate, diff, canonicalize) never prompt. They read ``-`` as stdin
+and write results to stdout, with messages on stderr, so they can be
+chained in a pipeline::
+
+    pcx_cli.py generate tax --companies 120 121 \\
+        | pcx_cli.py insert export.txt -o - | pcx_cli.py validate -
 """
 
 import argparse
+import importlib
+import importlib.util
+import os
 import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, Any, Protocol
+from typing import (
+    Optional, Dict, Any, Iterator, List, Protocol, TextIO, Tuple
+)
 from utils.formatters import (
     print_header, print_error, print_warning, print_success
 )
 
+from utils.progress import (
+    ConsoleReporter, OperationCancelled, cancel_on_interrupt, set_reporter
+)
+
+CANCELLED_MESSAGE = "Cancelled - the file being written was left unchanged"
+
+STDIO = '-'  # File argument meaning stdin or stdout
+
+# Menu key -> (name, module, class); imported when first selected
+MODULES: Dict[str, Tuple[str, str, str]] = {
+    '1': (
+        'Commitment Book Management',
+        'modules.commitment_books', 'CommitmentBookModule'
+    ),
+    '2': (
+        '🚨 Tax Report Consolidation (EMERGENCY)',
+        'modules.tax_reports', 'TaxReportModule'
+    ),
+}
+
 
 class ModuleHandler(Protocol):
     """Protocol defining the interface for module handlers"""
@@ -25,29 +65,26 @@ ModuleInfo = Dict[str, Any]
 
 class PCXAutomationCLI:
     def __init__(self) -> None:
-        # Build modules dictionary with proper typing
-        self.modules: Dict[str, ModuleInfo] = {}
+        # List the installed modules without importing them; handlers
+        # are created by get_handler() the first time they are used
+        self.modules: Dict[str, ModuleInfo] = {
+            key: {'name': name, 'module': module, 'class': class_name}
+            for key, (name, module, class_name) in MODULES.items()
+            if importlib.util.find_spec(module) is not None
+        }
+        self._handlers: Dict[str, ModuleHandler] = {}
 
-        # Try to import commitment books module
-        try:
-            from modules.commitment_books import CommitmentBookModule
-            self.modules['1'] = {
-                'name': 'Commitment Book Management',
-                'handler': CommitmentBookModule()
-            }
-        except ImportError as e:
-            print_warning(f"Commitment Book module not available: {e}")
-
-        # Try to import tax module if available
-        try:
-            from modules.tax_reports import TaxReportModule
-            self.modules['2'] = {
-                'name': '🚨 Tax Report Consolidation (EMERGENCY)',
-                'handler': TaxReportModule()
-            }
-        except ImportError:
-            # Tax module is optional
-            pass
+    def get_handler(self, key: str) -> Optional[ModuleHandler]:
+        """Import and create a module's handler on first use"""
+        if key not in self._handlers:
+            info = self.modules[key]
+            try:
+                module = importlib.import_module(info['module'])
+            except ImportError as e:
+                print_warning(f"{info['name']} module not available: {e}")
+                return None
+            self._handlers[key] = getattr(module, info['class'])()
+        return self._handlers[key]
 
     def display_menu(self) -> None:
         """Display main menu"""
@@ -89,7 +126,7 @@ class PCXAutomationCLI:
         if quick_action == 'ticket-231589':
             if '2' in self.modules:
                 print_header("EMERGENCY: Processing Ticket #231589")
-                handler = self.modules['2']['handler']
+                handler = self.get_handler('2')
                 # Check if the handler has the quick method
                 if hasattr(handler, 'process_ticket_231589_quick'):
                     handler.process_ticket_231589_quick()
@@ -108,23 +145,31 @@ class PCXAutomationCLI:
             if choice == '0':
                 print("\nExiting PCX Automation Tool...")
                 sys.exit(0)
-            elif choice in self.modules:
-                handler = self.modules[choice]['handler']
-                handler.run()
-            elif choice == '5':
-                self.bulk_operations()
-            elif choice == '6':
-                self.export_config()
-            elif choice == '7':
-                self.import_config()
-            elif choice == '8':
-                self.validate_pcx_file()
-            else:
-                print_error("Invalid option. Please try again.")
+            try:
+                self.run_choice(choice)
+            except OperationCancelled:
+                print_warning(CANCELLED_MESSAGE)
 
             if choice not in ['0']:  # Don't pause on exit
                 input("\nPress Enter to continue...")
 
+    def run_choice(self, choice: str) -> None:
+        """Run the menu option for a choice"""
+        if choice in self.modules:
+            handler = self.get_handler(choice)
+            if handler:
+                handler.run()
+        elif choice == '5':
+            self.bulk_operations()
+        elif choice == '6':
+            self.export_config()
+        elif choice == '7':
+            self.import_config()
+        elif choice == '8':
+            self.validate_pcx_file()
+        else:
+            print_error("Invalid option. Please try again.")
+
     def bulk_operations(self) -> None:
         """Handle bulk operations from CSV/Excel"""
         print_header("Bulk Operations")
@@ -136,9 +181,9 @@ class PCXAutomationCLI:
         choice = input("\nSelect option: ").strip()
 
         if choice == '1':
-            print_warning("CSV import coming soon...")
+            self.bulk_import(('.csv',))
         elif choice == '2':
-            print_warning("Excel import coming soon...")
+            self.bulk_import(('.xlsx', '.xlsm'))
         elif choice == '3':
             print_warning("Multi-ticket processing coming soon...")
         elif choice == '4':
@@ -146,6 +191,66 @@ class PCXAutomationCLI:
         else:
             print_error("Invalid option")
 
+    def bulk_import(self, extensions: Tuple[str, ...]) -> None:
+        """Generate an import file from a store or company list"""
+        file_path = Path(input("\nEnter list file path: ").strip())
+        if not file_path.is_file():
+            print_error(f"File not found: {file_path}")
+            return
+        if file_path.suffix.lower() not in extensions:
+            print_error(f"Expected a {'/'.join(extensions)} file")
+            return
+
+        print("\n1. Store list (commitment books)")
+        print("2. Company list (tax reports)")
+        kind = input("\nList type: ").strip()
+        if kind not in ('1', '2'):
+            print_error("Invalid list type")
+            return
+
+        from config.settings import FILE_NAMING, GENERATED_DIR, PCX_CONFIG
+        from utils.bulk_import import BulkImporter, iter_rows
+
+        timestamp = datetime.now().strftime(PCX_CONFIG['date_format'])
+        output = GENERATED_DIR / FILE_NAMING['combined'].format(
+            timestamp=timestamp
+        )
+        importer = BulkImporter(output)
+
+        try:
+            rows = iter_rows(file_path)
+            if kind == '1':
+                report = input("Report name: ").strip().upper()
+                if not report:
+                    print_error("No report specified")
+                    return
+                result = importer.import_stores(rows, report)
+            else:
+                reports = input(
+                    "Default reports (comma-separated, blank to use "
+                    "each row's reports column): "
+                ).strip().upper()
+                result = importer.import_companies(
+                    rows, [r.strip() for r in reports.split(',') if r.strip()]
+                )
+        except ImportError as e:
+            print_warning(str(e))
+            return
+        except OSError as e:
+            print_error(f"Import failed: {e}")
+            return
+
+        print(f"\n  Rows read:    {result.rows}")
+        print(f"  Destinations: {result.destinations}")
+        print(f"  Rules:        {result.rules}")
+        if result.errors:
+            print_warning(f"{len(result.errors)} rows skipped:")
+            for error in result.errors[:10]:
+                print(f"  - {error}")
+            if len(result.errors) > 10:
+                print(f"  ... and {len(result.errors) - 10} more")
+        print_success(f"✅ Import file: {output}")
+
     def export_config(self) -> None:
         """Export current configuration"""
         print_header("Export Configuration")
@@ -179,40 +284,109 @@ class PCXAutomationCLI:
         print_warning("Import functionality coming soon...")
         print(f"Would import from: {file_path}")
 
-    def validate_pcx_file(self) -> None:
-        """Validate a PCX export file"""
+    def validate_pcx_file(self, file_path: Optional[str] = None) -> bool:
+        """Validate a PCX export file, asking for the path if not given
+
+        Returns True only if the file exists and is valid.
+        """
         print_header("PCX File Validator")
 
-        file_path = input("\nEnter PCX file path to validate: ").strip()
+        if file_path is None:
+            file_path = input(
+                "\nEnter PCX file path to validate: "
+            ).strip()
 
         if not file_path:
             print_error("No file specified")
-            return
+            return False
 
         if not Path(file_path).exists():
             print_error(f"File not found: {file_path}")
-            return
+            return False
 
         try:
             from utils.pcx_validator import PCXValidator
             validator = PCXValidator()
-            is_valid, errors = validator.validate_file(Path(file_path))
+            # Large exports are split across all cores; stop reading
+            # once there are more errors than we would print anyway
+            is_valid, errors = validator.validate_file(
+                Path(file_path), parallel=True, max_errors=10
+            )
 
             if is_valid:
                 print_success("✅ File is valid!")
+                return True
             else:
                 print_error("❌ Validation errors found:")
-                for error in errors[:10]:  # Show first 10 errors
+                for error in errors:
                     print(f"  - {error}")
-                if len(errors) > 10:
-                    print(
-                        f"  ... and {len(errors) - 10} more errors"
-                    )
+                if len(errors) >= 10:
+                    print("  ... stopped after the first 10 errors")
         except ImportError:
             print_warning(
                 "Validator not available. "
                 "Create utils/pcx_validator.py"
             )
+        return False
+
+    def diff_exports(
+        self,
+        baseline: Path,
+        edited: Path,
+        output: Optional[Path] = None
+    ) -> None:
+        """Write a delta import file with only the changed definitions"""
+        print_header("PCX Export Diff")
+
+        for file_path in (baseline, edited):
+            if not file_path.exists():
+                print_error(f"File not found: {file_path}")
+                return
+
+        from config.settings import (
+            FILE_NAMING, GENERATED_DIR, PCX_CONFIG, ensure_data_dirs
+        )
+        from utils.pcx_diff import PCXDiff
+
+        if output is None:
+            ensure_data_dirs()
+            timestamp = datetime.now().strftime(PCX_CONFIG['date_format'])
+            output = GENERATED_DIR / FILE_NAMING['delta'].format(
+                timestamp=timestamp
+            )
+
+        print(f"Comparing {edited} against {baseline}...")
+        counts = PCXDiff(baseline, edited).write_delta(output)
+
+        print(f"\n  Added:   {counts['added']}")
+        print(f"  Changed: {counts['changed']}")
+        print(f"  Removed: {counts['removed']}")
+        if counts['removed']:
+            print_warning(
+                "Removed blocks are listed in the delta header - "
+                "delete them in PCX manually"
+            )
+        print_success(f"✅ Delta import file: {output}")
+
+    def restore_backup(
+        self, manifest: Path, output: Optional[Path] = None
+    ) -> None:
+        """Rebuild a file from a backup manifest"""
+        print_header("Restore Backup")
+
+        if not manifest.exists():
+            print_error(f"Manifest not found: {manifest}")
+            return
+
+        from utils.backup_store import BackupStore
+        # Manifests live in <store>/manifests
+        store = BackupStore(manifest.resolve().parent.parent)
+        try:
+            target = store.restore(manifest, output)
+        except (OSError, ValueError) as e:
+            print_error(f"Restore failed: {e}")
+            return
+        print_success(f"✅ Restored {target}")
 
 
 def main() -> None:
@@ -231,13 +405,32 @@ def main() -> None:
     )
     parser.add_argument(
         '--batch', '-b',
-        help='Run in batch mode with config file'
+        help='Run the jobs in a JSON/TOML job spec file'
     )
     parser.add_argument(
         '--validate',
         help='Validate a PCX export file',
         metavar='FILE'
     )
+    parser.add_argument(
+        '--diff',
+        nargs=2,
+        help='Write a delta import file of changes from BASELINE to EDITED',
+        metavar=('BASELINE', 'EDITED')
+    )
+    parser.add_argument(
+        '--restore',
+        help='Restore a backup from its manifest in data/backups/manifests',
+        metavar='MANIFEST'
+    )
+    parser.add_argument(
+        '--output', '-o',
+        help=(
+            'Output file for --diff (default: data/generated/) or '
+            '--restore (default: the original path)'
+        ),
+        metavar='FILE'
+    )
 
     # Emergency ticket shortcuts
     parser.add_argument(
@@ -251,8 +444,126 @@ def main() -> None:
         metavar='TICKET_NUM'
     )
 
+    # Profiling
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help=(
+            'Time the scan, copy, render, validate and commit phases '
+            'and print a summary when done'
+        )
+    )
+    parser.add_argument(
+        '--profile-format',
+        choices=('table', 'json'),
+        default='table',
+        help='Summary table or every span as JSON (default: table)'
+    )
+    parser.add_argument(
+        '--profile-output',
+        help='Write the --profile report to a file instead of stderr',
+        metavar='FILE'
+    )
+    parser.add_argument(
+        '--cprofile',
+        help='Also run under cProfile and save the stats to FILE',
+        metavar='FILE'
+    )
+    parser.add_argument(
+        '--no-progress',
+        action='store_true',
+        help='Do not report progress of long file operations on stderr'
+    )
+
+    add_subcommands(parser)
     args = parser.parse_args()
 
+    if not args.no_progress:
+        set_reporter(ConsoleReporter(sys.stderr))
+
+    # The first Ctrl-C stops the running file operation cleanly
+    try:
+        with cancel_on_interrupt():
+            if args.profile or args.cprofile:
+                status = run_profiled(args)
+            else:
+                status = run_command(args)
+    except OperationCancelled:
+        print_warning(CANCELLED_MESSAGE, file=sys.stderr)
+        sys.exit(130)
+    except BrokenPipeError:
+        # The reader (head, say) went away; stop quietly
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    sys.exit(status)
+
+
+def run_profiled(args: argparse.Namespace) -> int:
+    """Run a command with span recording and/or cProfile
+
+    Reports go to stderr (or --profile-output) so they never mix with
+    a command's own output, and are written even if the command exits.
+    """
+    from utils import profiling
+
+    profiler = None
+    if args.cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+    if args.profile:
+        profiling.enable()
+
+    start = time.perf_counter()
+    try:
+        if profiler:
+            return profiler.runcall(run_command, args)
+        return run_command(args)
+    finally:
+        wall_seconds = time.perf_counter() - start
+        if args.profile:
+            write_profile_report(
+                profiling.disable(), wall_seconds,
+                args.profile_format, args.profile_output
+            )
+        if profiler:
+            import pstats
+            profiler.dump_stats(args.cprofile)
+            print(
+                f"\ncProfile stats saved to {args.cprofile}", file=sys.stderr
+            )
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats(
+                'cumulative'
+            ).print_stats(20)
+
+
+def write_profile_report(
+    spans: List[Any],
+    wall_seconds: float,
+    report_format: str,
+    output: Optional[str] = None
+) -> None:
+    """Write recorded spans as a summary table or JSON"""
+    from utils import profiling
+
+    if report_format == 'json':
+        text = profiling.to_json(spans, wall_seconds)
+    else:
+        text = profiling.format_table(spans, wall_seconds)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"\nProfile written to {output}", file=sys.stderr)
+    else:
+        print(f"\nProfile ({wall_seconds:.2f}s)", file=sys.stderr)
+        print(text, file=sys.stderr)
+
+
+def run_command(args: argparse.Namespace) -> int:
+    """Dispatch parsed command line arguments, returning the exit code"""
+    if args.command:
+        return args.handler(args)
+
     cli = PCXAutomationCLI()
 
     # Handle command line arguments
@@ -274,23 +585,48 @@ def main() -> None:
             print("2. Run this command again")
 
     elif args.validate:
-        # Quick validate mode
-        if Path(args.validate).exists():
-            cli.validate_pcx_file()
-        else:
-            print_error(f"File not found: {args.validate}")
+        # Quick validate mode; the exit status says whether it is valid
+        if not cli.validate_pcx_file(args.validate):
+            return 1
+
+    elif args.diff:
+        cli.diff_exports(
+            Path(args.diff[0]),
+            Path(args.diff[1]),
+            Path(args.output) if args.output else None
+        )
+
+    elif args.restore:
+        cli.restore_backup(
+            Path(args.restore),
+            Path(args.output) if args.output else None
+        )
 
     elif args.module:
         # Jump to specific module
-        if args.module in cli.modules:
-            handler = cli.modules[args.module]['handler']
+        handler = (
+            cli.get_handler(args.module)
+            if args.module in cli.modules else None
+        )
+        if handler:
             handler.run()
         else:
             print_error(f"Module {args.module} not found")
 
     elif args.batch:
-        print_warning("Batch mode not yet implemented")
-        print(f"Would process batch file: {args.batch}")
+        batch_file = Path(args.batch)
+        if not batch_file.exists():
+            print_error(f"Batch file not found: {args.batch}")
+            sys.exit(1)
+
+        from modules.batch_runner import BatchRunner
+        try:
+            runner = BatchRunner(batch_file)
+        except ValueError as e:
+            print_error(f"Invalid batch file: {e}")
+            sys.exit(1)
+        if not runner.run():
+            sys.exit(1)
 
     elif args.ticket:
         # Handle specific ticket
@@ -302,6 +638,487 @@ def main() -> None:
     else:
         # Normal interactive mode
         cli.run()
+    return 0
+
+
+# Non-interactive subcommands: arguments up front, "-" for stdin/stdout,
+# results on stdout and messages on stderr. Each returns an exit code.
+
+def add_subcommands(parser: argparse.ArgumentParser) -> None:
+    """Add the pipeable subcommands to the main parser"""
+    commands = parser.add_subparsers(
+        dest='command', metavar='COMMAND',
+        title='commands (global options go before the command)'
+    )
+
+    validate = commands.add_parser(
+        'validate', help='Validate an export; exit status 1 if invalid'
+    )
+    validate.add_argument(
+        'file', nargs='?', default=STDIO,
+        help='Export file, or - for stdin (default)'
+    )
+    validate.add_argument(
+        '--max-errors', type=int, metavar='N',
+        help='Stop after N errors'
+    )
+    validate.add_argument(
+        '--fail-fast', action='store_true', help='Stop at the first error'
+    )
+    validate.add_argument(
+        '--serial', action='store_true',
+        help='Do not split large files across processes'
+    )
+    validate.set_defaults(handler=command_validate)
+
+    stats = commands.add_parser('stats', help='Count blocks per section')
+    stats.add_argument(
+        'file', nargs='?', default=STDIO,
+        help='Export file, or - for stdin (default)'
+    )
+    stats.add_argument(
+        '--json', action='store_true', help='Print the counts as JSON'
+    )
+    stats.set_defaults(handler=command_stats)
+
+    insert = commands.add_parser(
+        'insert', help='Insert blocks into their sections of an export'
+    )
+    insert.add_argument('file', help='Export file to insert into')
+    insert.add_argument(
+        '--input', '-i', default=STDIO, metavar='FILE',
+        help='PCX blocks to insert, or - for stdin (default)'
+    )
+    insert.add_argument(
+        '--output', '-o', dest='target', metavar='FILE',
+        help=(
+            'Write the result here (- for stdout) instead of updating '
+            'FILE in place with a backup'
+        )
+    )
+    insert.add_argument(
+        '--allow-duplicates', action='store_true',
+        help='Insert blocks even if the export already has them'
+    )
+    insert.set_defaults(handler=command_insert)
+
+    duplicates = commands.add_parser(
+        'duplicates',
+        help='Find repeated RULEs and DESTINATIONs; exit status 1 if any'
+    )
+    duplicates.add_argument(
+        'file', nargs='?', default=STDIO,
+        help='Export file, or - for stdin (default)'
+    )
+    duplicates.add_argument(
+        '--bloom', action='store_true',
+        help='Use a fixed-size Bloom filter (for huge exports)'
+    )
+    duplicates.add_argument(
+        '--capacity', type=int, metavar='BLOCKS',
+        help='Blocks to size the Bloom filter for (default: estimated)'
+    )
+    duplicates.set_defaults(handler=command_duplicates)
+
+    references = commands.add_parser(
+        'references',
+        help=(
+            'Check that rules name existing destinations and rulesets; '
+            'exit status 1 if not'
+        )
+    )
+    references.add_argument(
+        'file', nargs='?', default=STDIO,
+        help='Export file, or - for stdin (default)'
+    )
+    references.add_argument(
+        '--max-errors', type=int, metavar='N',
+        help='Print at most N dangling references'
+    )
+    references.set_defaults(handler=command_references)
+
+    generate = commands.add_parser(
+        'generate', help='Generate an import file'
+    )
+    kinds = generate.add_subparsers(
+        dest='kind', metavar='KIND', required=True
+    )
+    tax = kinds.add_parser(
+        'tax', help='Company rules for consolidated tax reports'
+    )
+    tax.add_argument(
+        '--companies', nargs='+', default=[], metavar='COMPANY',
+        help='Company numbers (space or comma separated)'
+    )
+    tax.add_argument(
+        '--reports', nargs='+', default=[], metavar='REPORT',
+        help='Tax reports (default: all, or each row\'s reports column)'
+    )
+    stores = kinds.add_parser(
+        'stores', help='Commitment book destinations and rules'
+    )
+    stores.add_argument('--report', required=True, help='Report name')
+    stores.add_argument(
+        '--stores', nargs='+', default=[], metavar='STORE',
+        help='Store numbers (space or comma separated)'
+    )
+    stores.add_argument(
+        '--books', nargs='+', metavar='BOOK',
+        help='Commitment books (default: all)'
+    )
+    for kind in (tax, stores):
+        kind.add_argument(
+            '--from', dest='source', metavar='FILE',
+            help='CSV/Excel list to read rows from, or - for CSV on stdin'
+        )
+        kind.add_argument(
+            '--output', '-o', dest='target', default=STDIO,
+            metavar='FILE', help='Output file, or - for stdout (default)'
+        )
+    generate.set_defaults(handler=command_generate)
+
+    diff = commands.add_parser(
+        'diff', help='Write a delta import of changes from BASELINE'
+    )
+    diff.add_argument('baseline', help='Baseline export')
+    diff.add_argument('edited', help='Edited export')
+    diff.add_argument(
+        '--output', '-o', dest='target', default=STDIO, metavar='FILE',
+        help='Delta import file, or - for stdout (default)'
+    )
+    diff.set_defaults(handler=command_diff)
+
+    canonicalize = commands.add_parser(
+        'canonicalize',
+        help='Sort sections into canonical order and blocks by key'
+    )
+    canonicalize.add_argument('file', help='Export file to normalize')
+    canonicalize.add_argument(
+        '--output', '-o', dest='target', metavar='FILE',
+        help=(
+            'Write the result here (- for stdout) instead of updating '
+            'FILE in place with a backup'
+        )
+    )
+    canonicalize.add_argument(
+        '--memory-mb', type=int, default=64, metavar='MB',
+        help='Block data sorted in memory before spilling (default: 64)'
+    )
+    canonicalize.add_argument(
+        '--temp-dir', metavar='DIR',
+        help='Directory for spill files (default: next to FILE)'
+    )
+    canonicalize.set_defaults(handler=command_canonicalize)
+
+
+def split_values(values: List[str]) -> List[str]:
+    """Flatten ``120 121,147`` style arguments into a list"""
+    return [
+        item.strip() for value in values
+        for item in value.split(',') if item.strip()
+    ]
+
+
+def missing_files(*names: str) -> bool:
+    """Report any file argument (other than -) that does not exist"""
+    missing = [
+        name for name in names
+        if name != STDIO and not Path(name).is_file()
+    ]
+    for name in missing:
+        print_error(f"File not found: {name}", file=sys.stderr)
+    return bool(missing)
+
+
+def command_validate(args: argparse.Namespace) -> int:
+    """Print each problem on stdout; exit 1 if there are any"""
+    from utils.pcx_validator import PCXValidator
+
+    if missing_files(args.file):
+        return 2
+
+    if args.file == STDIO:
+        errors = [
+            issue.message for issue in PCXValidator.iter_stream_issues(
+                sys.stdin.buffer, args.max_errors, args.fail_fast
+            )
+        ]
+    else:
+        _, errors = PCXValidator.validate_file(
+            Path(args.file), parallel=not args.serial,
+            max_errors=args.max_errors, fail_fast=args.fail_fast
+        )
+
+    for error in errors:
+        print(error)
+    if errors:
+        print_error(
+            f"{len(errors)} validation problems found", file=sys.stderr
+        )
+        return 1
+    print_success("✅ File is valid!", file=sys.stderr)
+    return 0
+
+
+def command_duplicates(args: argparse.Namespace) -> int:
+    """Print each repeated block on stdout; exit 1 if there are any"""
+    from utils.pcx_duplicates import find_duplicates
+
+    if missing_files(args.file):
+        return 2
+
+    capacity = None
+    if args.bloom:
+        # Blocks are a few hundred bytes, so size // 100 is generous
+        capacity = args.capacity or (
+            Path(args.file).stat().st_size // 100 if args.file != STDIO
+            else 10_000_000
+        )
+
+    found = 0
+    with (
+        nullcontext(sys.stdin) if args.file == STDIO
+        else open(args.file, 'r', encoding='utf-8', errors='replace')
+    ) as source:
+        for duplicate in find_duplicates(source, capacity):
+            print(duplicate)
+            found += 1
+
+    if found:
+        print_error(f"{found} duplicate blocks found", file=sys.stderr)
+        return 1
+    print_success("✅ No duplicate blocks", file=sys.stderr)
+    return 0
+
+
+def command_references(args: argparse.Namespace) -> int:
+    """Print dangling references on stdout; exit 1 if there are any"""
+    from utils.pcx_integrity import (
+        check_file, check_references, describe_result
+    )
+
+    if missing_files(args.file):
+        return 2
+
+    if args.file == STDIO:
+        result = check_references(sys.stdin.buffer)
+    else:
+        result = check_file(Path(args.file))
+
+    for reference in result.dangling[:args.max_errors]:
+        print(reference)
+    summary = describe_result(result)
+    if summary:
+        print_error(summary, file=sys.stderr)
+        return 1
+    print_success(
+        f"✅ All {result.references} references resolve", file=sys.stderr
+    )
+    return 0
+
+
+def count_blocks(stream: TextIO) -> Dict[str, int]:
+    """Count top-level blocks per type in a stream, line by line
+
+    Unindented nested blocks such as RULECOMPONENT belong to their rule
+    and are not counted, matching the block index used for files.
+    """
+    from utils.pcx_block import NESTED_BLOCK_TYPES
+
+    counts: Dict[str, int] = {}
+    for line in stream:
+        if line.startswith('ADD '):
+            parts = line.split()
+            if len(parts) > 1 and parts[1] not in NESTED_BLOCK_TYPES:
+                counts[parts[1]] = counts.get(parts[1], 0) + 1
+    return counts
+
+
+def command_stats(args: argparse.Namespace) -> int:
+    """Print block counts per section in canonical section order"""
+    import json
+    from utils.pcx_schema import PCXSchemaManager
+
+    if missing_files(args.file):
+        return 2
+
+    if args.file == STDIO:
+        counts = count_blocks(sys.stdin)
+    else:
+        from utils.pcx_index import PCXBlockIndex
+        counts = PCXBlockIndex.open(Path(args.file)).statistics()
+
+    order = PCXSchemaManager.SECTION_ORDER
+    counts = dict(sorted(
+        counts.items(), key=lambda item: (order.get(item[0], 99), item[0])
+    ))
+    if args.json:
+        print(json.dumps(counts, indent=2))
+    else:
+        for block_type, count in counts.items():
+            print(f"{block_type:<20} {count:>10}")
+        print(f"{'TOTAL':<20} {sum(counts.values()):>10}")
+    return 0
+
+
+def command_insert(args: argparse.Namespace) -> int:
+    """Insert each block at the end of its section"""
+    from utils.pcx_block import iter_block_texts
+    from utils.pcx_duplicates import filter_duplicates
+    from utils.pcx_patch import PCXPatchSet
+
+    if missing_files(args.file, args.input):
+        return 2
+
+    file_path = Path(args.file)
+    patches = PCXPatchSet(file_path)
+    with (
+        nullcontext(sys.stdin) if args.input == STDIO
+        else open(args.input, 'r', encoding='utf-8')
+    ) as source:
+        blocks = iter_block_texts(source)
+        if args.allow_duplicates:
+            # Missing sections are created at their canonical position
+            count = patches.insert_blocks(blocks)
+        else:
+            kept, skipped = filter_duplicates(patches.index, blocks)
+            if skipped:
+                print_warning(
+                    f"Skipped {len(skipped)} blocks the export already "
+                    f"has, e.g. {skipped[0]}",
+                    file=sys.stderr
+                )
+            count = patches.insert_blocks(kept)
+    if not count:
+        print_warning("No blocks to insert", file=sys.stderr)
+
+    if args.target == STDIO:
+        patches.write(sys.stdout.buffer)
+        sys.stdout.buffer.flush()
+    elif args.target:
+        patches.apply(Path(args.target))
+    elif patches:
+        from utils.fast_pcx_editor import FastPCXEditor
+        backup = FastPCXEditor(file_path).apply_patches(patches)
+        print(f"Backup: {backup}", file=sys.stderr)
+    print_success(f"✅ Inserted {count} blocks", file=sys.stderr)
+    return 0
+
+
+def iter_list_rows(source: str) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Rows of a --from list: stdin is read as CSV"""
+    from utils.bulk_import import iter_csv_rows, iter_rows
+
+    if source == STDIO:
+        return iter_csv_rows(sys.stdin)
+    return iter_rows(Path(source))
+
+
+def command_generate(args: argparse.Namespace) -> int:
+    """Write a tax or commitment book import file"""
+    from utils.bulk_import import BulkImporter
+
+    if args.source and missing_files(args.source):
+        return 2
+
+    if args.target == STDIO:
+        output = sys.stdout
+    else:
+        output = Path(args.target)
+
+    importer = BulkImporter(output)
+    try:
+        if args.kind == 'tax':
+            reports = [r.upper() for r in split_values(args.reports)]
+            if args.source:
+                rows = iter_list_rows(args.source)
+            else:
+                rows = enumerate((
+                    {'company': company}
+                    for company in split_values(args.companies)
+                ), 1)
+            if not reports and not args.source:
+                from templates.tax_report import TaxReportTemplate
+                reports = list(TaxReportTemplate.TAX_REPORT_JOBS)
+            result = importer.import_companies(rows, reports)
+        else:
+            if args.source:
+                rows = iter_list_rows(args.source)
+            else:
+                rows = enumerate((
+                    {'number': store}
+                    for store in split_values(args.stores)
+                ), 1)
+            books = split_values(args.books) if args.books else None
+            result = importer.import_stores(rows, args.report.upper(), books)
+    except ImportError as e:
+        print_error(str(e), file=sys.stderr)
+        return 2
+
+    for error in result.errors:
+        print_warning(f"Skipped {error}", file=sys.stderr)
+    print(
+        f"{result.rows} rows: {result.destinations} destinations, "
+        f"{result.rules} rules",
+        file=sys.stderr
+    )
+    if not result.rows:
+        print_warning("Nothing to generate", file=sys.stderr)
+    return 1 if result.errors else 0
+
+
+def command_diff(args: argparse.Namespace) -> int:
+    """Write the delta import file, reporting counts on stderr"""
+    from utils.pcx_diff import PCXDiff
+
+    if missing_files(args.baseline, args.edited):
+        return 2
+
+    delta = PCXDiff(Path(args.baseline), Path(args.edited))
+    if args.target == STDIO:
+        counts = delta.write(sys.stdout.buffer)
+        sys.stdout.buffer.flush()
+    else:
+        counts = delta.write_delta(Path(args.target))
+
+    print(
+        f"Added: {counts['added']}  Changed: {counts['changed']}  "
+        f"Removed: {counts['removed']}",
+        file=sys.stderr
+    )
+    return 0
+
+
+def command_canonicalize(args: argparse.Namespace) -> int:
+    """Rewrite an export in canonical order with an external sort"""
+    from utils.pcx_canonical import PCXCanonicalizer
+
+    if missing_files(args.file):
+        return 2
+
+    file_path = Path(args.file)
+    canonicalizer = PCXCanonicalizer(
+        file_path, args.memory_mb * 1024 * 1024,
+        Path(args.temp_dir) if args.temp_dir else None
+    )
+    if args.target == STDIO:
+        result = canonicalizer.write(sys.stdout.buffer)
+        sys.stdout.buffer.flush()
+    elif args.target:
+        result = canonicalizer.apply(Path(args.target))
+    else:
+        from utils.backup_store import BackupStore
+        backup = BackupStore().backup(file_path)
+        result = canonicalizer.apply()
+        print(f"Backup: {backup}", file=sys.stderr)
+
+    print(
+        f"{sum(result.blocks.values())} blocks in "
+        f"{len(result.blocks)} sections "
+        f"({result.runs} sorted runs spilled)",
+        file=sys.stderr
+    )
+    return 0
 
 
 if __name__ == "__main__":
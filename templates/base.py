@@ -1,12 +1,24 @@
 """Base template class for PCX template generation"""
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, Tuple
+from templates.compiler import CompiledBlock, Field, compile_block
+from templates.render_cache import RenderCache
+
+
+@lru_cache(maxsize=1024)
+def _field_prefix(key: str, field_width: int) -> str:
+    """Indented, padded ``KEY = `` prefix - the same for every value"""
+    return f"    {key:<{field_width - 4}} = "
 
 
 class BaseTemplate(ABC):
     """Base class for all PCX template generators"""
 
+    # Shared by every template; keys include the template class
+    render_cache = RenderCache()
+
     def __init__(self):
         """Initialize base template"""
         self.field_width = 30  # Standard PCX field width for alignment
@@ -14,7 +26,7 @@ class BaseTemplate(ABC):
     def format_field(self, key: str, value: str) -> str:
         """Format a key-value pair with proper PCX spacing"""
         # PCX format requires keys padded to column 30
-        return f"    {key:<{self.field_width - 4}} = {value}"
+        return _field_prefix(key, self.field_width) + value
 
     def generate_block(self, block_type: str, fields: Dict[str, Any]) -> str:
         """Generate a formatted PCX block"""
@@ -27,6 +39,12 @@ class BaseTemplate(ABC):
 
         return "\n".join(lines)
 
+    def compile_block(
+        self, block_type: str, fields: Tuple[Field, ...], indent: int = 0
+    ) -> CompiledBlock:
+        """Precompiled layout for a block at this template's field width"""
+        return compile_block(block_type, fields, indent, self.field_width)
+
     @abstractmethod
     def generate(self, **kwargs: Any) -> str:
         """Generate template output - must be implemented by subclasses"""
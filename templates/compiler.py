@@ -0,0 +1,133 @@
+"""Compiled PCX block layouts and a streaming block writer"""
+
+import io
+from functools import lru_cache
+from typing import Any, BinaryIO, Optional, TextIO, Tuple, Union, cast
+
+# A field is either a key whose value is passed at render time, or a
+# (key, value) pair baked into the layout
+Field = Union[str, Tuple[str, str]]
+
+
+class CompiledBlock:
+    """A block layout precompiled into a single format string
+
+    Rendering is one ``str.format`` call with the variable values in
+    field order - no per-field padding or list joins. Layouts can be
+    concatenated with ``+`` to render nested blocks (a RULE and its
+    RULECOMPONENTs) in the same call.
+    """
+
+    __slots__ = ('template', 'slots', 'render')
+
+    def __init__(self, template: str, slots: int) -> None:
+        self.template = template
+        self.slots = slots
+        self.render = template.format
+
+    def __repr__(self) -> str:
+        first_line = self.template.split('\n', 1)[0].strip()
+        return f"CompiledBlock({first_line!r}, slots={self.slots})"
+
+    def __add__(self, other: 'CompiledBlock') -> 'CompiledBlock':
+        return CompiledBlock(
+            self.template + '\n' + other.template, self.slots + other.slots
+        )
+
+
+@lru_cache(maxsize=256)
+def compile_fields(
+    fields: Tuple[Field, ...], indent: int = 0, field_width: int = 30
+) -> CompiledBlock:
+    """Compile field lines without an ``ADD`` line
+
+    Fields sit four spaces deeper than ``indent`` with keys padded so
+    ``=`` lines up the same way BaseTemplate.format_field pads them.
+    """
+    prefix = ' ' * (indent + 4)
+    lines = []
+    slots = 0
+
+    for field in fields:
+        if isinstance(field, tuple):
+            key, value = field
+            value = value.replace('{', '{{').replace('}', '}}')
+        else:
+            key, value = field, '{}'
+            slots += 1
+        lines.append(f"{prefix}{key:<{field_width - 4}} = {value}")
+
+    return CompiledBlock('\n'.join(lines), slots)
+
+
+@lru_cache(maxsize=256)
+def compile_block(
+    block_type: str,
+    fields: Tuple[Field, ...],
+    indent: int = 0,
+    field_width: int = 30
+) -> CompiledBlock:
+    """Compile a block layout; ``indent`` is that of the ``ADD`` line"""
+    header = CompiledBlock(' ' * indent + f"ADD {block_type}", 0)
+    if not fields:
+        return header
+    return header + compile_fields(fields, indent, field_width)
+
+
+class BlockWriter:
+    """Write blocks straight into a text or binary file handle
+
+    Blocks are separated by a blank line and the output ends with one
+    newline, matching how generated import files are laid out.
+    """
+
+    def __init__(
+        self,
+        target: Union[TextIO, BinaryIO],
+        separator: str = '\n\n',
+        terminator: str = '\n',
+        encoding: str = 'utf-8'
+    ) -> None:
+        self.target = target
+        self.separator = separator
+        self.terminator = terminator
+        self.encoding = encoding
+        self.count = 0
+        binary = isinstance(
+            target, (io.RawIOBase, io.BufferedIOBase)
+        ) or 'b' in getattr(target, 'mode', '')
+        # Exactly one is set, so each write has a single stream type
+        self._binary_target: Optional[BinaryIO] = (
+            cast(BinaryIO, target) if binary else None
+        )
+        self._text_target: Optional[TextIO] = (
+            None if binary else cast(TextIO, target)
+        )
+
+    def __enter__(self) -> 'BlockWriter':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.finish()
+
+    def write(self, layout: CompiledBlock, *values: Any) -> None:
+        """Render a compiled layout and write it as the next block"""
+        self.write_text(layout.render(*values))
+
+    def write_text(self, text: str) -> None:
+        """Write already rendered block text"""
+        if self.count:
+            text = self.separator + text
+        self.count += 1
+        self._write_raw(text)
+
+    def finish(self) -> None:
+        """Terminate the output if any blocks were written"""
+        if self.count and self.terminator:
+            self._write_raw(self.terminator)
+
+    def _write_raw(self, text: str) -> None:
+        if self._binary_target is not None:
+            self._binary_target.write(text.encode(self.encoding))
+        elif self._text_target is not None:
+            self._text_target.write(text)
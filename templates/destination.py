@@ -1,10 +1,44 @@
 """Destination template generation"""
 
-from typing import Any
+from typing import Any, Tuple
 from templates.base import BaseTemplate
+from templates.compiler import BlockWriter, compile_block
+from templates.render_cache import cached_render
 
 
 class DestinationTemplate(BaseTemplate):
+    # Destination layouts keep their historical alignment rather than
+    # following field_width
+    PRINTER_LAYOUT = compile_block("DESTINATION", (
+        "NAME",
+        ("TYPE", "Print Server"),
+        ("PRINTSERVER", "vpsx"),
+        "PRINTERNAME",
+        ("FILENAME", "&FILEPRE"),
+        ("COPIES", "2"),
+        ("TITLE", "&ADVREPORTDESC"),
+        "CLASS",
+        "FORM",
+        ("JOBNAME", "&RPT_WRITER"),
+        "USERDATA4",
+        "USERDATA5",
+        "USERDATA6",
+        "USERDATA10",
+        "USERDATA11",
+        "USERDATA12",
+        "USERDATA14",
+        ("USERDATA15", "_"),
+    ), field_width=29)
+
+    FOLDER_LAYOUT = compile_block("DESTINATION", (
+        "NAME",
+        ("TYPE", "Folder"),
+        "IMPORTFOLDERPATH",
+        ("DOCUMENTNAME", "&ADVREPORT.&FILETYPE"),
+        ("TITLE", "&ADVREPORTDESC"),
+    ), field_width=30)
+
+    @cached_render
     def generate_printer(
         self,
         queue: str,
@@ -15,43 +49,76 @@ class DestinationTemplate(BaseTemplate):
         copy_num: str = "001"
     ) -> str:
         """Generate printer destination block"""
+        return self.PRINTER_LAYOUT.render(*self._printer_values(
+            queue, store_number, store_name, address, city_state_zip,
+            copy_num
+        ))
 
-        template = f"""ADD DESTINATION
-    NAME                      = {queue}~STORE{store_number}~{copy_num}
-    TYPE                      = Print Server
-    PRINTSERVER               = vpsx
-    PRINTERNAME               = {self.get_printer_name(queue)}
-    FILENAME                  = &FILEPRE
-    COPIES                    = 2
-    TITLE                     = &ADVREPORTDESC
-    CLASS                     = &RPT_{queue}_CLASS
-    FORM                      = &RPT_{queue}_FORM
-    JOBNAME                   = &RPT_WRITER
-    USERDATA4                 = OU=&RPT_{queue}_OUTPUT PA=&RPT_DFLTJ_PAGEFMT
-    USERDATA5                 = CO=&RPT_{queue}_CPYGRP CH=&RPT_DFLTJ_CHARS
-    USERDATA6                 = {store_number}(GP)STORE{store_number}
-    USERDATA10                = FLASH=&RPT_{queue}_FLASH
-    USERDATA11                = {store_name}
-    USERDATA12                = {address}
-    USERDATA14                = {city_state_zip}
-    USERDATA15                = _"""
-
-        return template.strip()
+    def write_printer(
+        self,
+        writer: BlockWriter,
+        queue: str,
+        store_number: str,
+        store_name: str,
+        address: str,
+        city_state_zip: str,
+        copy_num: str = "001"
+    ) -> None:
+        """Write a printer destination straight to a BlockWriter"""
+        writer.write(self.PRINTER_LAYOUT, *self._printer_values(
+            queue, store_number, store_name, address, city_state_zip,
+            copy_num
+        ))
 
+    def _printer_values(
+        self,
+        queue: str,
+        store_number: str,
+        store_name: str,
+        address: str,
+        city_state_zip: str,
+        copy_num: str
+    ) -> Tuple[str, ...]:
+        """Slot values for PRINTER_LAYOUT, in field order"""
+        return (
+            f"{queue}~STORE{store_number}~{copy_num}",
+            self.get_printer_name(queue),
+            f"&RPT_{queue}_CLASS",
+            f"&RPT_{queue}_FORM",
+            f"OU=&RPT_{queue}_OUTPUT PA=&RPT_DFLTJ_PAGEFMT",
+            f"CO=&RPT_{queue}_CPYGRP CH=&RPT_DFLTJ_CHARS",
+            f"{store_number}(GP)STORE{store_number}",
+            f"FLASH=&RPT_{queue}_FLASH",
+            store_name,
+            address,
+            city_state_zip,
+        )
+
+    @cached_render
     def generate_folder(self, report: str, job: str, identifier: str) -> str:
         """Generate folder destination block"""
+        return self.FOLDER_LAYOUT.render(
+            *self._folder_values(report, job, identifier)
+        )
+
+    def write_folder(
+        self, writer: BlockWriter, report: str, job: str, identifier: str
+    ) -> None:
+        """Write a folder destination straight to a BlockWriter"""
+        writer.write(
+            self.FOLDER_LAYOUT, *self._folder_values(report, job, identifier)
+        )
+
+    def _folder_values(
+        self, report: str, job: str, identifier: str
+    ) -> Tuple[str, str]:
+        """Slot values for FOLDER_LAYOUT, in field order"""
 
         # Format identifier with leading zero if needed
         formatted_id = f"0{identifier}" if len(identifier) == 3 else identifier
 
-        template = f"""ADD DESTINATION
-    NAME                       = /Reports/{report}-{job}~{formatted_id}/
-    TYPE                       = Folder
-    IMPORTFOLDERPATH           = /Reports/{report}-{job}~{formatted_id}/
-    DOCUMENTNAME               = &ADVREPORT.&FILETYPE
-    TITLE                      = &ADVREPORTDESC"""
-
-        return template.strip()
+        path = f"/Reports/{report}-{job}~{formatted_id}/"
+        return path, path
 
     def get_printer_name(self, queue: str) -> str:
         """Get printer name from queue mapping"""
@@ -0,0 +1,82 @@
+"""Memoizing render layer for PCX template generators"""
+
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
+
+RenderMethod = TypeVar('RenderMethod', bound=Callable[..., str])
+
+# Rendered blocks are ~1KB, so the default bound is a few MB at most
+DEFAULT_MAXSIZE = 4096
+
+
+class RenderCache:
+    """Bounded LRU cache of rendered PCX text"""
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Hashable, str]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[str]:
+        """Cached text for a key, marking it most recently used"""
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: str) -> None:
+        """Store rendered text, evicting the least recently used entry"""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters"""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current size"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
+
+
+def cached_render(method: RenderMethod) -> RenderMethod:
+    """Memoize a template method on its arguments
+
+    The key includes the template class and its field width, so
+    differently configured templates never share entries. Calls with
+    unhashable arguments are rendered without caching.
+    """
+    @wraps(method)
+    def wrapper(self: Any, *args: Any, **kwargs: Any) -> str:
+        key = (
+            type(self).__qualname__, method.__name__, self.field_width,
+            args, tuple(sorted(kwargs.items()))
+        )
+        try:
+            cached = self.render_cache.get(key)
+        except TypeError:
+            return method(self, *args, **kwargs)
+        if cached is not None:
+            return cached
+        rendered = method(self, *args, **kwargs)
+        self.render_cache.put(key, rendered)
+        return rendered
+
+    return wrapper  # type: ignore[return-value]
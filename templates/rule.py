@@ -1,11 +1,55 @@
 """Rule template generation"""
 
+from functools import lru_cache
+from typing import Tuple
 from templates.base import BaseTemplate
+from templates.compiler import (
+    BlockWriter, CompiledBlock, compile_block, compile_fields
+)
+from templates.render_cache import cached_render
 
 
 class RuleTemplate(BaseTemplate):
     """Template generator for PCX rules"""
 
+    # Component flags that never vary - baked into the compiled layout
+    COMPONENT_FLAGS = {
+        "ISROWCOLLEN": "N",
+        "ISROWCOLROWCOL": "N",
+        "ENFORCEBOUNDARY": "N",
+        "NUMERICCOMPARE": "N",
+        "BOOLEANCOMPARE": "N",
+        "CASESENSITIVE": "N",
+        "CONTAINSWILDCARD": "N",
+        "CONTAINSVARIABLE": "N",
+        "USEPREVIOUSPAGEVALUE": "N"
+    }
+
+    RULE_FIELDS = (
+        "RULESETNAME",
+        "SEQUENCE",
+        "DESCRIPTION",
+        ("INACTIVE", "N"),
+        ("PAGEEXCLUSIVE", "N"),
+        ("BEGINENDRULE", "Y"),
+        ("ENDEXCLUSIVE", "Y"),
+        ("BYPASSFIRSTPAGEENDCHECK", "Y"),
+        ("RULESETEXCLUSIVE", "N"),
+        ("DONOTDELIVERPAGETODEST", "N"),
+        "DESTINATIONNAME",
+    )
+
+    COMPONENT_FIELDS = (
+        ("OPENPARENTHESISCOUNT", "0"),
+        "VARIABLE",
+        "OPERATOR",
+        "VALUE",
+        "COMPARELENGTH",
+        ("CLOSEPARENTHESISCOUNT", "0"),
+        "ENDCOMPONENT",
+    ) + tuple(COMPONENT_FLAGS.items())
+
+    @cached_render
     def generate_commitment_rule(
         self,
         report: str,
@@ -16,6 +60,39 @@ class RuleTemplate(BaseTemplate):
         sequence: int = 23
     ) -> str:
         """Generate a commitment book rule with begin/end components"""
+        return self.commitment_layout().render(*self._commitment_values(
+            report, job, store_number, variable, queue, sequence
+        ))
+
+    def write_commitment_rule(
+        self,
+        writer: BlockWriter,
+        report: str,
+        job: str,
+        store_number: str,
+        variable: str,
+        queue: str,
+        sequence: int = 23
+    ) -> None:
+        """Write a commitment book rule straight to a BlockWriter"""
+        writer.write(self.commitment_layout(), *self._commitment_values(
+            report, job, store_number, variable, queue, sequence
+        ))
+
+    def commitment_layout(self) -> CompiledBlock:
+        """RULE block followed by its begin and end components"""
+        return _commitment_layout(self.field_width)
+
+    def _commitment_values(
+        self,
+        report: str,
+        job: str,
+        store_number: str,
+        variable: str,
+        queue: str,
+        sequence: int
+    ) -> Tuple[str, ...]:
+        """Slot values for commitment_layout, in field order"""
 
         # Format store number with leading zero if needed
         formatted_store = (
@@ -27,44 +104,16 @@ class RuleTemplate(BaseTemplate):
         printer_dest = f"{queue}~STORE{store_number}~001"
         description = f"{folder_dest}  [{printer_dest}]"
 
-        # Generate main rule block
-        rule_fields = {
-            "RULESETNAME": f"{report}-{job}",
-            "SEQUENCE": str(sequence),
-            "DESCRIPTION": description,
-            "INACTIVE": "N",
-            "PAGEEXCLUSIVE": "N",
-            "BEGINENDRULE": "Y",
-            "ENDEXCLUSIVE": "Y",
-            "BYPASSFIRSTPAGEENDCHECK": "Y",
-            "RULESETEXCLUSIVE": "N",
-            "DONOTDELIVERPAGETODEST": "N",
-            "DESTINATIONNAME": folder_dest,
-        }
-
-        rule_block = self.generate_block("RULE", rule_fields)
-
-        # Add second destination name manually (can appear multiple times)
-        rule_block += f"\n    DESTINATIONNAME           = {printer_dest}"
-
-        # Generate begin component
-        begin_component = self.generate_rule_component(
-            variable=variable,
-            operator="Equal",
-            value=formatted_store,
-            is_end_component=False
+        return (
+            f"{report}-{job}", str(sequence), description,
+            folder_dest, printer_dest,
+            # Begin component
+            variable, "Equal", formatted_store, "4", "N",
+            # End component
+            variable, "Not Equal", formatted_store, "4", "Y",
         )
 
-        # Generate end component
-        end_component = self.generate_rule_component(
-            variable=variable,
-            operator="Not Equal",
-            value=formatted_store,
-            is_end_component=True
-        )
-
-        return f"{rule_block}\n{begin_component}\n{end_component}"
-
+    @cached_render
     def generate_rule_component(
         self,
         variable: str,
@@ -74,37 +123,14 @@ class RuleTemplate(BaseTemplate):
         compare_length: int = 4
     ) -> str:
         """Generate a rule component block"""
-
-        component_fields = {
-            "OPENPARENTHESISCOUNT": "0",
-            "VARIABLE": variable,
-            "OPERATOR": operator,
-            "VALUE": value,
-            "COMPARELENGTH": str(compare_length),
-            "CLOSEPARENTHESISCOUNT": "0",
-            "ENDCOMPONENT": "Y" if is_end_component else "N",
-            "ISROWCOLLEN": "N",
-            "ISROWCOLROWCOL": "N",
-            "ENFORCEBOUNDARY": "N",
-            "NUMERICCOMPARE": "N",
-            "BOOLEANCOMPARE": "N",
-            "CASESENSITIVE": "N",
-            "CONTAINSWILDCARD": "N",
-            "CONTAINSVARIABLE": "N",
-            "USEPREVIOUSPAGEVALUE": "N"
-        }
-
-        component_block = self.generate_block(
-            "RULECOMPONENT", component_fields
+        # Rendered already indented (it's nested under RULE)
+        layout = self.compile_block(
+            "RULECOMPONENT", self.COMPONENT_FIELDS, indent=4
+        )
+        return layout.render(
+            variable, operator, value, str(compare_length),
+            "Y" if is_end_component else "N"
         )
-
-        # Indent the component block (it's nested under RULE)
-        indented_lines = [
-            "    " + line
-            for line in component_block.split("\n")
-        ]
-
-        return "\n".join(indented_lines)
 
     def generate(self, **kwargs) -> str:
         """Generic generate method - routes to specific generators"""
@@ -112,3 +138,16 @@ class RuleTemplate(BaseTemplate):
             return self.generate_commitment_rule(**kwargs)
         else:
             raise ValueError("Missing required parameters for rule generation")
+
+
+@lru_cache(maxsize=8)
+def _commitment_layout(field_width: int) -> CompiledBlock:
+    """Compiled commitment rule layout for a field width"""
+    component = compile_block(
+        "RULECOMPONENT", RuleTemplate.COMPONENT_FIELDS, 4, field_width
+    )
+    rule = compile_block("RULE", RuleTemplate.RULE_FIELDS, 0, field_width)
+    # The second destination (can appear multiple times) has always been
+    # aligned one column short of the other fields
+    printer_destination = compile_fields(("DESTINATIONNAME",), 0, 29)
+    return rule + printer_destination + component + component
@@ -1,7 +1,25 @@
 """Tax Report Template Generation"""
 
-from typing import List, Any
+from typing import List, Any, Optional, TextIO, Tuple
+import io
+import os
 from templates.base import BaseTemplate
+from templates.compiler import BlockWriter, compile_block
+from templates.render_cache import cached_render
+from utils.profiling import span
+
+# Below this many rules, starting worker processes costs more than it saves
+PARALLEL_MIN_RULES = 5000
+SHARDS_PER_WORKER = 4
+
+
+def _render_shard(task: Tuple[List[str], List[str]]) -> str:
+    """Worker: consolidated rules for one shard, without the final newline"""
+    companies, reports = task
+    buffer = io.StringIO()
+    writer = BlockWriter(buffer, terminator='')
+    TaxReportTemplate().write_rules(writer, companies, reports)
+    return buffer.getvalue()
 
 
 class TaxReportTemplate(BaseTemplate):
@@ -18,6 +36,37 @@ class TaxReportTemplate(BaseTemplate):
         'TAX010HA': ['PPA0951W', 'PPA8906R'],
         'TAX010ST': ['PPA0951W', 'PPA8910R']
     }
+
+    COMPANY_RULE_LAYOUT = (
+        compile_block("RULE", (
+            "RULESETNAME",
+            "SEQUENCE",
+            "DESCRIPTION",
+            ("INACTIVE", "N"),
+            ("PAGEEXCLUSIVE", "N"),
+            ("BEGINENDRULE", "Y"),
+            ("ENDEXCLUSIVE", "Y"),
+            ("BYPASSFIRSTPAGEENDCHECK", "Y"),
+            ("RULESETEXCLUSIVE", "N"),
+            "DESTINATIONNAME",
+        ), field_width=29)
+        # Begin component
+        + compile_block("RULECOMPONENT", (
+            ("VARIABLE", "&RPT_COMPANY"),
+            ("OPERATOR", "Equal"),
+            "VALUE",
+            ("COMPARELENGTH", "3"),
+            ("ENDCOMPONENT", "N"),
+        ), indent=4, field_width=25)
+        # End component
+        + compile_block("RULECOMPONENT", (
+            ("VARIABLE", "&RPT_COMPANY"),
+            ("OPERATOR", "Not Equal"),
+            "VALUE",
+            ("COMPARELENGTH", "3"),
+            ("ENDCOMPONENT", "Y"),
+        ), indent=4, field_width=25)
+    )
     
     def generate_consolidated(self, companies: List[str], reports: List[str]) -> str:
         """Generate consolidated configuration for multiple companies"""
@@ -33,39 +82,86 @@ class TaxReportTemplate(BaseTemplate):
                     content.append("")
         
         return '\n'.join(content)
-    
+
+    def rule_count(self, companies: List[str], reports: List[str]) -> int:
+        """Number of rules generate_consolidated would produce"""
+        jobs = sum(len(self.TAX_REPORT_JOBS.get(r, [])) for r in reports)
+        return jobs * len(companies)
+
+    def write_consolidated(
+        self,
+        target: TextIO,
+        companies: List[str],
+        reports: List[str],
+        workers: Optional[int] = None
+    ) -> int:
+        """Stream the consolidated configuration to an open file
+
+        Writes exactly what generate_consolidated returns without
+        building it in memory. Large runs are split into contiguous
+        shards of companies rendered by worker processes; shards are
+        written in order as they finish, so output is deterministic.
+        Returns the number of rules written.
+        """
+        total = self.rule_count(companies, reports)
+        workers = workers or os.cpu_count() or 1
+
+        with span('render', 'consolidated rules', block_count=total), \
+                BlockWriter(target) as writer:
+            if workers > 1 and total >= PARALLEL_MIN_RULES:
+                # Only large runs pay for importing the process pool
+                from concurrent.futures import ProcessPoolExecutor
+                size = -(-len(companies) // (workers * SHARDS_PER_WORKER))
+                tasks = [
+                    (companies[i:i + size], reports)
+                    for i in range(0, len(companies), size)
+                ]
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    for shard in executor.map(_render_shard, tasks):
+                        if shard:
+                            writer.write_text(shard)
+            else:
+                self.write_rules(writer, companies, reports)
+        return total
+
+    def write_rules(
+        self, writer: BlockWriter, companies: List[str], reports: List[str]
+    ) -> None:
+        """Write every company rule in generate_consolidated order"""
+        for company in companies:
+            for report in reports:
+                for job in self.TAX_REPORT_JOBS.get(report, []):
+                    self.write_rule_for_company(writer, report, job, company)
+
+    @cached_render
     def generate_rule_for_company(self, report: str, job: str, company: str) -> str:
         """Generate rule for a single company"""
-        lines = []
-        lines.append("ADD RULE")
-        lines.append(f"    RULESETNAME               = {report}-{job}")
-        lines.append(f"    SEQUENCE                  = {company}")
-        lines.append(f"    DESCRIPTION               = Company {company} - {report}")
-        lines.append(f"    INACTIVE                  = N")
-        lines.append(f"    PAGEEXCLUSIVE             = N")
-        lines.append(f"    BEGINENDRULE              = Y")
-        lines.append(f"    ENDEXCLUSIVE              = Y")
-        lines.append(f"    BYPASSFIRSTPAGEENDCHECK   = Y")
-        lines.append(f"    RULESETEXCLUSIVE          = N")
-        lines.append(f"    DESTINATIONNAME           = /Reports/{report}-{job}~{company}/")
-        
-        # Begin component
-        lines.append("    ADD RULECOMPONENT")
-        lines.append("        VARIABLE              = &RPT_COMPANY")
-        lines.append("        OPERATOR              = Equal")
-        lines.append(f"        VALUE                 = {company}")
-        lines.append("        COMPARELENGTH         = 3")
-        lines.append("        ENDCOMPONENT          = N")
-        
-        # End component
-        lines.append("    ADD RULECOMPONENT")
-        lines.append("        VARIABLE              = &RPT_COMPANY")
-        lines.append("        OPERATOR              = Not Equal")
-        lines.append(f"        VALUE                 = {company}")
-        lines.append("        COMPARELENGTH         = 3")
-        lines.append("        ENDCOMPONENT          = Y")
-        
-        return '\n'.join(lines)
+        return self.COMPANY_RULE_LAYOUT.render(
+            *self._company_values(report, job, company)
+        )
+
+    def write_rule_for_company(
+        self, writer: BlockWriter, report: str, job: str, company: str
+    ) -> None:
+        """Write a company rule straight to a BlockWriter"""
+        writer.write(
+            self.COMPANY_RULE_LAYOUT,
+            *self._company_values(report, job, company)
+        )
+
+    @staticmethod
+    def _company_values(
+        report: str, job: str, company: str
+    ) -> Tuple[str, ...]:
+        """Slot values for COMPANY_RULE_LAYOUT, in field order"""
+        return (
+            f"{report}-{job}",
+            company,
+            f"Company {company} - {report}",
+            f"/Reports/{report}-{job}~{company}/",
+            company,
+            company,
+        )
     
     def generate(self, **kwargs: Any) -> str:
         """Generic generate method"""
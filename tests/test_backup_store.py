@@ -0,0 +1,62 @@
+"""Chunk deduplication and restores of BackupStore"""
+
+import json
+from pathlib import Path
+from benchmarks.synthetic import SyntheticExport, SyntheticSpec
+from utils.backup_store import MAX_CHUNK_SIZE, BackupStore
+
+NEW_DESTINATION = (
+    b"ADD DESTINATION\n"
+    b"    NAME                       = /Reports/NEW~0001/\n"
+    b"    TYPE                       = Folder\n\n"
+)
+
+
+def new_bytes(manifest: Path) -> int:
+    return json.loads(manifest.read_text())['new_bytes']
+
+
+def test_small_insert_stores_little_new_data(tmp_path):
+    export = SyntheticExport(SyntheticSpec(size_mb=8)).ensure(tmp_path)
+    store = BackupStore(tmp_path / 'backups')
+    store.backup(export)
+
+    data = export.read_bytes()
+    middle = data.find(b'\nADD DESTINATION', len(data) // 3) + 1
+    export.write_bytes(data[:middle] + NEW_DESTINATION + data[middle:])
+    manifest = store.backup(export)
+
+    assert new_bytes(manifest) < MAX_CHUNK_SIZE
+    assert new_bytes(manifest) < len(data) // 50
+
+
+def test_unchanged_file_stores_nothing(tmp_path):
+    export = SyntheticExport(SyntheticSpec(size_mb=2)).ensure(tmp_path)
+    store = BackupStore(tmp_path / 'backups')
+    store.backup(export)
+    assert new_bytes(store.backup(export)) == 0
+
+
+def test_restore_round_trip(tmp_path):
+    export = SyntheticExport(SyntheticSpec(size_mb=2)).ensure(tmp_path)
+    store = BackupStore(tmp_path / 'backups')
+    manifest = store.backup(export)
+
+    restored = store.restore(manifest, tmp_path / 'restored.txt')
+    assert restored.read_bytes() == export.read_bytes()
+    assert store.verify(manifest)
+
+
+def test_truncated_chunk_is_written_again(tmp_path):
+    export = SyntheticExport(SyntheticSpec(size_mb=2)).ensure(tmp_path)
+    store = BackupStore(tmp_path / 'backups')
+    manifest = store.backup(export)
+
+    # As left by a crash before the chunks were synced
+    digest, _ = json.loads(manifest.read_text())['chunks'][0]
+    store.chunk_path(digest).write_bytes(b'')
+    assert not store.verify(manifest)
+
+    assert new_bytes(store.backup(export)) > 0
+    assert store.verify(manifest)
+    assert not list((tmp_path / 'backups' / 'chunks').glob('*/*.tmp'))
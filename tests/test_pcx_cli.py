@@ -0,0 +1,43 @@
+"""Exit codes and output of the non-interactive command line"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+CLI = Path(__file__).resolve().parent.parent / 'pcx_cli.py'
+
+RULE_ONLY = (
+    "ADD RULE\n"
+    "    RULESETNAME               = TAX001\n"
+    "    SEQUENCE                  = 1\n"
+    "ADD RULECOMPONENT\n"
+    "    VARIABLE                  = &RPT_COMPANY\n"
+    "    VALUE                     = 100\n"
+)
+
+
+def run_cli(*args: str, stdin: str = '') -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, str(CLI), *args], input=stdin,
+        capture_output=True, text=True
+    )
+
+
+def test_stats_stdin_matches_file(tmp_path: Path) -> None:
+    export = tmp_path / 'export.txt'
+    export.write_text(RULE_ONLY)
+
+    from_file = run_cli('stats', '--json', str(export))
+    from_stdin = run_cli('stats', '--json', '-', stdin=RULE_ONLY)
+    assert from_file.returncode == from_stdin.returncode == 0
+    assert from_stdin.stdout == from_file.stdout
+    assert 'RULECOMPONENT' not in from_stdin.stdout
+
+
+def test_legacy_validate_fails_on_invalid_file(tmp_path: Path) -> None:
+    export = tmp_path / 'export.txt'
+    export.write_text(RULE_ONLY)
+
+    result = run_cli('--validate', str(export))
+    assert result.returncode == 1
+    assert 'Missing required section' in result.stdout
@@ -0,0 +1,106 @@
+"""Block boundaries found by PCXScanner and the edits built on them"""
+
+from pathlib import Path
+from utils.pcx_index import PCXBlockIndex
+from utils.pcx_patch import PCXPatchSet
+from utils.pcx_scanner import PCXScanner
+from utils.pcx_schema import PCXSchemaManager
+
+COMMENT_INSIDE = (
+    "ADD RULE\n"
+    "    RULESETNAME               = TAX001\n"
+    "    SEQUENCE                  = 1\n"
+    "* note\n"
+    "    DESTINATIONNAME           = X\n"
+)
+
+COMPONENT_UNINDENTED = (
+    "ADD RULE\n"
+    "    RULESETNAME               = TAX001\n"
+    "    SEQUENCE                  = 1\n"
+    "    DESTINATIONNAME           = X\n"
+    "ADD RULECOMPONENT\n"
+    "    VARIABLE                  = &RPT_COMPANY\n"
+    "    VALUE                     = 100\n"
+)
+
+NEW_RULE = (
+    "ADD RULE\n"
+    "    RULESETNAME               = TAX001\n"
+    "    SEQUENCE                  = 2\n"
+    "    DESTINATIONNAME           = Y"
+)
+
+
+def write_export(tmp_path: Path, rule: str) -> Path:
+    export = tmp_path / 'export.txt'
+    export.write_text(
+        "* Export\n\n"
+        "ADD DESTINATION\n"
+        "    NAME                      = X\n\n"
+        f"{rule}\n"
+        "* Report definitions\n"
+        "ADD REPORTDEFN\n"
+        "    NAME                      = TAX001\n"
+    )
+    return export
+
+
+def blocks(export: Path):
+    with PCXScanner(export) as scanner:
+        return [
+            (block_type, scanner.data[start:end].decode())
+            for block_type, start, end in scanner.iter_blocks()
+        ]
+
+
+def insert_rule(export: Path) -> str:
+    patches = PCXPatchSet(export)
+    patches.insert_into_section('RULE', NEW_RULE)
+    patches.apply()
+    return export.read_text()
+
+
+def test_comment_inside_block_is_kept(tmp_path):
+    export = write_export(tmp_path, COMMENT_INSIDE)
+    assert blocks(export)[1] == ('RULE', COMMENT_INSIDE)
+
+
+def test_unindented_component_stays_with_rule(tmp_path):
+    export = write_export(tmp_path, COMPONENT_UNINDENTED)
+    assert blocks(export)[1] == ('RULE', COMPONENT_UNINDENTED)
+    assert [block_type for block_type, _ in blocks(export)] == [
+        'DESTINATION', 'RULE', 'REPORTDEFN'
+    ]
+
+
+def test_trailing_comment_is_not_part_of_block(tmp_path):
+    export = write_export(tmp_path, COMMENT_INSIDE)
+    with PCXScanner(export) as scanner:
+        start = next(scanner.find_block_starts('RULE'))
+        text = scanner.data[start:scanner.block_end(start)].decode()
+    assert text == COMMENT_INSIDE
+
+
+def test_insert_after_rule_with_inner_comment(tmp_path):
+    export = write_export(tmp_path, COMMENT_INSIDE)
+    assert f"{COMMENT_INSIDE}\n{NEW_RULE}\n" in insert_rule(export)
+
+
+def test_insert_after_rule_with_unindented_component(tmp_path):
+    export = write_export(tmp_path, COMPONENT_UNINDENTED)
+    assert f"{COMPONENT_UNINDENTED}\n{NEW_RULE}\n" in insert_rule(export)
+
+
+def test_index_key_ignores_unindented_component(tmp_path):
+    export = write_export(tmp_path, COMPONENT_UNINDENTED)
+    index = PCXBlockIndex.open(export)
+    assert index.find('RULE', 'TAX001:1') is not None
+
+
+def test_schema_save_keeps_unindented_component(tmp_path: Path) -> None:
+    export = write_export(tmp_path, COMPONENT_UNINDENTED)
+    schema = PCXSchemaManager(export, streaming=True)
+    assert 'RULECOMPONENT' not in schema.sections
+    schema.save()
+    assert COMPONENT_UNINDENTED in export.read_text()
@@ -0,0 +1,259 @@
+"""Content-addressed, deduplicating backup store for PCX exports"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import zlib
+from utils.file_commit import atomic_write, copy_mode, copy_range, sync_files
+from utils.pcx_scanner import PCXScanner
+from utils.profiling import span
+from utils.progress import advance, track
+
+MANIFEST_VERSION = 1
+
+# Chunks end just before a top-level ADD line, so an edited block only
+# changes the chunk that holds it
+BOUNDARY = b'\nADD '
+MIN_CHUNK_SIZE = 16 * 1024  # 16KB
+AVERAGE_CHUNK_SIZE = 64 * 1024  # 64KB
+MAX_CHUNK_SIZE = 512 * 1024  # 512KB
+
+
+def iter_chunks(data: Union[bytes, mmap.mmap]) -> Iterator[Tuple[int, int]]:
+    """Yield content-defined (start, end) chunk ranges covering ``data``
+
+    Whether a block ends a chunk depends only on that block's bytes, so
+    inserting, editing or deleting a block changes the chunk holding it
+    and leaves every other cut where it was. A chunk that reaches
+    MAX_CHUNK_SIZE is cut before its last block instead; that is rare,
+    and an edit can then re-store at most a few hundred KB.
+    """
+    size = len(data)
+    start = 0  # Current chunk
+    block = 0  # Current block
+    with memoryview(data) as view:
+        while block < size:
+            position = data.find(BOUNDARY, block)
+            end = size if position == -1 else position + 1
+            if end - start > MAX_CHUNK_SIZE:
+                if block > start:
+                    yield start, block
+                    start = block
+                # A single block too large for one chunk
+                while end - start > MAX_CHUNK_SIZE:
+                    yield start, start + MAX_CHUNK_SIZE
+                    start += MAX_CHUNK_SIZE
+            # The hash picks cuts with a chance proportional to block
+            # size, so chunks average AVERAGE_CHUNK_SIZE for any block mix
+            if (
+                end - start >= MIN_CHUNK_SIZE
+                and zlib.crc32(view[block:end]) % AVERAGE_CHUNK_SIZE
+                < end - block
+            ):
+                yield start, end
+                start = end
+            block = end
+    if start < size:
+        yield start, size
+
+
+class BackupStore:
+    """Keep backups as manifests of shared, content-addressed chunks
+
+    Each unique chunk is stored once under ``chunks/`` by its hash, and
+    each backup is a small JSON manifest under ``manifests/`` listing
+    the chunks in order. Backing up an edited export only writes the
+    chunks that changed.
+    """
+
+    def __init__(self, root: Optional[Path] = None) -> None:
+        if root is None:
+            from config.settings import BACKUP_DIR
+            root = BACKUP_DIR
+        self.root = root
+        self.chunk_dir = root / 'chunks'
+        self.manifest_dir = root / 'manifests'
+
+    def chunk_path(self, digest: str) -> Path:
+        return self.chunk_dir / digest[:2] / digest
+
+    def backup(self, file_path: Path) -> Path:
+        """Store a backup of a file, returning its manifest path"""
+        self.manifest_dir.mkdir(exist_ok=True, parents=True)
+        chunks: List[Tuple[str, int]] = []
+        written: List[Path] = []
+        file_hash = hashlib.blake2b(digest_size=16)
+        new_bytes = 0
+
+        with PCXScanner(file_path) as scanner, \
+                span('copy', 'backup', scanner.size), \
+                track(f"Backing up {file_path.name}", scanner.size):
+            view = memoryview(scanner.data)
+            try:
+                for start, end in iter_chunks(scanner.data):
+                    with view[start:end] as data:
+                        digest = hashlib.blake2b(
+                            data, digest_size=16
+                        ).hexdigest()
+                        file_hash.update(data)
+                    chunks.append((digest, end - start))
+
+                    path = self.chunk_path(digest)
+                    if self._has_chunk(path, end - start):
+                        # Stored chunks are done; new ones count as copied
+                        advance(end - start)
+                        continue
+                    self._write_chunk(path, scanner, start, end)
+                    written.append(path)
+                    new_bytes += end - start
+            finally:
+                view.release()
+
+        # One sync for every new chunk, before the manifest refers to them
+        if written:
+            sync_files(written)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        manifest_path = self._unique_manifest_path(
+            f"{file_path.stem}_backup_{timestamp}"
+        )
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'source': str(file_path),
+            'created': datetime.now().isoformat(),
+            'size': sum(length for _, length in chunks),
+            'digest': file_hash.hexdigest(),
+            'new_bytes': new_bytes,
+            'chunks': chunks,
+        }
+        with atomic_write(manifest_path) as target:
+            target.write(json.dumps(manifest).encode('utf-8'))
+        return manifest_path
+
+    @staticmethod
+    def _has_chunk(path: Path, length: int) -> bool:
+        """Whether a chunk is stored whole
+
+        A chunk cut short by a crash before it was synced has the wrong
+        size and is written again.
+        """
+        try:
+            return path.stat().st_size == length
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _write_chunk(
+        path: Path, scanner: PCXScanner, start: int, end: int
+    ) -> None:
+        """Write a chunk under a temp name and rename it into place
+
+        Unlike atomic_write nothing is fsynced here; backup() syncs all
+        new chunks once at the end, so a large first backup does not
+        pay two fsyncs per chunk.
+        """
+        path.parent.mkdir(exist_ok=True, parents=True)
+        fd, name = tempfile.mkstemp(
+            prefix=f".{path.name}.", suffix='.tmp', dir=path.parent
+        )
+        temp_path = Path(name)
+        try:
+            with os.fdopen(fd, 'wb') as target:
+                scanner.write_range(target, start, end)
+            copy_mode(path, temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+    def load_manifest(self, manifest_path: Path) -> Dict:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported backup manifest: {manifest_path}")
+        return manifest
+
+    def restore(
+        self, manifest_path: Path, target_path: Optional[Path] = None
+    ) -> Path:
+        """Rebuild a backed-up file, by default at its original path
+
+        Chunks are streamed into a temp file that atomically replaces
+        the target, so a failed restore never leaves a partial file.
+        """
+        manifest = self.load_manifest(manifest_path)
+        target_path = target_path or Path(manifest['source'])
+
+        with track(f"Restoring {target_path.name}", manifest['size']), \
+                atomic_write(target_path) as target:
+            for digest, length in manifest['chunks']:
+                path = self.chunk_path(digest)
+                if not path.exists():
+                    raise ValueError(f"Backup chunk missing: {digest}")
+                with open(path, 'rb') as chunk:
+                    copy_range(chunk, target, 0, length)
+            if target.tell() != manifest['size']:
+                raise ValueError(
+                    f"Restored {target.tell()} bytes, "
+                    f"expected {manifest['size']}"
+                )
+        return target_path
+
+    def verify(self, manifest_path: Path) -> bool:
+        """Re-hash every chunk of a backup against its manifest"""
+        manifest = self.load_manifest(manifest_path)
+        file_hash = hashlib.blake2b(digest_size=16)
+        for digest, _ in manifest['chunks']:
+            path = self.chunk_path(digest)
+            if not path.exists():
+                return False
+            data = path.read_bytes()
+            if hashlib.blake2b(data, digest_size=16).hexdigest() != digest:
+                return False
+            file_hash.update(data)
+        return file_hash.hexdigest() == manifest['digest']
+
+    def backups(self, name: Optional[str] = None) -> List[Path]:
+        """Manifest paths, oldest first, optionally for one file stem"""
+        if not self.manifest_dir.exists():
+            return []
+        pattern = f"{name}_backup_*.json" if name else '*.json'
+        return sorted(self.manifest_dir.glob(pattern))
+
+    def remove(self, manifest_path: Path) -> int:
+        """Delete a backup and any chunks no other backup uses
+
+        Returns the number of bytes freed.
+        """
+        manifest_path.unlink()
+        return self.collect_garbage()
+
+    def collect_garbage(self) -> int:
+        """Delete chunks not referenced by any manifest"""
+        referenced: Set[str] = set()
+        for manifest_path in self.backups():
+            referenced.update(
+                digest for digest, _ in
+                self.load_manifest(manifest_path)['chunks']
+            )
+
+        freed = 0
+        if self.chunk_dir.exists():
+            for path in self.chunk_dir.glob('*/*'):
+                if path.name not in referenced:
+                    freed += path.stat().st_size
+                    path.unlink()
+        return freed
+
+    def _unique_manifest_path(self, stem: str) -> Path:
+        """Manifest path that does not collide with one from this second"""
+        path = self.manifest_dir / f"{stem}.json"
+        counter = 1
+        while path.exists():
+            path = self.manifest_dir / f"{stem}_{counter}.json"
+            counter += 1
+        return path
@@ -0,0 +1,289 @@
+"""Streaming bulk import of store and company lists into PCX blocks"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import (
+    Callable, Dict, Iterator, List, Optional, TextIO, Tuple, Union
+)
+import csv
+import shutil
+import tempfile
+
+from config.mappings import COMMITMENT_BOOKS
+from templates.destination import DestinationTemplate
+from templates.rule import RuleTemplate
+from templates.tax_report import TaxReportTemplate
+from utils.profiling import span
+
+Row = Dict[str, str]
+
+# Turns one row into its (destination blocks, rule blocks)
+Renderer = Callable[[Row], Tuple[List[str], List[str]]]
+
+# Accepted spellings of each column, after normalizing the header
+COLUMN_ALIASES = {
+    'number': ('number', 'store', 'store_number', 'store_no'),
+    'name': ('name', 'store_name'),
+    'address': ('address', 'street'),
+    'city_state_zip': ('city_state_zip', 'city_state', 'csz'),
+    'books': ('books', 'commitment_books'),
+    'company': ('company', 'company_number', 'company_no'),
+    'reports': ('reports', 'tax_reports'),
+}
+
+
+def _normalize_header(header: object) -> str:
+    return str(header or '').strip().lower().replace(' ', '_')
+
+
+def _normalize_row(raw: Dict[str, object]) -> Row:
+    """Map a raw row onto canonical column names"""
+    values = {
+        _normalize_header(key): '' if value is None else str(value).strip()
+        for key, value in raw.items()
+    }
+    row: Row = {}
+    for column, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if values.get(alias):
+                row[column] = values[alias]
+                break
+    return row
+
+
+def iter_csv_rows(
+    source: Union[Path, TextIO]
+) -> Iterator[Tuple[int, Row]]:
+    """Stream (row number, row) pairs from a CSV file with a header
+
+    ``source`` is a path or an open text stream such as stdin.
+    """
+    if not isinstance(source, Path):
+        for row_num, raw in enumerate(csv.DictReader(source), 2):
+            yield row_num, _normalize_row(raw)
+        return
+    with open(source, 'r', encoding='utf-8-sig', newline='') as f:
+        yield from iter_csv_rows(f)
+
+
+def iter_xlsx_rows(
+    file_path: Path, sheet: Optional[str] = None
+) -> Iterator[Tuple[int, Row]]:
+    """Stream (row number, row) pairs from an Excel sheet with a header
+
+    Uses openpyxl's read-only mode, which loads rows lazily instead of
+    building the whole workbook in memory.
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError(
+            "Excel import needs openpyxl - pip install openpyxl"
+        ) from None
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        rows = worksheet.iter_rows(values_only=True)
+        headers = next(rows, None)
+        if headers is None:
+            return
+        for row_num, values in enumerate(rows, 2):
+            if not any(value is not None for value in values):
+                continue
+            yield row_num, _normalize_row(dict(zip(headers, values)))
+    finally:
+        workbook.close()
+
+
+def iter_rows(file_path: Path) -> Iterator[Tuple[int, Row]]:
+    """Stream rows from a CSV or Excel file, chosen by extension"""
+    if file_path.suffix.lower() in ('.xlsx', '.xlsm'):
+        return iter_xlsx_rows(file_path)
+    return iter_csv_rows(file_path)
+
+
+def store_blocks(
+    store: Row,
+    report: str,
+    books: List[str],
+    destinations: DestinationTemplate,
+    rules: RuleTemplate
+) -> Tuple[List[str], List[str]]:
+    """Destination and rule blocks setting up commitment books for a store
+
+    A printer destination is generated per queue only when the store
+    has a name; folder destinations and rules are generated per book.
+    """
+    number = store.get('number', '')
+    if not number.isdigit() or len(number) > 4:
+        raise ValueError(f"Invalid store number: {number!r}")
+
+    new_destinations: List[str] = []
+    new_rules: List[str] = []
+    queues_done = set()
+
+    for book in books:
+        if book not in COMMITMENT_BOOKS:
+            raise ValueError(f"Unknown commitment book: {book}")
+        mapping = COMMITMENT_BOOKS[book]
+
+        if mapping['queue'] not in queues_done and store.get('name'):
+            new_destinations.append(destinations.generate_printer(
+                queue=mapping['queue'],
+                store_number=number,
+                store_name=store['name'],
+                address=store.get('address', ''),
+                city_state_zip=store.get('city_state_zip', '')
+            ))
+            queues_done.add(mapping['queue'])
+
+        new_destinations.append(
+            destinations.generate_folder(report, book, number)
+        )
+        new_rules.append(rules.generate_commitment_rule(
+            report=report,
+            job=book,
+            store_number=number,
+            variable=mapping['variable'],
+            queue=mapping['queue']
+        ))
+
+    return new_destinations, new_rules
+
+
+@dataclass
+class RowError:
+    """A row that could not be turned into PCX blocks"""
+    row: int
+    message: str
+
+    def __str__(self) -> str:
+        return f"Row {self.row}: {self.message}"
+
+
+@dataclass
+class ImportResult:
+    """Summary of a bulk import run"""
+    rows: int = 0
+    destinations: int = 0
+    rules: int = 0
+    errors: List[RowError] = field(default_factory=list)
+
+
+class BulkImporter:
+    """Turn streamed rows into a PCX import file with flat memory
+
+    Destinations are written straight to the output and rules to a
+    spill file that is appended at the end, so every destination still
+    precedes the rules that use it without holding either in memory.
+    ``output`` is a path or an open text stream such as stdout.
+    """
+
+    def __init__(self, output: Union[Path, TextIO]) -> None:
+        self.output = output
+        self.destination_template = DestinationTemplate()
+        self.rule_template = RuleTemplate()
+        self.tax_template = TaxReportTemplate()
+
+    def import_stores(
+        self,
+        rows: Iterator[Tuple[int, Row]],
+        report: str,
+        books: Optional[List[str]] = None
+    ) -> ImportResult:
+        """Commitment book setup for every store row"""
+        default_books = books or list(COMMITMENT_BOOKS)
+
+        def render(row: Row) -> Tuple[List[str], List[str]]:
+            row_books = (
+                [b.strip() for b in row['books'].split(';') if b.strip()]
+                if row.get('books') else default_books
+            )
+            return store_blocks(
+                row, report, row_books,
+                self.destination_template, self.rule_template
+            )
+
+        return self._run(rows, render, "Store commitment books")
+
+    def import_companies(
+        self,
+        rows: Iterator[Tuple[int, Row]],
+        reports: Optional[List[str]] = None
+    ) -> ImportResult:
+        """Tax report rules for every company row"""
+        def render(row: Row) -> Tuple[List[str], List[str]]:
+            company = row.get('company', '')
+            if not company.isdigit():
+                raise ValueError(f"Invalid company number: {company!r}")
+            row_reports = (
+                [r.strip().upper() for r in row['reports'].split(';')]
+                if row.get('reports') else reports or []
+            )
+            if not row_reports:
+                raise ValueError("No reports for company")
+
+            new_rules: List[str] = []
+            for report in row_reports:
+                if report not in TaxReportTemplate.TAX_REPORT_JOBS:
+                    raise ValueError(f"Unknown tax report: {report}")
+                new_rules.extend(
+                    self.tax_template.generate_rule_for_company(
+                        report, job, company
+                    )
+                    for job in TaxReportTemplate.TAX_REPORT_JOBS[report]
+                )
+            return [], new_rules
+
+        return self._run(rows, render, "Company tax reports")
+
+    def _run(
+        self,
+        rows: Iterator[Tuple[int, Row]],
+        render: Renderer,
+        description: str
+    ) -> ImportResult:
+        """Render each row, writing blocks as soon as they exist"""
+        if not isinstance(self.output, Path):
+            return self._write(self.output, rows, render, description)
+
+        self.output.parent.mkdir(exist_ok=True, parents=True)
+        with open(self.output, 'w', encoding='utf-8') as out:
+            return self._write(out, rows, render, description)
+
+    def _write(
+        self,
+        out: TextIO,
+        rows: Iterator[Tuple[int, Row]],
+        render: Renderer,
+        description: str
+    ) -> ImportResult:
+        result = ImportResult()
+        with span('render', description) as timer, \
+                tempfile.TemporaryFile('w+', encoding='utf-8') as spill:
+            out.write(f"* PCX Import File - {description}\n\n")
+            written = 0
+
+            for row_num, row in rows:
+                result.rows += 1
+                try:
+                    destinations, rules = render(row)
+                except (KeyError, ValueError) as e:
+                    # Collect the problem and keep going
+                    result.errors.append(RowError(row_num, str(e)))
+                    continue
+                for block in destinations:
+                    out.write(block + '\n\n')
+                    written += len(block) + 2
+                for block in rules:
+                    spill.write(block + '\n\n')
+                    written += len(block) + 2
+                result.destinations += len(destinations)
+                result.rules += len(rules)
+
+            spill.seek(0)
+            shutil.copyfileobj(spill, out)
+            timer.add(written, result.destinations + result.rules)
+
+        return result
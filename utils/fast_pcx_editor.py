@@ -1,129 +1,213 @@
 """Fast PCX file editor for large files - stream-based approach"""
 
 from pathlib import Path
-from typing import List
-import re
-from datetime import datetime
+from typing import Iterable, List, Optional, Set, Tuple
+from templates.destination import DestinationTemplate
+from utils.backup_store import BackupStore
+from utils.pcx_block import iter_block_texts
+from utils.pcx_duplicates import filter_duplicates
+from utils.pcx_index import PCXBlockIndex
+from utils.pcx_patch import PCXPatchSet
+from utils.pcx_scanner import PCXScanner
 
 
 class FastPCXEditor:
     """Edit large PCX files without loading into memory"""
 
-    def __init__(self, file_path: Path):
+    COMPANY_VARIABLE = '&RPT_COMPANY'
+
+    def __init__(
+        self, file_path: Path, backup_store: Optional[BackupStore] = None
+    ):
         self.file_path = file_path
-        self.temp_file = file_path.parent / f"{file_path.stem}_temp.txt"
+        self.backup_store = backup_store
 
     def find_section_positions(self, section_name: str) -> List[int]:
         """Find all positions where a section starts - FAST"""
-        positions: List[int] = []
-        pattern = f"^ADD {section_name}"
-
-        with open(self.file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            position = 0
-            for line in f:
-                if re.match(pattern, line):
-                    positions.append(position)
-                position = f.tell()
-
-        return positions
+        return PCXBlockIndex.open(self.file_path).positions(section_name)
 
     def find_last_rule_position(self) -> int:
         """Find where to insert new rules - after last ADD RULE block"""
-        last_rule_pos = 0
-        in_rule_block = False
-
-        with open(self.file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            position = 0
-            for line in f:
-                if line.startswith('ADD RULE'):
-                    in_rule_block = True
-                    last_rule_pos = position
-                elif (
-                    in_rule_block and line.startswith('ADD ')
-                    and not line.startswith('ADD RULECOMPONENT')
-                ):
-                    # We've hit the next section
-                    return position
-                position = f.tell()
-
-        return last_rule_pos
+        last_rule = PCXBlockIndex.open(self.file_path).last_block('RULE')
+        if last_rule is None:
+            # No rules yet - append to the end of the file
+            return self.file_path.stat().st_size
+        return last_rule.end
 
     def insert_rules_fast(self, new_rules: str) -> bool:
-        """Insert new rules at the correct position - FAST"""
+        """Insert new rules at the correct position - FAST
+
+        Rules the export already has are skipped, so running the same
+        ticket twice does not double them.
+        """
         print("Finding insertion point...")
-        insert_pos = self.find_last_rule_position()
-
-        print(f"Inserting at position {insert_pos}")
-
-        # Stream copy with insertion
-        with open(self.file_path, 'rb') as source:
-            with open(self.temp_file, 'wb') as target:
-                # Copy everything up to insertion point
-                source.seek(0)
-                target.write(source.read(insert_pos))
-
-                # Insert new rules
-                target.write(b'\n\n')
-                target.write(new_rules.encode('utf-8'))
-                target.write(b'\n\n')
-
-                # Copy rest of file
-                source.seek(insert_pos)
-                chunk_size = 10 * 1024 * 1024  # 10MB chunks
-                while True:
-                    chunk = source.read(chunk_size)
-                    if not chunk:
-                        break
-                    target.write(chunk)
-
-        # Replace original with temp
-        backup = (
-            self.file_path.parent /
-            (
-                f"{self.file_path.stem}_backup_"
-                f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-            )
+        patches = PCXPatchSet(self.file_path)
+        rules = self._skip_duplicates(
+            patches, iter_block_texts(new_rules.splitlines())
         )
-        self.file_path.rename(backup)
-        self.temp_file.rename(self.file_path)
+        if not rules:
+            print("✅ Every rule already exists - nothing to insert")
+            return True
+
+        # After the last rule, or where a RULE section belongs
+        patches.insert_into_section(
+            'RULE', '\n\n'.join(text for _, text in rules)
+        )
+        print(f"Inserting at position {patches.operations[0].start}")
+        backup = self.apply_patches(patches)
 
         print(f"✅ Rules inserted! Backup: {backup}")
         return True
 
-    def find_and_modify_rules(
+    def insert_blocks(self, content: str) -> Optional[Path]:
+        """Insert generated blocks into their sections in one rewrite
+
+        DESTINATION, RULE and other blocks in ``content`` each go to
+        their own section, created in canonical order if missing, and
+        blocks the export already has are skipped. Returns the manifest
+        path of the backup, or None if there was nothing to insert.
+        """
+        patches = PCXPatchSet(self.file_path)
+        blocks = self._skip_duplicates(
+            patches, iter_block_texts(content.splitlines())
+        )
+        if not patches.insert_blocks(blocks):
+            return None
+        return self.apply_patches(patches)
+
+    @staticmethod
+    def _skip_duplicates(
+        patches: PCXPatchSet, blocks: Iterable[Tuple[str, str]]
+    ) -> List[Tuple[str, str]]:
+        """Drop blocks already in the export, saying how many"""
+        keep, skipped = filter_duplicates(patches.index, blocks)
+        if skipped:
+            print(f"Skipping {len(skipped)} blocks that already exist")
+        return keep
+
+    def apply_patches(self, patches: PCXPatchSet) -> Path:
+        """Apply a batch of edits in one rewrite, keeping a backup
+
+        Returns the manifest path of the backup of the original file.
+        """
+        # Only chunks that differ from earlier backups are stored; the
+        # original stays at its path until the patched file atomically
+        # replaces it
+        store = self.backup_store or BackupStore()
+        backup = store.backup(self.file_path)
+        patches.apply()
+        return backup
+
+    def add_company_rules(
         self, report_names: List[str], company_numbers: List[str]
     ) -> bool:
-        """Find specific reports and add company numbers to them"""
-
-        # This would find each report and modify its rule
-        # For now, we'll just add new rules
-
-        new_rules: List[str] = []
-
-        for report in report_names:
-            for company in company_numbers:
-                # Generate a simple rule block
-                rule = (
-                    "ADD RULE\n"
-                    f"    RULESETNAME               = {report}\n"
-                    "    SEQUENCE                  = "
-                    f"{company}\n"
-                    "    DESCRIPTION               = Company "
-                    f"{company} added to {report}\n"
-                    "    INACTIVE                  = N\n"
-                    "    DESTINATIONNAME           = /Reports/"
-                    f"{report}~{company}/\n"
-                    "    ADD RULECOMPONENT\n"
-                    "        VARIABLE              = &RPT_COMPANY\n"
-                    "        OPERATOR              = Equal\n"
-                    f"        VALUE                 = {company}\n"
-                    "        ENDCOMPONENT          = N\n"
-                    "    ADD RULECOMPONENT\n"
-                    "        VARIABLE              = &RPT_COMPANY\n"
-                    "        OPERATOR              = Not Equal\n"
-                    f"        VALUE                 = {company}\n"
-                    "        ENDCOMPONENT          = Y"
-                )
-                new_rules.append(rule)
-
-        return self.insert_rules_fast('\n\n'.join(new_rules))
+        """Add a rule and folder destination per company a report lacks
+
+        Existing rules are not modified: each begin/end component pair
+        routes one company to its rule's destinations, so a company
+        merged into another company's rule would share its output. Every
+        new block is inserted in a single rewrite.
+        """
+        patches = PCXPatchSet(self.file_path)
+        blocks = self._skip_duplicates(patches, self.company_blocks(
+            patches.index, report_names, company_numbers
+        ))
+        if not patches.insert_blocks(blocks):
+            print("All companies already present - nothing to change")
+            return True
+
+        backup = self.apply_patches(patches)
+        rules = sum(1 for block_type, _ in blocks if block_type == 'RULE')
+        print(
+            f"✅ Added {rules} company rules and "
+            f"{len(blocks) - rules} destinations! Backup: {backup}"
+        )
+        return True
+
+    def company_blocks(
+        self,
+        index: PCXBlockIndex,
+        report_names: List[str],
+        company_numbers: List[str]
+    ) -> List[Tuple[str, str]]:
+        """Destination and rule blocks for companies a report lacks
+
+        Companies any rule of the report's ruleset already routes are
+        skipped. Returns (block type, text) pairs for insert_blocks.
+        """
+        blocks: List[Tuple[str, str]] = []
+
+        with PCXScanner(self.file_path) as scanner:
+            for report in report_names:
+                present: Set[str] = set()
+                for rule in index.find_prefix('RULE', f"{report}:"):
+                    present.update(self._rule_companies(
+                        scanner.data[rule.offset:rule.end]
+                    ))
+                for company in company_numbers:
+                    if company in present:
+                        continue
+                    present.add(company)
+                    blocks.append((
+                        'DESTINATION',
+                        self._company_destination(report, company)
+                    ))
+                    blocks.append(
+                        ('RULE', self._company_rule(report, company))
+                    )
+
+        return blocks
+
+    def _rule_companies(self, block: bytes) -> Set[str]:
+        """Company numbers already matched by a rule's components"""
+        companies: Set[str] = set()
+        variable = b''
+        for line in block.splitlines():
+            key, _, value = line.partition(b'=')
+            key = key.strip()
+            if key == b'ADD RULECOMPONENT':
+                variable = b''
+            elif key == b'VARIABLE':
+                variable = value.strip()
+            elif (
+                key == b'VALUE'
+                and variable == self.COMPANY_VARIABLE.encode('ascii')
+            ):
+                companies.add(value.strip().decode('utf-8', 'replace'))
+        return companies
+
+    def _company_components(self, company: str) -> str:
+        """Begin/end component pair routing one company"""
+        return (
+            "    ADD RULECOMPONENT\n"
+            f"        VARIABLE              = {self.COMPANY_VARIABLE}\n"
+            "        OPERATOR              = Equal\n"
+            f"        VALUE                 = {company}\n"
+            "        ENDCOMPONENT          = N\n"
+            "    ADD RULECOMPONENT\n"
+            f"        VARIABLE              = {self.COMPANY_VARIABLE}\n"
+            "        OPERATOR              = Not Equal\n"
+            f"        VALUE                 = {company}\n"
+            "        ENDCOMPONENT          = Y\n"
+        )
+
+    @staticmethod
+    def _company_destination(report: str, company: str) -> str:
+        """Folder destination that a company rule routes to"""
+        path = f"/Reports/{report}~{company}/"
+        return DestinationTemplate.FOLDER_LAYOUT.render(path, path)
+
+    def _company_rule(self, report: str, company: str) -> str:
+        """Generate a simple rule block routing one company"""
+        return (
+            "ADD RULE\n"
+            f"    RULESETNAME               = {report}\n"
+            "    SEQUENCE                  = "
+            f"{company}\n"
+            "    DESCRIPTION               = Company "
+            f"{company} added to {report}\n"
+            "    INACTIVE                  = N\n"
+            "    DESTINATIONNAME           = /Reports/"
+            f"{report}~{company}/\n"
+            + self._company_components(company).rstrip('\n')
+        )
@@ -0,0 +1,242 @@
+"""Crash-safe file replacement and kernel-side copies for large exports
+
+Rewrites go to a uniquely named temp file next to the target, which is
+fsynced and atomically renamed over the target, so the canonical path
+always holds either the old or the new file. Unchanged byte ranges and
+backups are copied with ``os.copy_file_range``/``os.sendfile`` (or a
+reflink where the filesystem supports it) instead of through Python,
+falling back to buffered copies on platforms without them.
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
+import errno
+import io
+import os
+import shutil
+import tempfile
+from utils.profiling import span
+from utils.progress import advance, check_cancelled, track
+
+COPY_CHUNK_SIZE = 10 * 1024 * 1024  # 10MB chunks
+
+# Linux FICLONE ioctl - share extents instead of copying (btrfs, xfs)
+FICLONE = 0x40049409
+
+# Errors meaning "not supported here", as opposed to real I/O failures
+_UNSUPPORTED = {
+    errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP,
+    errno.ENOTSUP, errno.EBADF, errno.ENOTTY, errno.EPERM,
+    errno.ENOTSOCK,  # macOS sendfile only writes to sockets
+}
+
+
+def fsync_directory(path: Path) -> None:
+    """Persist a rename by syncing the directory that holds ``path``
+
+    Directories cannot be opened on Windows, where renames are
+    journaled by NTFS anyway, so failures are ignored.
+    """
+    try:
+        fd = os.open(path.parent, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_write(target_path: Path) -> Iterator[BinaryIO]:
+    """Open a temp file that replaces ``target_path`` on success
+
+    The temp file gets a unique name in the target's directory and the
+    target's permissions. The data is fsynced before the rename and the
+    directory after it. If the block raises - including
+    OperationCancelled, which is checked once more before committing -
+    the temp file is removed and the target is left untouched.
+    """
+    fd, name = tempfile.mkstemp(
+        prefix=f".{target_path.name}.", suffix='.tmp',
+        dir=target_path.parent
+    )
+    temp_path = Path(name)
+    try:
+        with os.fdopen(fd, 'wb') as target:
+            yield target
+            check_cancelled()
+            with span('commit', 'fsync', target.tell()):
+                target.flush()
+                os.fsync(target.fileno())
+        copy_mode(target_path, temp_path)
+        with span('commit', 'rename'):
+            os.replace(temp_path, target_path)
+            fsync_directory(target_path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+
+def sync_files(paths: Iterable[Path]) -> None:
+    """Make many newly written files durable at once
+
+    Where the OS offers it, a single ``os.sync`` flushes every file and
+    the directories holding them, which is far cheaper than an fsync
+    per file; elsewhere (Windows) each file is fsynced.
+    """
+    if hasattr(os, 'sync'):
+        with span('commit', 'sync'):
+            os.sync()
+        return
+    for path in paths:
+        with open(path, 'rb+') as f:
+            os.fsync(f.fileno())
+
+
+def copy_mode(target_path: Path, temp_path: Path) -> None:
+    """Give a replacement file the permissions of the file it replaces
+
+    mkstemp creates files readable only by their owner, so a new
+    target gets the default permissions for the current umask instead.
+    """
+    if target_path.exists():
+        shutil.copymode(target_path, temp_path)
+        return
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(temp_path, 0o666 & ~umask)
+
+
+def copy_range(
+    source: BinaryIO, target: BinaryIO, start: int, end: int
+) -> None:
+    """Append bytes ``start``-``end`` of ``source`` to ``target``
+
+    Both must be real files for the kernel paths; anything else (or a
+    filesystem that refuses them) uses buffered reads and writes.
+    """
+    if end <= start:
+        return
+    with span('copy', 'file range', end - start):
+        start += kernel_copy(source, target, start, end)
+        if start < end:
+            _buffered_copy(source, target, start, end)
+
+
+def kernel_copy(
+    source: BinaryIO, target: BinaryIO, start: int, end: int
+) -> int:
+    """Copy as much of the range as the kernel will, returning the count
+
+    Returns 0 without touching ``target`` when either file has no
+    descriptor or the platform has no kernel copy (Windows). Pipes
+    such as stdout are filled with sendfile at their current position.
+    """
+    use_copy_file_range = hasattr(os, 'copy_file_range')
+    use_sendfile = hasattr(os, 'sendfile')
+    if not (use_copy_file_range or use_sendfile):
+        return 0
+    try:
+        src_fd = source.fileno()
+        dst_fd = target.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return 0
+
+    # Hand the kernel explicit offsets, then move the Python file object
+    # past what it wrote so buffered writes carry on from there
+    target.flush()
+    seekable = target.seekable()
+    position = target.tell() if seekable else 0
+    # copy_file_range needs a file it can write at an offset
+    use_copy_file_range = use_copy_file_range and seekable
+    copied = 0
+
+    while start + copied < end:
+        count = min(end - start - copied, COPY_CHUNK_SIZE)
+        written = 0
+        if use_copy_file_range:
+            try:
+                written = os.copy_file_range(
+                    src_fd, dst_fd, count,
+                    start + copied, position + copied
+                )
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+                use_copy_file_range = False
+                continue
+        elif use_sendfile:
+            try:
+                if seekable:
+                    os.lseek(dst_fd, position + copied, os.SEEK_SET)
+                written = os.sendfile(dst_fd, src_fd, start + copied, count)
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+                use_sendfile = False
+                continue
+        if not written:
+            # Unsupported everywhere, or the source is shorter than asked
+            break
+        copied += written
+        advance(written)
+
+    if seekable:
+        target.seek(position + copied)
+    return copied
+
+
+def _buffered_copy(
+    source: BinaryIO, target: BinaryIO, start: int, end: int
+) -> None:
+    source.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = source.read(min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        target.write(chunk)
+        remaining -= len(chunk)
+        advance(len(chunk))
+
+
+def clone_file(source: BinaryIO, target: BinaryIO) -> bool:
+    """Reflink ``source`` into ``target``, if the filesystem can"""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    except OSError as e:
+        if e.errno not in _UNSUPPORTED:
+            raise
+        return False
+    return True
+
+
+def copy_file(
+    source_path: Path, target_path: Path, durable: bool = True
+) -> Path:
+    """Copy a file at kernel speed, keeping its timestamps
+
+    Uses a reflink when possible, otherwise copy_file_range/sendfile.
+    With ``durable`` the copy is fsynced before returning.
+    """
+    with open(source_path, 'rb') as source:
+        with open(target_path, 'wb') as target:
+            size = os.fstat(source.fileno()).st_size
+            with span('copy', 'file copy', size), \
+                    track(f"Copying {source_path.name}", size):
+                if not clone_file(source, target):
+                    copy_range(source, target, 0, size)
+            if durable:
+                with span('commit', 'fsync', size):
+                    target.flush()
+                    os.fsync(target.fileno())
+    shutil.copystat(source_path, target_path)
+    return target_path
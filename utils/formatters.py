@@ -1,28 +1,45 @@
 """Output formatting utilities"""
 
-from colorama import init, Fore, Style
+from functools import lru_cache
+from types import ModuleType
+from typing import Optional, TextIO
 
-# Initialize colorama for cross-platform colored output
-init()
 
+@lru_cache(maxsize=None)
+def _colorama() -> ModuleType:
+    """Import and initialise colorama on first use, not at import time"""
+    import colorama
+    # Initialize colorama for cross-platform colored output
+    colorama.init()
+    return colorama
 
-def print_header(text: str):
-    """Print a formatted header"""
-    print(f"\n{Fore.CYAN}{'=' * 50}")
-    print(f"{text.center(50)}")
-    print(f"{'=' * 50}{Style.RESET_ALL}")
 
+def print_header(text: str, file: Optional[TextIO] = None):
+    """Print a formatted header (to stdout unless ``file`` is given)"""
+    colors = _colorama()
+    print(f"\n{colors.Fore.CYAN}{'=' * 50}", file=file)
+    print(f"{text.center(50)}", file=file)
+    print(f"{'=' * 50}{colors.Style.RESET_ALL}", file=file)
 
-def print_success(text: str):
+
+def print_success(text: str, file: Optional[TextIO] = None):
     """Print success message in green"""
-    print(f"{Fore.GREEN}{text}{Style.RESET_ALL}")
+    colors = _colorama()
+    print(f"{colors.Fore.GREEN}{text}{colors.Style.RESET_ALL}", file=file)
 
 
-def print_error(text: str):
+def print_error(text: str, file: Optional[TextIO] = None):
     """Print error message in red"""
-    print(f"{Fore.RED}Error: {text}{Style.RESET_ALL}")
+    colors = _colorama()
+    print(
+        f"{colors.Fore.RED}Error: {text}{colors.Style.RESET_ALL}", file=file
+    )
 
 
-def print_warning(text: str):
+def print_warning(text: str, file: Optional[TextIO] = None):
     """Print warning message in yellow"""
-    print(f"{Fore.YELLOW}Warning: {text}{Style.RESET_ALL}")
+    colors = _colorama()
+    print(
+        f"{colors.Fore.YELLOW}Warning: {text}{colors.Style.RESET_ALL}",
+        file=file
+    )
@@ -2,9 +2,10 @@
 
 from pathlib import Path
 from typing import Optional, List, Tuple
-import re
-from datetime import datetime
+from utils.backup_store import BackupStore
 from utils.formatters import print_success
+from utils.pcx_index import PCXBlockIndex
+from utils.pcx_patch import PCXPatchSet
 
 
 class LargePCXFileHandler:
@@ -23,61 +24,26 @@ class LargePCXFileHandler:
             f"Scanning {self.file_size_mb:.1f}MB file for insertion point..."
         )
 
-        last_position = 0
-        pattern = f"ADD {after_section}"
-
-        # Read in chunks to handle large file
-        chunk_size = 1024 * 1024  # 1MB chunks
-        with open(
-            self.file_path, 'r', encoding='utf-8', errors='ignore'
-        ) as f:
-            while True:
-                chunk = f.read(chunk_size)
-                if not chunk:
-                    break
-
-                # Find last occurrence of pattern
-                for match in re.finditer(pattern, chunk):
-                    last_position = f.tell() - len(chunk) + match.start()
-
-        # Now find the end of this block
-        with open(
-            self.file_path, 'r', encoding='utf-8', errors='ignore'
-        ) as f:
-            f.seek(last_position)
-            # Read until we find the next ADD statement or end
-            while True:
-                line = f.readline()
-                if not line or line.strip().startswith('ADD '):
-                    return f.tell()
-
-        return last_position
-
-    def backup_file(self) -> Path:
-        """Create a backup of the large file"""
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_path = (
-            self.file_path.parent /
-            f"{self.file_path.stem}_backup_{timestamp}.txt"
-        )
+        index = PCXBlockIndex.open(self.file_path)
+        last_block = index.last_block(after_section)
+        if last_block is None:
+            # Section not present - insert at the end of the file
+            return self.file_path.stat().st_size
+        return last_block.end
+
+    def backup_file(self, store: Optional[BackupStore] = None) -> Path:
+        """Back up the large file, returning the backup manifest path
 
+        Only chunks that differ from earlier backups are written.
+        """
         print(
-            f"Creating backup of {self.file_size_mb:.1f}MB file..."
+            f"Backing up {self.file_size_mb:.1f}MB file..."
         )
-        print("This may take a moment...")
 
-        # Copy in chunks for large files
-        chunk_size = 10 * 1024 * 1024  # 10MB chunks
-        with open(self.file_path, 'rb') as src:
-            with open(backup_path, 'wb') as dst:
-                while True:
-                    chunk = src.read(chunk_size)
-                    if not chunk:
-                        break
-                    dst.write(chunk)
+        manifest = (store or BackupStore()).backup(self.file_path)
 
-        print_success(f"Backup created: {backup_path}")
-        return backup_path
+        print_success(f"Backup created: {manifest}")
+        return manifest
 
     def append_content(
         self,
@@ -94,29 +60,9 @@ class LargePCXFileHandler:
         else:
             # Insert at specific position - need to rewrite file
             print(f"Inserting content at position {at_position}...")
-            temp_file = (
-                self.file_path.parent /
-                f"{self.file_path.stem}_temp.txt"
-            )
-
-            with open(self.file_path, 'rb') as src:
-                with open(temp_file, 'wb') as dst:
-                    # Copy everything before insertion point
-                    dst.write(src.read(at_position))
-                    # Write new content
-                    dst.write(b'\n\n')
-                    dst.write(new_content.encode('utf-8'))
-                    dst.write(b'\n\n')
-                    # Copy rest of file
-                    chunk_size = 10 * 1024 * 1024
-                    while True:
-                        chunk = src.read(chunk_size)
-                        if not chunk:
-                            break
-                        dst.write(chunk)
-
-            # Replace original with temp
-            temp_file.replace(self.file_path)
+            patches = PCXPatchSet(self.file_path)
+            patches.insert(at_position, f"\n\n{new_content}\n\n")
+            patches.apply()
 
         print_success("Content added successfully")
 
@@ -135,26 +81,11 @@ class LargePCXFileHandler:
                 "import may be slow"
             )
 
-        required_sections = [
-            'ADD DESTINATION',
-            'ADD RULE',
-            'ADD RULESET'
-        ]
-        found_sections: set[str] = set()
-        found_sections: set[str] = set()
-
-        with open(
-            self.file_path, 'r', encoding='utf-8', errors='ignore'
-        ) as f:
-            for line_num, line in enumerate(f, 1):
-                if line_num > 10000:  # Just check first 10k lines
-                    break
-                for section in required_sections:
-                    if section in line:
-                        found_sections.add(section)
+        required_sections = ['DESTINATION', 'RULE', 'RULESET']
+        found_sections = PCXBlockIndex.open(self.file_path).statistics()
 
         for required in required_sections:
             if required not in found_sections:
-                issues.append(f"Missing section: {required}")
+                issues.append(f"Missing section: ADD {required}")
 
         return len(issues) == 0, issues
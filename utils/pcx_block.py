@@ -0,0 +1,159 @@
+"""Compact block model for parsed PCX export files"""
+
+from pathlib import Path
+from sys import intern
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Block types that belong to the block above them, even when unindented
+NESTED_BLOCK_TYPES = ('RULECOMPONENT',)
+
+
+class PCXBlock:
+    """One ADD block with ordered, multi-valued fields
+
+    Field names and block types are interned and stored in parallel
+    lists, so repeated keys (a RULE's second DESTINATIONNAME) keep their
+    order and millions of blocks cost far less than one dict each.
+    Nested blocks such as RULECOMPONENT live in ``children``.
+    """
+
+    __slots__ = ('block_type', 'keys', 'values', 'children', 'line')
+
+    def __init__(self, block_type: str, line: int = 0) -> None:
+        self.block_type = intern(block_type)
+        self.keys: List[str] = []
+        self.values: List[str] = []
+        self.children: List['PCXBlock'] = []
+        self.line = line
+
+    def __repr__(self) -> str:
+        return (
+            f"PCXBlock({self.block_type!r}, fields={len(self.keys)}, "
+            f"children={len(self.children)}, line={self.line})"
+        )
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys
+
+    def __getitem__(self, key: str) -> str:
+        try:
+            return self.values[self.keys.index(key)]
+        except ValueError:
+            raise KeyError(key) from None
+
+    def add_field(self, key: str, value: str) -> None:
+        """Append a field, keeping any earlier value for the same key"""
+        self.keys.append(intern(key))
+        self.values.append(value)
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """First value of a field"""
+        try:
+            return self.values[self.keys.index(key)]
+        except ValueError:
+            return default
+
+    def get_all(self, key: str) -> List[str]:
+        """Every value of a field, in file order"""
+        return [v for k, v in zip(self.keys, self.values) if k == key]
+
+    def fields(self) -> Iterator[Tuple[str, str]]:
+        """(key, value) pairs in file order, repeats included"""
+        return zip(self.keys, self.values)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Legacy ``{'type': ..., 'fields': {...}}`` representation"""
+        return {'type': self.block_type, 'fields': dict(self.fields())}
+
+
+def parse_lines(
+    lines: Iterable[str], first_line: int = 1
+) -> Iterator[PCXBlock]:
+    """Lazily build blocks from PCX lines
+
+    A top-level ``ADD`` line starts a block; an indented ``ADD`` line
+    (or an unindented one of a nested type) starts a child of it, and
+    fields indented deeper than that child's ADD line belong to the
+    child.
+    """
+    current: Optional[PCXBlock] = None
+    child: Optional[PCXBlock] = None
+    child_indent = 0
+
+    for line_num, line in enumerate(lines, first_line):
+        line = line.rstrip('\r\n')
+        stripped = line.strip()
+
+        # Skip comments and empty lines
+        if line.startswith('*') or not stripped:
+            continue
+
+        indent = len(line) - len(line.lstrip())
+
+        if stripped.startswith('ADD '):
+            block_type = stripped[4:].strip()
+            if indent == 0 and block_type not in NESTED_BLOCK_TYPES:
+                # New top-level block
+                if current:
+                    yield current
+                current = PCXBlock(block_type, line_num)
+                child = None
+            elif current:
+                child = PCXBlock(block_type, line_num)
+                child_indent = indent
+                current.children.append(child)
+            continue
+
+        # Field in block
+        if current and indent and '=' in line:
+            key, _, value = stripped.partition('=')
+            target = child if child and indent > child_indent else current
+            target.add_field(key.strip(), value.strip())
+
+    if current:
+        yield current
+
+
+def iter_blocks(file_path: Path) -> Iterator[PCXBlock]:
+    """Lazily parse an export file into blocks"""
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        yield from parse_lines(f)
+
+
+def parse_text(text: str) -> List[PCXBlock]:
+    """Parse generated PCX content into blocks"""
+    return list(parse_lines(text.split('\n')))
+
+
+def iter_block_texts(lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """Lazily split PCX lines into (block type, raw text) pairs
+
+    Only top-level blocks are yielded; nested blocks stay in their
+    parent's text, even when unindented. Comments and blank lines
+    between blocks are dropped and the text keeps the block's own lines
+    verbatim.
+    """
+    block_type: Optional[str] = None
+    block: List[str] = []
+    pending: List[str] = []  # Comments and blanks inside or after a block
+
+    for line in lines:
+        line = line.rstrip('\r\n')
+        parts = line.split() if line.startswith('ADD ') else []
+        if parts and (len(parts) < 2 or parts[1] not in NESTED_BLOCK_TYPES):
+            if block_type:
+                yield block_type, '\n'.join(block)
+            block_type = parts[1] if len(parts) > 1 else None
+            block = [line]
+            pending = []
+        elif not line.strip() or line.startswith('*'):
+            pending.append(line)
+        elif block_type:
+            # An indented line (or unindented nested ADD) continues the
+            # block, keeping any comment or blank line inside it
+            block.extend(pending)
+            block.append(line)
+            pending = []
+
+    if block_type:
+        yield block_type, '\n'.join(block)
@@ -0,0 +1,226 @@
+"""Bounded-memory canonical ordering of PCX export files
+
+Sections are written in SECTION_ORDER and blocks within a section by
+key, so exports from different servers or dates line up for diffs and
+reviews. Blocks are sorted in runs of at most ``run_bytes`` that are
+spilled to temp files and merged, so memory stays flat however large
+the export is.
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+import heapq
+import re
+import struct
+import tempfile
+from utils.file_commit import atomic_write
+from utils.pcx_index import PCXBlockIndex
+from utils.pcx_scanner import PCXScanner
+from utils.pcx_schema import PCXSchemaManager
+from utils.profiling import span
+from utils.progress import advance, track
+
+# (sort key, original position, block bytes); the position keeps
+# blocks with equal keys in file order
+Record = Tuple[bytes, int, bytes]
+
+# Spill record header: sort key length, original position, block length
+RECORD_HEADER = struct.Struct('<IQI')
+
+DIGITS = re.compile(r'\d+')
+
+
+def sort_key(block_type: str, key: str) -> bytes:
+    """Section position, then key with numbers compared by value
+
+    Digit runs are zero-padded so store 1000 sorts after store 120.
+    """
+    order = PCXSchemaManager.SECTION_ORDER.get(block_type, 99)
+    natural = DIGITS.sub(lambda match: match.group().zfill(12), key)
+    return f"{order:03d}\0{block_type}\0{natural}".encode('utf-8')
+
+
+@dataclass
+class CanonicalResult:
+    """What a canonicalize run wrote"""
+    blocks: Dict[str, int] = field(default_factory=dict)
+    runs: int = 0  # Sorted runs spilled to disk; 0 if sorted in memory
+
+
+def _drop_blank_lines(text: bytes) -> bytes:
+    """The non-blank lines of some text, each ending in a newline"""
+    return b''.join(
+        line.rstrip(b'\r\n') + b'\n'
+        for line in text.splitlines() if line.strip()
+    )
+
+
+def _split_preamble(text: bytes) -> Tuple[bytes, bytes]:
+    """Split the text before the first block into preamble and lead-in
+
+    The lead-in is the comment paragraph directly above the block (after
+    the last blank line) and moves with it; the rest stays at the top.
+    """
+    lines = bytes(text).rstrip().splitlines(keepends=True)
+    cut = max(
+        (number for number, line in enumerate(lines) if not line.strip()),
+        default=-1
+    )
+    preamble = b''.join(lines[:cut]).strip() if cut > 0 else b''
+    return preamble, _drop_blank_lines(b''.join(lines[cut + 1:]))
+
+
+class PCXCanonicalizer:
+    """Rewrite an export in canonical section and key order
+
+    Each top-level block is moved whole, so RULECOMPONENTs and comments
+    inside it stay with their RULE. Comments between blocks move with
+    the block below them, so nothing is dropped: section headings end up
+    above whichever block they preceded. The file's preamble (comments
+    before the first block, up to its last blank line) stays at the top
+    and comments after the last block stay at the end.
+    """
+
+    RUN_BYTES = 64 * 1024 * 1024  # Block bytes sorted in memory per run
+    READ_BUFFER = 256 * 1024  # Buffer per spill file during the merge
+    PROGRESS_STEP = 4 * 1024 * 1024  # Bytes read between updates
+
+    def __init__(
+        self,
+        file_path: Path,
+        run_bytes: Optional[int] = None,
+        temp_dir: Optional[Path] = None
+    ) -> None:
+        self.file_path = file_path
+        self.run_bytes = run_bytes or self.RUN_BYTES
+        # Spill next to the export by default: /tmp may be a small
+        # RAM-backed filesystem
+        self.temp_dir = temp_dir or file_path.resolve().parent
+
+    def apply(self, output_path: Optional[Path] = None) -> CanonicalResult:
+        """Write the canonical export to ``output_path`` or in place
+
+        The result replaces the target atomically once complete.
+        """
+        with atomic_write(output_path or self.file_path) as target:
+            return self.write(target)
+
+    def write(self, target: BinaryIO) -> CanonicalResult:
+        """Stream the canonical export into an open binary stream"""
+        result = CanonicalResult()
+        with tempfile.TemporaryDirectory(
+            prefix='.pcxsort_', dir=self.temp_dir
+        ) as spill_dir:
+            preamble, trailer, records, spills, total = self._sort_runs(
+                Path(spill_dir)
+            )
+            result.runs = len(spills)
+
+            if preamble:
+                target.write(preamble + b'\n\n')
+            with span('copy', 'canonical merge', total) as timer, \
+                    track(f"Merging {self.file_path.name}", total):
+                merged: Iterable[Record] = records
+                if spills:
+                    merged = heapq.merge(
+                        *(self._read_spill(spill) for spill in spills)
+                    )
+                first = True
+                for key, _, block in merged:
+                    block_type = key.split(b'\0', 2)[1].decode('ascii')
+                    result.blocks[block_type] = (
+                        result.blocks.get(block_type, 0) + 1
+                    )
+                    if not first:
+                        target.write(b'\n')
+                    target.write(block)
+                    advance(len(block))
+                    first = False
+                timer.add(block_count=sum(result.blocks.values()))
+            if trailer:
+                target.write(b'\n' + trailer + b'\n')
+        return result
+
+    def _sort_runs(
+        self, spill_dir: Path
+    ) -> Tuple[bytes, bytes, List[Record], List[Path], int]:
+        """Read every block, spilling sorted runs of ``run_bytes``
+
+        Returns the preamble, the comments after the last block, the
+        sorted blocks if nothing was spilled, the spill files and the
+        total size of the blocks.
+        """
+        records: List[Record] = []
+        spills: List[Path] = []
+        run_size = 0
+        total = 0
+
+        with PCXScanner(self.file_path) as scanner, \
+                span('scan', 'canonical runs', scanner.size) as timer, \
+                track(f"Sorting {self.file_path.name}", scanner.size):
+            data = scanner.data
+            preamble = b''
+            reported = 0
+            position = 0
+            previous_end = 0
+            for block_type, start, end in scanner.iter_blocks():
+                if position == 0:
+                    preamble, block = _split_preamble(data[:start])
+                else:
+                    # Comments between blocks go with the block below
+                    block = _drop_blank_lines(data[previous_end:start])
+                block += bytes(data[start:end])
+                if not block.endswith(b'\n'):
+                    block += b'\n'
+                key = PCXBlockIndex.block_key(block_type, data[start:end])
+                records.append((sort_key(block_type, key), position, block))
+                position += 1
+                previous_end = end
+                run_size += len(block)
+                total += len(block)
+                if run_size >= self.run_bytes:
+                    spills.append(self._spill(
+                        spill_dir / f"run_{len(spills):05d}", records
+                    ))
+                    records, run_size = [], 0
+                if end - reported >= self.PROGRESS_STEP:
+                    advance(end - reported)
+                    reported = end
+            advance(scanner.size - reported)
+            if position == 0:
+                preamble = bytes(data).strip()
+            trailer = bytes(data[previous_end:]).strip() if position else b''
+            timer.add(block_count=position)
+
+        if spills and records:
+            spills.append(self._spill(
+                spill_dir / f"run_{len(spills):05d}", records
+            ))
+            records = []
+        records.sort()
+        return preamble, trailer, records, spills, total
+
+    @staticmethod
+    def _spill(path: Path, records: List[Record]) -> Path:
+        """Sort a run and write it to a spill file"""
+        records.sort()
+        with span('copy', 'canonical spill'), open(path, 'wb') as f:
+            for key, position, block in records:
+                f.write(RECORD_HEADER.pack(len(key), position, len(block)))
+                f.write(key)
+                f.write(block)
+        return path
+
+    def _read_spill(self, path: Path) -> Iterator[Record]:
+        """Stream the records of a spill file back in order"""
+        with open(path, 'rb', buffering=self.READ_BUFFER) as f:
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if not header:
+                    return
+                key_length, position, block_length = RECORD_HEADER.unpack(
+                    header
+                )
+                key = f.read(key_length)
+                yield key, position, f.read(block_length)
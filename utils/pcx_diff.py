@@ -0,0 +1,136 @@
+"""Block-level diff between two PCX exports with delta import output"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Tuple
+from utils.pcx_index import IndexEntry, PCXBlockIndex
+from utils.pcx_scanner import PCXScanner
+
+# Block identity: type, key and occurrence number for repeated keys
+BlockIdentity = Tuple[str, str, int]
+
+
+@dataclass
+class BlockChange:
+    """A block that differs between the baseline and edited export
+
+    ``entry`` points into the edited export for added and changed
+    blocks, and into the baseline for removed ones.
+    """
+    status: str  # 'added', 'changed' or 'removed'
+    block_type: str
+    key: str
+    entry: IndexEntry
+
+
+class PCXDiff:
+    """Compare two exports block by block
+
+    Blocks are matched on (type, key) from each file's block index and
+    compared by content hash, so neither file is ever parsed into
+    memory. Only the delta needs to be imported into PCX.
+    """
+
+    def __init__(self, baseline_path: Path, edited_path: Path) -> None:
+        self.baseline_path = baseline_path
+        self.edited_path = edited_path
+        self.baseline = PCXBlockIndex.open(baseline_path)
+        self.edited = PCXBlockIndex.open(edited_path)
+
+    def changes(self) -> Iterator[BlockChange]:
+        """Merge-walk both indexes in identity order, yielding changes"""
+        baseline = self._identities(self.baseline)
+        edited = self._identities(self.edited)
+        i = j = 0
+
+        while i < len(baseline) or j < len(edited):
+            if j == len(edited) or (
+                i < len(baseline) and baseline[i][0] < edited[j][0]
+            ):
+                identity, entry = baseline[i]
+                yield BlockChange('removed', identity[0], identity[1], entry)
+                i += 1
+            elif i == len(baseline) or edited[j][0] < baseline[i][0]:
+                identity, entry = edited[j]
+                yield BlockChange('added', identity[0], identity[1], entry)
+                j += 1
+            else:
+                identity, entry = edited[j]
+                if entry.digest != baseline[i][1].digest:
+                    yield BlockChange(
+                        'changed', identity[0], identity[1], entry
+                    )
+                i += 1
+                j += 1
+
+    def summary(self) -> Dict[str, int]:
+        """Count of added, changed and removed blocks"""
+        counts = {'added': 0, 'changed': 0, 'removed': 0}
+        for change in self.changes():
+            counts[change.status] += 1
+        return counts
+
+    def write_delta(self, output_path: Path) -> Dict[str, int]:
+        """Write an import file containing only added and changed blocks
+
+        Blocks are copied byte-for-byte in the edited file's order, so
+        DESTINATIONs still come before the RULEs that use them. Removed
+        blocks cannot be expressed as an import and are listed as
+        comments for manual cleanup.
+        """
+        with open(output_path, 'wb') as target:
+            return self.write(target)
+
+    def write(self, target: BinaryIO) -> Dict[str, int]:
+        """Write the delta import into an open binary stream (or stdout)"""
+        counts = {'added': 0, 'changed': 0, 'removed': 0}
+        wanted: List[IndexEntry] = []
+        removed: List[BlockChange] = []
+        for change in self.changes():
+            counts[change.status] += 1
+            if change.status == 'removed':
+                removed.append(change)
+            else:
+                wanted.append(change.entry)
+        wanted.sort(key=lambda entry: entry.offset)
+
+        with PCXScanner(self.edited_path) as source:
+            header = [
+                "* PCX Delta Import File",
+                f"* Generated: {datetime.now().isoformat()}",
+                f"* Baseline: {self.baseline_path}",
+                f"* Edited: {self.edited_path}",
+                f"* Added: {counts['added']}  "
+                f"Changed: {counts['changed']}  "
+                f"Removed: {counts['removed']}",
+            ]
+            header.extend(
+                f"* Removed: ADD {change.block_type} {change.key}"
+                for change in removed
+            )
+            target.write(('\n'.join(header) + '\n\n').encode('utf-8'))
+
+            for entry in wanted:
+                source.write_range(target, entry.offset, entry.end)
+                if source.data[entry.end - 1:entry.end] != b'\n':
+                    target.write(b'\n')
+                target.write(b'\n')
+
+        return counts
+
+    @staticmethod
+    def _identities(
+        index: PCXBlockIndex
+    ) -> List[Tuple[BlockIdentity, IndexEntry]]:
+        """Every block's identity, sorted for the merge walk"""
+        seen: Dict[Tuple[str, str], int] = {}
+        identities: List[Tuple[BlockIdentity, IndexEntry]] = []
+        for entry in index.entries:
+            occurrence = seen.get((entry.block_type, entry.key), 0)
+            seen[(entry.block_type, entry.key)] = occurrence + 1
+            identities.append(
+                ((entry.block_type, entry.key, occurrence), entry)
+            )
+        identities.sort(key=lambda pair: pair[0])
+        return identities
@@ -0,0 +1,171 @@
+"""Duplicate RULE and DESTINATION detection for PCX exports
+
+A RULE is identified by its RULESETNAME, SEQUENCE and the values of its
+RULECOMPONENTs, a DESTINATION by its NAME. Identities are reduced to
+64-bit hashes, so a seen-set costs a few bytes per block instead of
+whole key strings. For exports too large even for that, a Bloom filter
+bounds memory at the cost of a small, configurable false positive rate.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import hashlib
+import math
+from utils.pcx_block import PCXBlock, parse_lines, parse_text
+from utils.pcx_index import PCXBlockIndex
+from utils.pcx_scanner import PCXScanner
+
+CHECKED_TYPES = ('DESTINATION', 'RULE')
+
+# (block type, block text) as produced by iter_block_texts
+BlockText = Tuple[str, str]
+
+
+def block_identity(block: PCXBlock) -> Optional[str]:
+    """What makes a block a duplicate, or None for unchecked types"""
+    if block.block_type == 'DESTINATION':
+        return f"DESTINATION\0{block.get('NAME', '')}"
+    if block.block_type == 'RULE':
+        parts = [
+            'RULE', block.get('RULESETNAME', ''), block.get('SEQUENCE', '')
+        ]
+        parts.extend('\x1f'.join(child.values) for child in block.children)
+        return '\0'.join(parts)
+    return None
+
+
+def identity_hash(identity: str) -> int:
+    """64-bit hash of a block identity"""
+    digest = hashlib.blake2b(identity.encode('utf-8'), digest_size=8)
+    return int.from_bytes(digest.digest(), 'little')
+
+
+def describe(block: PCXBlock) -> str:
+    """Short name of a block for messages, e.g. RULE TAX004-PPA0951W:120"""
+    if block.block_type == 'RULE':
+        return (
+            f"RULE {block.get('RULESETNAME', '')}:"
+            f"{block.get('SEQUENCE', '')}"
+        )
+    return f"{block.block_type} {block.get('NAME', '')}"
+
+
+class BloomFilter:
+    """Fixed-size probabilistic set of 64-bit hashes
+
+    Sized for ``capacity`` items at ``error_rate`` false positives;
+    never gives false negatives.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        capacity = max(capacity, 1)
+        self.size = max(8, int(
+            -capacity * math.log(error_rate) / math.log(2) ** 2
+        ))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def add(self, value: int) -> bool:
+        """Add a hash, returning True if it was (probably) present"""
+        # Double hashing: k positions from the two halves of the hash
+        first, second = value & 0xFFFFFFFF, (value >> 32) | 1
+        present = True
+        for i in range(self.hash_count):
+            position = (first + i * second) % self.size
+            byte, bit = position >> 3, 1 << (position & 7)
+            if not self.bits[byte] & bit:
+                present = False
+                self.bits[byte] |= bit
+        return present
+
+
+@dataclass
+class Duplicate:
+    """A block whose identity appeared earlier in the same file"""
+    line: int
+    name: str
+    first_line: Optional[int] = None  # Unknown with a Bloom filter
+
+    def __str__(self) -> str:
+        if self.first_line is None:
+            return f"Line {self.line}: possible duplicate {self.name}"
+        return (
+            f"Line {self.line}: duplicate {self.name} "
+            f"(first defined at line {self.first_line})"
+        )
+
+
+def find_duplicates(
+    lines: Iterable[str], bloom_capacity: Optional[int] = None
+) -> Iterator[Duplicate]:
+    """Stream duplicates of earlier blocks from PCX lines in one pass
+
+    By default hashes map to the line that first used them, so every
+    report is exact. With ``bloom_capacity`` only a Bloom filter sized
+    for that many blocks is kept: memory is fixed, but reports are
+    possible duplicates (one in a thousand may be a false positive).
+    """
+    seen: Dict[int, int] = {}
+    bloom = BloomFilter(bloom_capacity) if bloom_capacity else None
+
+    for block in parse_lines(lines):
+        identity = block_identity(block)
+        if identity is None:
+            continue
+        value = identity_hash(identity)
+        if bloom is not None:
+            if bloom.add(value):
+                yield Duplicate(block.line, describe(block))
+        elif value in seen:
+            yield Duplicate(block.line, describe(block), seen[value])
+        else:
+            seen[value] = block.line
+
+
+def filter_duplicates(
+    index: PCXBlockIndex, blocks: Iterable[BlockText]
+) -> Tuple[List[BlockText], List[str]]:
+    """Split new blocks into those to insert and duplicates to skip
+
+    A block is a duplicate if the export already has it or it repeats
+    an earlier new block. Only export blocks sharing its index key
+    (NAME, or RULESETNAME:SEQUENCE) are read and compared, so the check
+    costs a few lookups rather than another pass over the export.
+    Returns the blocks to keep and the names of those skipped.
+    """
+    keep: List[BlockText] = []
+    skipped: List[str] = []
+    seen: Set[int] = set()
+    scanner: Optional[PCXScanner] = None
+
+    try:
+        for block_type, text in blocks:
+            parsed = parse_text(text)
+            identity = block_identity(parsed[0]) if parsed else None
+            if identity is None:
+                keep.append((block_type, text))
+                continue
+
+            value = identity_hash(identity)
+            if value not in seen:
+                key = PCXBlockIndex.block_key(block_type, text.encode('utf-8'))
+                for entry in index.find_all(block_type, key):
+                    if scanner is None:
+                        scanner = PCXScanner(index.file_path)
+                    existing = scanner.data[entry.offset:entry.end].decode(
+                        'utf-8', errors='replace'
+                    )
+                    seen.update(
+                        identity_hash(block_identity(block))
+                        for block in parse_text(existing)
+                    )
+            if value in seen:
+                skipped.append(describe(parsed[0]))
+                continue
+            seen.add(value)
+            keep.append((block_type, text))
+    finally:
+        if scanner is not None:
+            scanner.close()
+
+    return keep, skipped
@@ -0,0 +1,267 @@
+"""Persistent byte-offset block index for PCX export files"""
+
+from bisect import bisect_right
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+from utils.file_commit import atomic_write
+from utils.pcx_scanner import PCXScanner
+from utils.profiling import span
+from utils.progress import advance, track
+
+
+@dataclass
+class IndexEntry:
+    """A top-level ADD block located in an export file"""
+    offset: int
+    length: int
+    block_type: str
+    key: str
+    digest: str = ''  # Hash of the block's bytes, for change detection
+
+    @property
+    def end(self) -> int:
+        """Byte position just past the last line of the block"""
+        return self.offset + self.length
+
+
+class PCXBlockIndex:
+    """Sidecar index of every top-level ADD block in a PCX export
+
+    The index is written next to the export as ``<name>.pcxidx`` and is
+    rebuilt automatically whenever the export's size, mtime or sampled
+    content hash no longer matches the fingerprint stored with it.
+    Opened indexes are kept in memory, so repeated lookups on the same
+    export only re-check the fingerprint instead of re-reading the
+    sidecar.
+    """
+
+    INDEX_VERSION = 3
+    INDEX_SUFFIX = '.pcxidx'
+    SAMPLE_SIZE = 1024 * 1024  # Bytes hashed from each end of the file
+    PROGRESS_STEP = 4 * 1024 * 1024  # Bytes scanned between updates
+    CACHE_SIZE = 8  # Opened indexes kept in memory
+
+    _open_indexes: Dict[Path, 'PCXBlockIndex'] = {}
+
+    # Fields that identify a block; joined with ':' when there are several
+    KEY_FIELDS: Dict[str, Tuple[str, ...]] = {
+        'RULE': ('RULESETNAME', 'SEQUENCE'),
+    }
+    DEFAULT_KEY_FIELDS: Tuple[str, ...] = ('NAME',)
+
+    def __init__(
+        self, file_path: Path, index_path: Optional[Path] = None
+    ) -> None:
+        self.file_path = file_path
+        self.index_path = index_path or file_path.with_name(
+            file_path.name + self.INDEX_SUFFIX
+        )
+        self.entries: List[IndexEntry] = []
+        self._offsets: List[int] = []
+        self._by_type: Dict[str, List[IndexEntry]] = {}
+        self._keys: Dict[str, List[Tuple[str, int]]] = {}
+        self._fingerprint: Optional[Dict[str, object]] = None
+
+    @classmethod
+    def open(cls, file_path: Path) -> 'PCXBlockIndex':
+        """Load the sidecar index, rebuilding it if it is stale"""
+        cache_key = file_path.resolve()
+        index = cls._open_indexes.pop(cache_key, None)
+        if index is None or index._fingerprint != index.fingerprint():
+            index = cls(file_path)
+            if not index.load():
+                index.build()
+                index.save()
+
+        # Most recently used last; the oldest is dropped when full
+        cls._open_indexes[cache_key] = index
+        while len(cls._open_indexes) > cls.CACHE_SIZE:
+            del cls._open_indexes[next(iter(cls._open_indexes))]
+        return index
+
+    def fingerprint(self) -> Dict[str, object]:
+        """Identify the current state of the export file"""
+        stat = self.file_path.stat()
+        digest = hashlib.blake2b(digest_size=16)
+        with open(self.file_path, 'rb') as f:
+            digest.update(f.read(self.SAMPLE_SIZE))
+            if stat.st_size > self.SAMPLE_SIZE:
+                f.seek(max(self.SAMPLE_SIZE, stat.st_size - self.SAMPLE_SIZE))
+                digest.update(f.read(self.SAMPLE_SIZE))
+        return {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'hash': digest.hexdigest(),
+        }
+
+    def load(self) -> bool:
+        """Load the sidecar index if it matches the export file"""
+        if not self.index_path.exists():
+            return False
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if data.get('version') != self.INDEX_VERSION:
+            return False
+        if data.get('fingerprint') != self.fingerprint():
+            return False
+
+        self._set_entries([IndexEntry(*row) for row in data['entries']])
+        self._fingerprint = data['fingerprint']
+        return True
+
+    def save(self) -> None:
+        """Write the sidecar index next to the export file
+
+        The sidecar is replaced atomically, so an interrupted save
+        leaves the previous index rather than a truncated one.
+        """
+        self._fingerprint = self.fingerprint()
+        data = {
+            'version': self.INDEX_VERSION,
+            'fingerprint': self._fingerprint,
+            'entries': [
+                [e.offset, e.length, e.block_type, e.key, e.digest]
+                for e in self.entries
+            ],
+        }
+        try:
+            with atomic_write(self.index_path) as f:
+                f.write(json.dumps(data, separators=(',', ':')).encode())
+        except OSError:
+            # Read-only location - the in-memory index is still usable
+            pass
+
+    def build(self) -> None:
+        """Scan the export once and record every top-level block"""
+        entries: List[IndexEntry] = []
+        with span('scan', 'block index') as timer, \
+                PCXScanner(self.file_path) as scanner, \
+                track(f"Indexing {self.file_path.name}", scanner.size):
+            reported = 0
+            for block_type, start, end in scanner.iter_blocks():
+                block = scanner.data[start:end]
+                entries.append(IndexEntry(
+                    start, end - start, block_type,
+                    self.block_key(block_type, block),
+                    hashlib.blake2b(block, digest_size=8).hexdigest()
+                ))
+                if end - reported >= self.PROGRESS_STEP:
+                    advance(end - reported)
+                    reported = end
+            advance(scanner.size - reported)
+            timer.add(scanner.size, len(entries))
+        self._set_entries(entries)
+
+    @classmethod
+    def block_key(cls, block_type: str, block: bytes) -> str:
+        """Key of a block from its bytes, e.g. ``TAX001-PPA0771R:120``"""
+        key_fields = cls.KEY_FIELDS.get(block_type, cls.DEFAULT_KEY_FIELDS)
+        fields = cls._key_fields(block_type, block)
+        return ':'.join(fields.get(name, '') for name in key_fields)
+
+    @classmethod
+    def _key_fields(cls, block_type: str, block: bytes) -> Dict[str, str]:
+        """Read the first-level fields that make up a block's key"""
+        wanted = cls.KEY_FIELDS.get(block_type, cls.DEFAULT_KEY_FIELDS)
+        fields: Dict[str, str] = {}
+        for raw in block.split(b'\n')[1:]:
+            if raw.startswith(b'ADD '):
+                # An unindented nested block; the fields come before it
+                break
+            # Nested blocks (RULECOMPONENT) are indented further
+            if raw[4:5] in (b' ', b'\t') or b'=' not in raw:
+                continue
+            key, _, value = raw.partition(b'=')
+            name = key.strip().decode('utf-8', 'replace')
+            if name in wanted and name not in fields:
+                fields[name] = value.strip().decode('utf-8', 'replace')
+                if len(fields) == len(wanted):
+                    break
+        return fields
+
+    def _set_entries(self, entries: List[IndexEntry]) -> None:
+        self.entries = entries
+        self._offsets = [e.offset for e in entries]
+        self._by_type = {}
+        keyed: Dict[str, List[Tuple[str, int]]] = {}
+        for position, entry in enumerate(entries):
+            self._by_type.setdefault(entry.block_type, []).append(entry)
+            keyed.setdefault(entry.block_type, []).append(
+                (entry.key, position)
+            )
+        for pairs in keyed.values():
+            pairs.sort()
+        self._keys = keyed
+
+    def blocks(self, block_type: Optional[str] = None) -> List[IndexEntry]:
+        """All blocks in file order, optionally of a single type"""
+        if block_type is None:
+            return list(self.entries)
+        return list(self._by_type.get(block_type, []))
+
+    def positions(self, block_type: str) -> List[int]:
+        """Start offsets of every block of the given type"""
+        return [e.offset for e in self._by_type.get(block_type, [])]
+
+    def find(self, block_type: str, key: str) -> Optional[IndexEntry]:
+        """Find the first block of a type with the given key"""
+        matches = self.find_all(block_type, key)
+        return matches[0] if matches else None
+
+    def find_all(self, block_type: str, key: str) -> List[IndexEntry]:
+        """Find every block of a type with the given key, in file order"""
+        pairs = self._keys.get(block_type, [])
+        position = bisect_right(pairs, (key, -1))
+        matches: List[IndexEntry] = []
+        while position < len(pairs) and pairs[position][0] == key:
+            matches.append(self.entries[pairs[position][1]])
+            position += 1
+        return matches
+
+    def find_prefix(self, block_type: str, prefix: str) -> List[IndexEntry]:
+        """Find every block of a type whose key starts with a prefix
+
+        Useful for compound keys, e.g. all rules of a ruleset with the
+        prefix ``'TAX001-PPA0771R:'``. Results are in file order.
+        """
+        pairs = self._keys.get(block_type, [])
+        position = bisect_right(pairs, (prefix, -1))
+        matches: List[IndexEntry] = []
+        while (
+            position < len(pairs) and pairs[position][0].startswith(prefix)
+        ):
+            matches.append(self.entries[pairs[position][1]])
+            position += 1
+        return sorted(matches, key=lambda e: e.offset)
+
+    def block_at(self, offset: int) -> Optional[IndexEntry]:
+        """Find the block containing a byte offset"""
+        position = bisect_right(self._offsets, offset) - 1
+        if position < 0:
+            return None
+        entry = self.entries[position]
+        return entry if offset < entry.end else None
+
+    def first_block(self, block_type: str) -> Optional[IndexEntry]:
+        """The first block of a type in file order"""
+        blocks = self._by_type.get(block_type)
+        return blocks[0] if blocks else None
+
+    def last_block(self, block_type: str) -> Optional[IndexEntry]:
+        """The last block of a type in file order"""
+        blocks = self._by_type.get(block_type)
+        return blocks[-1] if blocks else None
+
+    def statistics(self) -> Dict[str, int]:
+        """Count of blocks per type"""
+        return {
+            block_type: len(blocks)
+            for block_type, blocks in self._by_type.items()
+        }
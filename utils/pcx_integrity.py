@@ -0,0 +1,175 @@
+"""Single-pass referential integrity check for PCX exports
+
+Every RULE's DESTINATIONNAME values must name a DESTINATION block and
+its RULESETNAME a RULESET. Names are collected into hash sets while the
+export streams past; a reference to a name not defined yet is kept
+until the end, when it either resolves (a forward reference) or is
+reported as dangling with its line number. The export is read once.
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Set, Tuple
+import re
+from utils.pcx_block import NESTED_BLOCK_TYPES
+from utils.profiling import span
+from utils.progress import advance, track
+
+# Fields that must name another block: block type -> field -> target
+REFERENCES: Dict[str, Dict[bytes, str]] = {
+    'RULE': {b'DESTINATIONNAME': 'DESTINATION', b'RULESETNAME': 'RULESET'},
+}
+
+# Field that defines the name other blocks refer to
+NAME_FIELD = b'NAME'
+
+READ_SIZE = 4 * 1024 * 1024  # Bytes scanned per regex pass
+
+# Block headers and the first-level fields the check needs; RULECOMPONENT
+# fields are indented deeper and never match
+INTERESTING_LINE = re.compile(
+    rb'^(?:ADD[ \t]+(\w+)'
+    rb'|    (NAME|SEQUENCE|RULESETNAME|DESTINATIONNAME)[ \t]*='
+    rb'[ \t]*(.*?)[ \t\r]*$)',
+    re.MULTILINE
+)
+
+# (line, block description, field, value, target type)
+Reference = Tuple[int, str, bytes, bytes, str]
+
+
+@dataclass
+class DanglingReference:
+    """A reference to a block that is not defined anywhere"""
+    line: int
+    block: str  # e.g. RULE TAX001-PPA0771R:120
+    field: str
+    value: str
+    target: str
+
+    def __str__(self) -> str:
+        return (
+            f"Line {self.line}: {self.block} {self.field} refers to "
+            f"missing {self.target} {self.value}"
+        )
+
+
+@dataclass
+class IntegrityResult:
+    """Outcome of a reference check"""
+    references: int = 0
+    defined: Dict[str, int] = field(default_factory=dict)
+    dangling: List[DanglingReference] = field(default_factory=list)
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.dangling
+
+
+def check_references(stream: BinaryIO) -> IntegrityResult:
+    """Check every reference in an export stream (a file or stdin)"""
+    targets = {
+        target for fields in REFERENCES.values() for target in fields.values()
+    }
+    defined: Dict[str, Set[bytes]] = {target: set() for target in targets}
+    pending: List[Reference] = []
+    result = IntegrityResult()
+
+    block_type = ''
+    fields: Dict[bytes, bytes] = {}
+    refs: List[Tuple[int, bytes, bytes]] = []
+
+    def finish() -> None:
+        """Resolve the current block's references or defer them"""
+        if not refs:
+            return
+        if block_type == 'RULE':
+            name = (
+                f"RULE {fields.get(b'RULESETNAME', b'').decode()}:"
+                f"{fields.get(b'SEQUENCE', b'').decode()}"
+            )
+        else:
+            name = f"{block_type} {fields.get(NAME_FIELD, b'').decode()}"
+        wanted = REFERENCES[block_type]
+        for line_num, key, value in refs:
+            result.references += 1
+            target = wanted[key]
+            if value not in defined[target]:
+                # Possibly a forward reference; decided at the end
+                pending.append((line_num, name, key, value, target))
+
+    line_num = 1
+    carry = b''
+    while True:
+        chunk = stream.read(READ_SIZE)
+        data = carry + chunk
+        # Scan whole lines only; a partial last line waits for more data
+        cut = len(data) if not chunk else data.rfind(b'\n') + 1
+        body, carry = data[:cut], data[cut:]
+        position = 0
+        for match in INTERESTING_LINE.finditer(body):
+            line_num += body.count(b'\n', position, match.start())
+            position = match.start()
+            header, key, value = match.groups()
+
+            if header is not None:
+                block_type_name = header.decode('ascii')
+                if block_type_name in NESTED_BLOCK_TYPES:
+                    # An unindented RULECOMPONENT still belongs to its RULE
+                    continue
+                finish()
+                block_type = block_type_name
+                fields = {}
+                refs = []
+                continue
+
+            fields.setdefault(key, value)
+            if key == NAME_FIELD and block_type in defined:
+                defined[block_type].add(value)
+            wanted = REFERENCES.get(block_type)
+            if wanted and key in wanted and value:
+                refs.append((line_num, key, value))
+        line_num += body.count(b'\n', position)
+        advance(len(chunk))
+        if not chunk:
+            break
+    finish()
+
+    result.defined = {target: len(names) for target, names in defined.items()}
+    result.dangling = [
+        DanglingReference(
+            line_num, name, key.decode('utf-8', 'replace'),
+            value.decode('utf-8', 'replace'), target
+        )
+        for line_num, name, key, value, target in pending
+        if value not in defined[target]
+    ]
+    return result
+
+
+def check_file(file_path: Path) -> IntegrityResult:
+    """Check the references in an export file"""
+    size = file_path.stat().st_size
+    with span('validate', 'references', size), \
+            track(f"Checking references in {file_path.name}", size), \
+            open(file_path, 'rb') as f:
+        return check_references(f)
+
+
+def describe_result(result: IntegrityResult) -> Optional[str]:
+    """One-line summary of a failed check, or None if it passed"""
+    if result.is_valid:
+        return None
+    missing: Dict[str, Set[str]] = {
+        target: set() for target in result.defined
+    }
+    for reference in result.dangling:
+        missing[reference.target].add(reference.value)
+    counts = ', '.join(
+        f"{len(names)} {target}" for target, names in sorted(missing.items())
+        if names
+    )
+    return (
+        f"{len(result.dangling)} of {result.references} references are "
+        f"dangling (names missing: {counts})"
+    )
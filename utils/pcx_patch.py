@@ -0,0 +1,213 @@
+"""Batched multi-edit patch engine for PCX export files"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+from utils.file_commit import atomic_write
+from utils.pcx_index import IndexEntry, PCXBlockIndex
+from utils.pcx_scanner import PCXScanner
+from utils.pcx_schema import PCXSchemaManager
+from utils.progress import advance, track
+
+
+@dataclass
+class PatchOperation:
+    """Replace bytes [start, end) of the source with new content
+
+    Inserts have ``start == end`` and deletions have empty content.
+    """
+    start: int
+    end: int
+    content: bytes
+    sequence: int
+
+
+class PCXPatchSet:
+    """Collect many edits to an export and apply them in one file pass
+
+    Edits are keyed by byte offset or by block key (resolved through the
+    block index) and always refer to the file as it was when collected.
+    Applying sorts them and streams the file once, so nine inserts cost
+    one rewrite instead of nine.
+    """
+
+    def __init__(self, file_path: Path) -> None:
+        self.file_path = file_path
+        self.operations: List[PatchOperation] = []
+        self._index: Optional[PCXBlockIndex] = None
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    @property
+    def index(self) -> PCXBlockIndex:
+        """Block index of the source file, opened on first use"""
+        if self._index is None:
+            self._index = PCXBlockIndex.open(self.file_path)
+        return self._index
+
+    def insert(self, offset: int, content: str) -> None:
+        """Insert content verbatim at a byte offset"""
+        self._add(offset, offset, content)
+
+    def replace(self, start: int, end: int, content: str) -> None:
+        """Replace the bytes between two offsets"""
+        self._add(start, end, content)
+
+    def delete(self, start: int, end: int) -> None:
+        """Remove the bytes between two offsets"""
+        self._add(start, end, '')
+
+    def insert_after_block(
+        self, block_type: str, key: str, content: str
+    ) -> None:
+        """Insert a block after the block with the given key"""
+        entry = self._find_block(block_type, key)
+        self.insert(entry.end, '\n' + content.strip('\n') + '\n')
+
+    def insert_into_section(self, block_type: str, content: str) -> None:
+        """Insert blocks after the last block of their section
+
+        A missing section is created where SECTION_ORDER puts it: before
+        the first block (and heading comment) of the next section in the
+        file, else after the last block of an earlier section, else at
+        the end of the file. Sections not in SECTION_ORDER go last.
+        """
+        content = content.strip('\n')
+        last_block = self.index.last_block(block_type)
+        if last_block is not None:
+            self.insert(last_block.end, f"\n{content}\n")
+            return
+
+        order = PCXSchemaManager.SECTION_ORDER
+        position = order.get(block_type, 99)
+        later: List[int] = []
+        earlier: List[int] = []
+        for section in self.index.statistics():
+            if order.get(section, 99) > position:
+                later.append(self.index.first_block(section).offset)
+            else:
+                earlier.append(self.index.last_block(section).end)
+
+        if later:
+            self.insert(self._heading_start(min(later)), f"{content}\n\n")
+        elif earlier:
+            self.insert(max(earlier), f"\n{content}\n")
+        else:
+            self.insert(self.file_path.stat().st_size, f"\n\n{content}\n")
+
+    def insert_blocks(self, blocks: Iterable[Tuple[str, str]]) -> int:
+        """Insert (block type, text) pairs into their sections
+
+        Blocks are grouped per section and sections inserted in
+        SECTION_ORDER, so DESTINATIONs land before the RULEs that use
+        them even when both go to the same spot. Returns the count.
+        """
+        sections: Dict[str, List[str]] = {}
+        for block_type, text in blocks:
+            sections.setdefault(block_type, []).append(text.strip('\n'))
+
+        order = PCXSchemaManager.SECTION_ORDER
+        for block_type in sorted(sections, key=lambda t: order.get(t, 99)):
+            self.insert_into_section(
+                block_type, '\n\n'.join(sections[block_type])
+            )
+        return sum(len(texts) for texts in sections.values())
+
+    def replace_block(self, block_type: str, key: str, content: str) -> None:
+        """Replace the block with the given key"""
+        entry = self._find_block(block_type, key)
+        self.replace(entry.offset, entry.end, content.rstrip('\n') + '\n')
+
+    def delete_block(self, block_type: str, key: str) -> None:
+        """Remove the block with the given key"""
+        entry = self._find_block(block_type, key)
+        self.delete(entry.offset, entry.end)
+
+    def write(self, target: BinaryIO) -> None:
+        """Stream the patched file into an open binary stream"""
+        operations = self._sorted_operations()
+        with PCXScanner(self.file_path) as source:
+            cursor = 0
+            for operation in operations:
+                if operation.end > source.size:
+                    raise ValueError(
+                        f"Edit at {operation.start}-{operation.end} is "
+                        f"past the end of the file ({source.size} bytes)"
+                    )
+                source.write_range(target, cursor, operation.start)
+                target.write(operation.content)
+                # Replaced source bytes count as done
+                advance(operation.end - operation.start)
+                cursor = operation.end
+            source.write_range(target, cursor, source.size)
+
+    def apply(self, output_path: Optional[Path] = None) -> Path:
+        """Apply every collected edit in a single rewrite
+
+        Writes to ``output_path`` if given, otherwise replaces the source
+        file atomically. The patch set is emptied afterwards.
+        """
+        target_path = output_path or self.file_path
+        # Written to a temp file, fsynced, then renamed over the target
+        with track(
+            f"Rewriting {target_path.name}", self.file_path.stat().st_size
+        ), atomic_write(target_path) as target:
+            self.write(target)
+
+        self.operations = []
+        self._index = None
+        return target_path
+
+    def _add(self, start: int, end: int, content: str) -> None:
+        if start < 0 or end < start:
+            raise ValueError(f"Invalid edit range: {start}-{end}")
+        self.operations.append(PatchOperation(
+            start=start,
+            end=end,
+            content=content.encode('utf-8'),
+            sequence=len(self.operations)
+        ))
+
+    def _heading_start(self, offset: int) -> int:
+        """Start of the comment lines directly above a block, if any
+
+        Comments at the top of the file are its preamble, not a heading,
+        so they are left alone.
+        """
+        with PCXScanner(self.file_path) as source:
+            data = source.data
+            start = offset
+            while start > 0:
+                line_start = data.rfind(b'\n', 0, start - 1) + 1
+                if not data[line_start:start].startswith(b'*'):
+                    break
+                start = line_start
+            # Back over blank lines to the block (if any) above
+            above = start
+            while above > 0:
+                line_start = data.rfind(b'\n', 0, above - 1) + 1
+                if data[line_start:above].strip():
+                    return start
+                above = line_start
+        return offset
+
+    def _find_block(self, block_type: str, key: str) -> IndexEntry:
+        entry = self.index.find(block_type, key)
+        if entry is None:
+            raise ValueError(f"Block not found: ADD {block_type} {key}")
+        return entry
+
+    def _sorted_operations(self) -> List[PatchOperation]:
+        """Order edits by position and reject overlapping ranges"""
+        operations = sorted(
+            self.operations, key=lambda op: (op.start, op.end, op.sequence)
+        )
+        cursor = 0
+        for operation in operations:
+            if operation.start < cursor:
+                raise ValueError(
+                    f"Overlapping edits at byte {operation.start}"
+                )
+            cursor = operation.end
+        return operations
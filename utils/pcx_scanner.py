@@ -0,0 +1,166 @@
+"""Memory-mapped byte-level scanner for PCX export files"""
+
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Tuple, Union
+import mmap
+import re
+from utils.file_commit import kernel_copy
+from utils.pcx_block import NESTED_BLOCK_TYPES
+from utils.profiling import span
+from utils.progress import advance
+
+BLOCK_HEADER = re.compile(rb'ADD[ \t]+(\w+)')
+
+# Unindented ADD line starting a block. Nested types may also appear
+# unindented and stay part of their parent block.
+BLOCK_START = re.compile(
+    rb'^ADD[ \t]+(?!(?:%s)\b)(\w+)'
+    % b'|'.join(t.encode('ascii') for t in NESTED_BLOCK_TYPES),
+    re.MULTILINE
+)
+
+
+class PCXScanner:
+    """Find blocks in an export with byte searches over an mmap
+
+    All offsets are exact byte positions in the file, so they can be
+    used directly for seeking, slicing and splicing.
+    """
+
+    COPY_CHUNK_SIZE = 10 * 1024 * 1024  # 10MB chunks
+
+    def __init__(self, file_path: Path) -> None:
+        self.file_path = file_path
+        self._file: Optional[BinaryIO] = open(file_path, 'rb')
+        self._mmap: Optional[mmap.mmap] = None
+        self.size = file_path.stat().st_size
+        if self.size:
+            self._mmap = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        self.data: Union[mmap.mmap, bytes] = self._mmap or b''
+
+    def __enter__(self) -> 'PCXScanner':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Release the mapping - required before replacing the file"""
+        self.data = b''
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def find_block_starts(
+        self, block_type: Optional[str] = None
+    ) -> Iterator[int]:
+        """Yield the offset of every top-level ADD line, in file order"""
+        if block_type is None:
+            needle = b'ADD '
+        else:
+            needle = f'ADD {block_type}'.encode('ascii')
+        data = self.data
+
+        if data[:len(needle)] == needle and self._is_header(0, block_type):
+            yield 0
+        position = data.find(b'\n' + needle)
+        while position != -1:
+            if self._is_header(position + 1, block_type):
+                yield position + 1
+            position = data.find(b'\n' + needle, position + 1)
+
+    def rfind_block_start(self, block_type: str) -> Optional[int]:
+        """Offset of the last top-level block of a type, searching back"""
+        needle = f'ADD {block_type}'.encode('ascii')
+        data = self.data
+        position = data.rfind(b'\n' + needle)
+        while position != -1:
+            if self._is_header(position + 1, block_type):
+                return position + 1
+            position = data.rfind(b'\n' + needle, 0, position)
+        if data[:len(needle)] == needle and self._is_header(0, block_type):
+            return 0
+        return None
+
+    def block_type_at(self, offset: int) -> Optional[str]:
+        """Block type of the ADD line starting at an offset"""
+        match = BLOCK_HEADER.match(self.data, offset)
+        return match.group(1).decode('ascii') if match else None
+
+    def block_end(self, start: int) -> int:
+        """End of the block starting at an offset
+
+        A block runs until the next top-level ADD line. Comments and
+        blank lines at its end are not part of it, but those followed by
+        more of the block's lines are.
+        """
+        match = BLOCK_START.search(self.data, self.line_end(start))
+        boundary = match.start() if match else self.size
+        return self._content_end(start, boundary)
+
+    def iter_blocks(self) -> Iterator[Tuple[str, int, int]]:
+        """Yield (block_type, start, end) for every top-level block"""
+        previous: Optional[re.Match] = None
+        for match in BLOCK_START.finditer(self.data):
+            if previous is not None:
+                yield (
+                    previous.group(1).decode('ascii'),
+                    previous.start(),
+                    self._content_end(previous.start(), match.start())
+                )
+            previous = match
+        if previous is not None:
+            yield (
+                previous.group(1).decode('ascii'),
+                previous.start(),
+                self._content_end(previous.start(), self.size)
+            )
+
+    def line_end(self, offset: int) -> int:
+        """Offset just past the newline ending the line at offset"""
+        position = self.data.find(b'\n', offset)
+        return self.size if position == -1 else position + 1
+
+    def write_range(self, target: BinaryIO, start: int, end: int) -> None:
+        """Copy a byte range of the mapped file into a binary stream
+
+        Real files are filled by the kernel; anything it leaves (or a
+        stream with no descriptor) is written from the mapping.
+        """
+        if self._mmap is None or end <= start:
+            return
+        with span('copy', 'mapped range', end - start):
+            start += kernel_copy(self._file, target, start, end)
+            view = memoryview(self._mmap)
+            try:
+                while start < end:
+                    stop = min(start + self.COPY_CHUNK_SIZE, end)
+                    target.write(view[start:stop])
+                    advance(stop - start)
+                    start = stop
+            finally:
+                view.release()
+
+    def _is_header(self, offset: int, block_type: Optional[str]) -> bool:
+        if block_type is None:
+            return BLOCK_START.match(self.data, offset) is not None
+        match = BLOCK_HEADER.match(self.data, offset)
+        return match is not None and match.group(1) == block_type.encode()
+
+    def _content_end(self, start: int, end: int) -> int:
+        """Back ``end`` up over trailing blank and comment lines"""
+        data = self.data
+        while end > start:
+            line_start = data.rfind(b'\n', start, end - 1) + 1
+            if line_start <= start:
+                break
+            line = data[line_start:end]
+            if line.strip() and not line.startswith(b'*'):
+                break
+            end = line_start
+        return end
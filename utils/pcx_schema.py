@@ -1,19 +1,40 @@
 """PCX Export File Schema and Structure Manager"""
 
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import re
+from utils.file_commit import atomic_write, copy_range
+from utils.pcx_block import NESTED_BLOCK_TYPES
+from utils.profiling import span
+from utils.progress import track
 
 
 @dataclass
 class PCXSection:
-    """Represents a section in the PCX file"""
+    """Represents a section in the PCX file
+
+    In streaming mode ``content`` only holds lines added since parsing;
+    the parsed lines stay on disk and are referenced by ``ranges``.
+    """
     name: str
     order: int
     content: List[str]
     start_line: int
     end_line: int
+    ranges: List[Tuple[int, int]] = field(default_factory=list)
+    block_count: int = 0
+
+
+@dataclass
+class PCXSpan:
+    """Byte and line range of a block or section run in the file"""
+    name: str
+    start: int
+    end: int
+    start_line: int
+    end_line: int
+    block_count: int = 1
 
 
 class PCXSchemaManager:
@@ -33,8 +54,11 @@ class PCXSchemaManager:
         'VARIABLE': 10
     }
 
-    def __init__(self, file_path: Optional[Path] = None):
+    def __init__(
+        self, file_path: Optional[Path] = None, streaming: bool = False
+    ):
         self.file_path = file_path
+        self.streaming = streaming
         self.sections: Dict[str, PCXSection] = {}
         self.raw_lines: List[str] = []
         if file_path and file_path.exists():
@@ -44,6 +68,9 @@ class PCXSchemaManager:
         """Parse PCX file into structured sections"""
         if not self.file_path:
             raise ValueError("No file path set")
+        if self.streaming:
+            self._parse_streaming()
+            return
         with open(self.file_path, 'r', encoding='utf-8', errors='ignore') as f:
             self.raw_lines = f.readlines()
         current_section: Optional[str] = None
@@ -56,26 +83,26 @@ class PCXSchemaManager:
                 match = re.match(r'^ADD\s+(\w+)', line)
                 if match:
                     section_type = match.group(1)
-                    # Save previous section if exists
-                    if current_section:
-                        self.sections.setdefault(
-                            current_section,
-                            PCXSection(
-                                name=current_section,
-                                order=self.SECTION_ORDER.get(
-                                    current_section, 99
-                                ),
-                                content=[],
-                                start_line=section_start,
-                                end_line=i-1
-                            )
-                        )
-                        self.sections[current_section].content.extend(
-                            current_content
-                        )
                     # Check if we're continuing the same section type
                     # or starting new
                     if section_type != current_section:
+                        # Save previous section if exists
+                        if current_section:
+                            self.sections.setdefault(
+                                current_section,
+                                PCXSection(
+                                    name=current_section,
+                                    order=self.SECTION_ORDER.get(
+                                        current_section, 99
+                                    ),
+                                    content=[],
+                                    start_line=section_start,
+                                    end_line=i-1
+                                )
+                            )
+                            self.sections[current_section].content.extend(
+                                current_content
+                            )
                         current_section = section_type
                         current_content = []
                         section_start = i
@@ -95,6 +122,98 @@ class PCXSchemaManager:
             )
             self.sections[current_section].content.extend(current_content)
 
+    def iter_blocks(self) -> Iterator[PCXSpan]:
+        """Lazily yield the byte range of every top-level ADD block
+
+        A block runs from its ADD line up to the next top-level ADD line,
+        so trailing comments and blank lines belong to the block before.
+        Unindented nested blocks such as RULECOMPONENT stay in their rule.
+        """
+        if not self.file_path:
+            raise ValueError("No file path set")
+        current: Optional[PCXSpan] = None
+        position = 0
+        line_num = 0
+        with open(self.file_path, 'rb') as f:
+            for line in f:
+                if line.startswith(b'ADD '):
+                    match = re.match(rb'^ADD\s+(\w+)', line)
+                    if match and (
+                        match.group(1).decode('ascii')
+                        not in NESTED_BLOCK_TYPES
+                    ):
+                        if current:
+                            current.end = position
+                            current.end_line = line_num - 1
+                            yield current
+                        current = PCXSpan(
+                            name=match.group(1).decode('ascii'),
+                            start=position,
+                            end=position,
+                            start_line=line_num,
+                            end_line=line_num
+                        )
+                position += len(line)
+                line_num += 1
+        if current:
+            current.end = position
+            current.end_line = line_num - 1
+            yield current
+
+    def iter_sections(self) -> Iterator[PCXSpan]:
+        """Lazily yield runs of consecutive blocks of the same type"""
+        run: Optional[PCXSpan] = None
+        for block in self.iter_blocks():
+            if run and run.name == block.name:
+                run.end = block.end
+                run.end_line = block.end_line
+                run.block_count += 1
+                continue
+            if run:
+                yield run
+            run = block
+        if run:
+            yield run
+
+    def _parse_streaming(self) -> None:
+        """Record section byte ranges without reading lines into memory"""
+        self.sections = {}
+        with span('scan', 'schema sections') as timer:
+            for run in self.iter_sections():
+                self._add_run(run)
+                timer.add(run.end - run.start, run.block_count)
+
+    def _add_run(self, run: PCXSpan) -> None:
+        """Record a run of blocks against its section"""
+        section = self.sections.setdefault(
+            run.name,
+            PCXSection(
+                name=run.name,
+                order=self.SECTION_ORDER.get(run.name, 99),
+                content=[],
+                start_line=run.start_line,
+                end_line=run.end_line
+            )
+        )
+        section.ranges.append((run.start, run.end))
+        section.block_count += run.block_count
+
+    def iter_section_lines(self, section_type: str) -> Iterator[str]:
+        """Lazily yield the lines of a section, from disk and memory"""
+        section = self.find_section(section_type)
+        if not section:
+            return
+        if section.ranges and self.file_path:
+            with open(self.file_path, 'rb') as f:
+                for start, end in section.ranges:
+                    f.seek(start)
+                    while f.tell() < end:
+                        line = f.readline()
+                        if not line:
+                            break
+                        yield line.decode('utf-8', errors='ignore')
+        yield from section.content
+
     def find_section(self, section_type: str) -> Optional[PCXSection]:
         """Find a specific section in the file"""
         return self.sections.get(section_type)
@@ -128,6 +247,10 @@ class PCXSchemaManager:
 
     def delete_from_section(self, section_type: str, identifier: str) -> bool:
         """Delete specific content from a section"""
+        if self.streaming:
+            raise ValueError(
+                "Deleting blocks is not supported in streaming mode"
+            )
         section = self.find_section(section_type)
         if not section:
             return False
@@ -173,6 +296,9 @@ class PCXSchemaManager:
         save_path = output_path or self.file_path
         if not save_path:
             raise ValueError("No output path specified")
+        if self.streaming:
+            self._save_streaming(save_path)
+            return
         with open(save_path, 'w', encoding='utf-8') as f:
             # Write sections in correct order
             for section_name in sorted(
@@ -184,6 +310,38 @@ class PCXSchemaManager:
                     f.write(line if line.endswith('\n') else line + '\n')
                 f.write('\n')  # Section separator
 
+    def _save_streaming(self, save_path: Path) -> None:
+        """Copy section byte ranges into a new file in canonical order"""
+        if not self.file_path:
+            raise ValueError("No file path set")
+        # The source is still being read, so write a temp file and
+        # atomically replace the target once it is on disk
+        total = sum(
+            end - start
+            for section in self.sections.values()
+            for start, end in section.ranges
+        )
+        with open(self.file_path, 'rb') as src, \
+                track(f"Saving {save_path.name}", total):
+            with atomic_write(save_path) as dst:
+                for section_name in sorted(
+                    self.sections.keys(),
+                    key=lambda x: self.SECTION_ORDER.get(x, 99)
+                ):
+                    section = self.sections[section_name]
+                    for start, end in section.ranges:
+                        if end <= start:
+                            continue
+                        copy_range(src, dst, start, end)
+                        src.seek(end - 1)
+                        if src.read(1) != b'\n':
+                            dst.write(b'\n')
+                    for line in section.content:
+                        if not line.endswith('\n'):
+                            line += '\n'
+                        dst.write(line.encode('utf-8'))
+                    dst.write(b'\n')  # Section separator
+
     def validate_structure(self) -> Tuple[bool, List[str]]:
         """Validate the file structure"""
         issues: List[str] = []
@@ -202,8 +360,9 @@ class PCXSchemaManager:
         """Get counts of each section type"""
         stats: Dict[str, int] = {}
         for section_name, section in self.sections.items():
-            # Count ADD statements in section
-            count = sum(
+            # Count ADD statements in section - streamed sections keep
+            # their count from parsing, added content is counted here
+            count = section.block_count + sum(
                 1 for line in section.content
                 if line.startswith(f'ADD {section_name}')
             )
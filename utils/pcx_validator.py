@@ -2,9 +2,136 @@
 PCX Export File Validation Utilities
 """
 
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Tuple, List, Dict, Any
+from typing import BinaryIO, Tuple, List, Dict, Iterator, Optional
+import os
 import re
+import signal
+from utils.pcx_block import PCXBlock, iter_blocks
+from utils.pcx_scanner import PCXScanner
+from utils.profiling import span
+from utils.progress import advance, track
+
+# Messages for per-line problems, keyed by error code
+LINE_ERRORS = {
+    'length': "Line {line} exceeds max length",
+    'indent': "Line {line}: Invalid indentation in block",
+    'format': "Line {line}: Invalid key-value format",
+}
+
+KEY_VALUE_LINE = re.compile(r'^\s{4}\S+\s+=\s+.*$')
+
+# Line endings as text mode reads them: CRLF, a lone CR or LF
+LINE_BREAK = re.compile(rb'\r\n|\r|\n')
+
+
+@dataclass
+class ValidationIssue:
+    """A single problem found while validating an export
+
+    ``line`` and ``offset`` are None for file-level issues such as a
+    missing section. ``rule_id`` is RULESETNAME:SEQUENCE for problems
+    inside a RULE block (as far as it has been read).
+    """
+    code: str
+    message: str
+    severity: str = 'error'
+    line: Optional[int] = None
+    offset: Optional[int] = None
+    block_type: Optional[str] = None
+    rule_id: Optional[str] = None
+
+    def __str__(self) -> str:
+        return self.message
+
+
+def _line_problems(
+    line: str, in_block: bool, max_length: int
+) -> Tuple[bool, List[str]]:
+    """Check one line, returning the new in-block state and error codes"""
+    codes: List[str] = []
+
+    # Check line length
+    if len(line) > max_length:
+        codes.append('length')
+
+    # Check block structure
+    if line.startswith('ADD '):
+        return True, codes
+
+    if in_block and line.strip() and not line.startswith('    '):
+        # Non-indented line should be comment or new block
+        if not line.startswith('*') and not line.startswith('ADD '):
+            codes.append('indent')
+
+    # Validate key-value format
+    if in_block and '=' in line:
+        if not KEY_VALUE_LINE.match(line):
+            codes.append('format')
+
+    return in_block, codes
+
+
+def _check_lines(lines: List[str], max_length: int) -> List[Tuple[int, str]]:
+    """Check line structure, returning (1-based line, error code) pairs"""
+    problems: List[Tuple[int, str]] = []
+    in_block = False
+    for line_num, line in enumerate(lines, 1):
+        in_block, codes = _line_problems(line, in_block, max_length)
+        problems.extend((line_num, code) for code in codes)
+    return problems
+
+
+def _iter_lines(stream: BinaryIO) -> Iterator[Tuple[int, bytes]]:
+    """Yield (offset, line) pairs, splitting on CRLF, CR and LF
+
+    Matches the text-mode newline handling of parallel chunks, so a
+    file with old Mac line endings gets the same line numbers either
+    way. Lines keep their line ending.
+    """
+    offset = 0
+    for raw in stream:
+        # Fast path: no carriage return before the line ending
+        if raw.find(b'\r', 0, len(raw) - 2) == -1:
+            yield offset, raw
+        else:
+            start = 0
+            for match in LINE_BREAK.finditer(raw):
+                yield offset + start, raw[start:match.end()]
+                start = match.end()
+            if start < len(raw):
+                yield offset + start, raw[start:]
+        offset += len(raw)
+
+
+def _ignore_interrupt() -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _validate_chunk(
+    task: Tuple[str, int, int, bool, List[str], int]
+) -> Tuple[int, List[Tuple[int, str]], List[str]]:
+    """Validate one block-aligned byte range in a worker process
+
+    Returns the number of lines in the chunk, the problems found with
+    chunk-relative line numbers and the required sections it contains.
+    """
+    file_path, start, end, is_last, required, max_length = task
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    # Same newline handling as reading the whole file in text mode
+    text = data.decode('utf-8', errors='replace')
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    lines = text.split('\n')
+    if not is_last:
+        # Chunks end on a newline; the empty tail belongs to the next one
+        lines.pop()
+
+    found = [section for section in required if section in text]
+    return len(lines), _check_lines(lines, max_length), found
 
 
 class PCXValidator:
@@ -16,95 +143,275 @@ class PCXValidator:
     MAX_LINE_LENGTH = 255
     MIN_FILE_SIZE = 100
 
+    # Parallel validation settings
+    PARALLEL_MIN_SIZE = 8 * 1024 * 1024  # Smaller files validate serially
+    CHUNKS_PER_WORKER = 4
+
+    PROGRESS_STEP = 4 * 1024 * 1024  # Bytes read between progress updates
+
     @staticmethod
-    def validate_file(file_path: Path) -> Tuple[bool, List[str]]:
-        """Validate PCX export file structure"""
-        errors: List[str] = []
+    def validate_file(
+        file_path: Path,
+        parallel: bool = False,
+        workers: Optional[int] = None,
+        max_errors: Optional[int] = None,
+        fail_fast: bool = False
+    ) -> Tuple[bool, List[str]]:
+        """Validate PCX export file structure
+
+        With ``parallel=True`` the file is split into chunks on ``ADD``
+        block boundaries and checked in a process pool (``workers``
+        defaults to the number of CPUs). Errors are identical to a serial
+        run, with global line numbers in file order.
 
+        ``max_errors`` and ``fail_fast`` stop validation once that many
+        errors (or the first one) have been found.
+        """
         if not file_path.exists():
             return False, ["File does not exist"]
 
-        # Check file size
+        if fail_fast:
+            max_errors = 1
+
         file_size = file_path.stat().st_size
-        if file_size < PCXValidator.MIN_FILE_SIZE:
-            errors.append(f"File too small: {file_size} bytes")
+        parallel = parallel and file_size >= PCXValidator.PARALLEL_MIN_SIZE
+        with span(
+            'validate', 'parallel' if parallel else 'serial', file_size
+        ), track(f"Validating {file_path.name}", file_size):
+            if parallel:
+                errors: List[str] = []
+                if file_size < PCXValidator.MIN_FILE_SIZE:
+                    errors.append(f"File too small: {file_size} bytes")
+                errors.extend(PCXValidator._validate_parallel(
+                    file_path, workers, max_errors
+                ))
+                if max_errors is not None:
+                    errors = errors[:max_errors]
+                return len(errors) == 0, errors
+
+            issues = list(
+                PCXValidator.iter_issues(file_path, max_errors=max_errors)
+            )
+        # File-level issues are reported before line problems
+        issues.sort(key=lambda issue: issue.line is not None)
+        return len(issues) == 0, [issue.message for issue in issues]
+
+    @staticmethod
+    def iter_issues(
+        file_path: Path,
+        max_errors: Optional[int] = None,
+        fail_fast: bool = False
+    ) -> Iterator[ValidationIssue]:
+        """Stream validation issues without holding the file in memory
 
-        with open(file_path, 'r') as f:
-            content = f.read()
-            lines = content.split('\n')
+        Issues are yielded as soon as they are found. Reading stops once
+        ``max_errors`` error-severity issues have been yielded, or after
+        the first one with ``fail_fast``. Missing sections can only be
+        known at the end, so they are reported last and only if the
+        whole file was read.
+        """
+        if not file_path.exists():
+            yield ValidationIssue('missing', "File does not exist")
+            return
+
+        with open(file_path, 'rb') as f:
+            yield from PCXValidator.iter_stream_issues(
+                f, max_errors, fail_fast, size=file_path.stat().st_size
+            )
+
+    @staticmethod
+    def iter_stream_issues(
+        stream: BinaryIO,
+        max_errors: Optional[int] = None,
+        fail_fast: bool = False,
+        size: Optional[int] = None
+    ) -> Iterator[ValidationIssue]:
+        """Stream validation issues from an open binary stream (or stdin)
 
-        # Check for required sections
-        for required in PCXValidator.REQUIRED_SECTIONS:
-            if required not in content:
-                errors.append(f"Missing required section: {required}")
+        Same checks as iter_issues. Without ``size`` the stream length
+        is only known at the end, so a too-small warning comes last.
+        """
+        if fail_fast:
+            max_errors = 1
+        budget = [0]
 
-        # Validate line structure
+        def spent(issue: ValidationIssue) -> bool:
+            if issue.severity == 'error':
+                budget[0] += 1
+            return max_errors is not None and budget[0] >= max_errors
+
+        def too_small(file_size: int) -> Optional[ValidationIssue]:
+            if file_size >= PCXValidator.MIN_FILE_SIZE:
+                return None
+            return ValidationIssue(
+                'size', f"File too small: {file_size} bytes",
+                severity='warning'
+            )
+
+        # Check file size
+        issue = too_small(size) if size is not None else None
+        if issue:
+            yield issue
+            if spent(issue):
+                return
+
+        missing = list(PCXValidator.REQUIRED_SECTIONS)
         in_block = False
-        line_num = 0
+        block_type: Optional[str] = None
+        rule_fields: Dict[str, str] = {}
+        offset = 0
 
-        for line in lines:
-            line_num += 1
+        reported = 0
+        for line_num, (line_offset, raw) in enumerate(
+            _iter_lines(stream), 1
+        ):
+            offset = line_offset + len(raw)
+            if offset - reported >= PCXValidator.PROGRESS_STEP:
+                advance(offset - reported)
+                reported = offset
+            line = raw.decode('utf-8', errors='replace').rstrip('\r\n')
 
-            # Check line length
-            if len(line) > PCXValidator.MAX_LINE_LENGTH:
-                errors.append(f"Line {line_num} exceeds max length")
+            if missing:
+                missing = [m for m in missing if m not in line]
 
-            # Check block structure
-            if line.startswith('ADD '):
-                in_block = True
-                continue
+            # Track which block (and rule) the line belongs to
+            stripped = line.strip()
+            if stripped.startswith('ADD '):
+                parts = stripped.split()
+                block_type = parts[1] if len(parts) > 1 else None
+                if line.startswith('ADD '):
+                    rule_fields = {}
+            elif (
+                block_type == 'RULE' and '=' in line
+                and not line.startswith('        ')
+            ):
+                key, _, value = line.partition('=')
+                key = key.strip()
+                if key in ('RULESETNAME', 'SEQUENCE'):
+                    rule_fields.setdefault(key, value.strip())
 
-            if in_block and line.strip() and not line.startswith('    '):
-                # Non-indented line should be comment or new block
-                if not line.startswith('*') and not line.startswith('ADD '):
-                    errors.append(
-                        f"Line {line_num}: Invalid indentation in block"
-                    )
+            in_block, codes = _line_problems(
+                line, in_block, PCXValidator.MAX_LINE_LENGTH
+            )
+            for code in codes:
+                issue = ValidationIssue(
+                    code=code,
+                    message=LINE_ERRORS[code].format(line=line_num),
+                    line=line_num,
+                    offset=line_offset,
+                    block_type=block_type,
+                    rule_id=PCXValidator._rule_id(rule_fields)
+                )
+                yield issue
+                if spent(issue):
+                    return
 
-            # Validate key-value format
-            if in_block and '=' in line:
-                if not re.match(r'^\s{4}\S+\s+=\s+.*$', line):
-                    errors.append(f"Line {line_num}: Invalid key-value format")
+        issue = too_small(offset) if size is None else None
+        if issue:
+            yield issue
+            if spent(issue):
+                return
 
-        return len(errors) == 0, errors
+        for required in missing:
+            issue = ValidationIssue(
+                'section', f"Missing required section: {required}"
+            )
+            yield issue
+            if spent(issue):
+                return
 
     @staticmethod
-    def parse_blocks(file_path: Path) -> List[Dict[str, Any]]:
-        """Parse PCX file into blocks"""
-        blocks: List[Dict[str, Any]] = []
-        current_block = None
-        current_fields = {}
+    def _rule_id(rule_fields: Dict[str, str]) -> Optional[str]:
+        if not rule_fields:
+            return None
+        return ':'.join(
+            rule_fields.get(key, '') for key in ('RULESETNAME', 'SEQUENCE')
+        )
 
-        with open(file_path, 'r') as f:
-            for line in f:
-                line = line.rstrip('\n')
+    @staticmethod
+    def _validate_parallel(
+        file_path: Path,
+        workers: Optional[int],
+        max_errors: Optional[int] = None
+    ) -> List[str]:
+        """Validate block-aligned chunks of the file in worker processes"""
+        workers = workers or os.cpu_count() or 1
+        boundaries = PCXValidator._chunk_boundaries(
+            file_path, workers * PCXValidator.CHUNKS_PER_WORKER
+        )
+        tasks = [
+            (
+                str(file_path), start, end, end == boundaries[-1],
+                PCXValidator.REQUIRED_SECTIONS,
+                PCXValidator.MAX_LINE_LENGTH
+            )
+            for start, end in zip(boundaries, boundaries[1:])
+        ]
 
-                # Skip comments and empty lines
-                if line.startswith('*') or not line.strip():
-                    continue
+        found: set[str] = set()
+        line_errors: List[str] = []
+        line_offset = 0
+        # Imported here - process pools are slow to import and most
+        # validations are serial
+        from concurrent.futures import ProcessPoolExecutor
 
-                # New block
-                if line.startswith('ADD '):
-                    if current_block:
-                        blocks.append({
-                            'type': current_block,
-                            'fields': current_fields
-                        })
-                    current_block = line[4:].strip()
-                    current_fields = {}
-
-                # Field in block
-                elif '=' in line and line.startswith('    '):
-                    parts = line.split('=', 1)
-                    key = parts[0].strip()
-                    value = parts[1].strip() if len(parts) > 1 else ''
-                    current_fields[key] = value
-
-        # Add last block
-        if current_block:
-            blocks.append({
-                'type': current_block,
-                'fields': current_fields
-            })
-
-        return blocks
+        # Workers ignore Ctrl-C; the parent cancels and shuts them down
+        pool = ProcessPoolExecutor(
+            max_workers=workers, initializer=_ignore_interrupt
+        )
+        try:
+            # map() yields in submission order, so errors stay in file order
+            chunks = zip(boundaries, boundaries[1:])
+            for (start, end), (line_count, problems, sections) in zip(
+                chunks, pool.map(_validate_chunk, tasks)
+            ):
+                advance(end - start)
+                for line_num, code in problems:
+                    line_errors.append(
+                        LINE_ERRORS[code].format(line=line_offset + line_num)
+                    )
+                found.update(sections)
+                line_offset += line_count
+                if max_errors is not None and len(line_errors) >= max_errors:
+                    # Budget spent - drop the chunks not yet started
+                    return line_errors[:max_errors]
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+        errors = [
+            f"Missing required section: {required}"
+            for required in PCXValidator.REQUIRED_SECTIONS
+            if required not in found
+        ]
+        return errors + line_errors
+
+    @staticmethod
+    def _chunk_boundaries(file_path: Path, chunk_count: int) -> List[int]:
+        """Byte offsets splitting the file on top-level ADD lines
+
+        Only a few boundaries per worker are needed, each one ``find``
+        from a target offset, so the block index is not used: loading
+        or building it costs a pass over every block.
+        """
+        with PCXScanner(file_path) as scanner:
+            size = scanner.size
+            target = max(size // max(chunk_count, 1), 1)
+            boundaries = [0]
+            while boundaries[-1] + target < size:
+                position = scanner.data.find(
+                    b'\nADD ', boundaries[-1] + target
+                )
+                if position == -1:
+                    break
+                boundaries.append(position + 1)
+            boundaries.append(size)
+        return boundaries
+
+    @staticmethod
+    def parse_blocks(file_path: Path) -> List[PCXBlock]:
+        """Parse PCX file into blocks
+
+        Repeated fields keep every value and RULECOMPONENTs are nested
+        under their RULE; use ``PCXBlock.as_dict()`` for the old shape.
+        """
+        return list(iter_blocks(file_path))
@@ -0,0 +1,213 @@
+"""Lightweight timing spans for the PCX hot paths
+
+Scanners, editors, validators and generators wrap their work in
+``span(phase, name)`` blocks that record wall time, bytes and blocks.
+Nothing is recorded until ``enable()`` is called; until then ``span``
+returns a shared no-op, so instrumented code costs one call.
+
+Spans nest - a copy inside a rewrite is recorded as a child. Phase
+totals use each span's own time without its children, and bytes and
+blocks only from the outermost span of a phase, so nothing is counted
+twice.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import json
+import time
+
+# Phases the tools report, in pipeline order
+PHASES = ('scan', 'copy', 'render', 'validate', 'commit')
+
+
+@dataclass
+class Span:
+    """One timed piece of work; use ``add`` to count what it processed"""
+    phase: str
+    name: str
+    byte_count: int = 0
+    block_count: int = 0
+    seconds: float = 0.0
+    depth: int = 0
+    child_seconds: float = 0.0
+    outermost: bool = True  # No enclosing span of the same phase
+    _start: float = field(default=0.0, repr=False)
+
+    def __enter__(self) -> 'Span':
+        self.depth = len(_stack)
+        self.outermost = all(item.phase != self.phase for item in _stack)
+        _stack.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.seconds = time.perf_counter() - self._start
+        _stack.pop()
+        if _stack:
+            _stack[-1].child_seconds += self.seconds
+        if _recorded is not None:
+            _recorded.append(self)
+
+    @property
+    def self_seconds(self) -> float:
+        """Time spent in this span outside any nested span"""
+        return max(self.seconds - self.child_seconds, 0.0)
+
+    def add(self, byte_count: int = 0, block_count: int = 0) -> None:
+        self.byte_count += byte_count
+        self.block_count += block_count
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            'phase': self.phase,
+            'name': self.name,
+            'seconds': round(self.seconds, 6),
+            'self_seconds': round(self.self_seconds, 6),
+            'bytes': self.byte_count,
+            'blocks': self.block_count,
+            'depth': self.depth,
+        }
+
+
+class _NullSpan:
+    """Stand-in returned by span() while profiling is off"""
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        pass
+
+    def add(self, byte_count: int = 0, block_count: int = 0) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+_recorded: Optional[List[Span]] = None
+_stack: List[Span] = []
+
+
+def enable() -> None:
+    """Start recording spans, discarding any recorded earlier"""
+    global _recorded
+    _recorded = []
+    _stack.clear()
+
+
+def disable() -> List[Span]:
+    """Stop recording, returning the spans recorded so far"""
+    global _recorded
+    recorded, _recorded = _recorded or [], None
+    return recorded
+
+
+def is_enabled() -> bool:
+    return _recorded is not None
+
+
+def spans() -> List[Span]:
+    """Spans recorded so far, in the order they finished"""
+    return list(_recorded or [])
+
+
+def span(
+    phase: str, name: str = '', byte_count: int = 0, block_count: int = 0
+):
+    """Time a block of work as part of a phase
+
+    Usage::
+
+        with span('scan', 'index build', byte_count=size) as timer:
+            ...
+            timer.add(block_count=len(entries))
+    """
+    if _recorded is None:
+        return _NULL_SPAN
+    return Span(phase, name or phase, byte_count, block_count)
+
+
+def summary(recorded: List[Span]) -> Dict[str, Dict[str, float]]:
+    """Totals per phase: calls, own seconds, bytes, blocks and MB/s
+
+    Throughput is measured over the outermost spans of each phase,
+    including time spent in spans nested inside them.
+    """
+    phases: Dict[str, Dict[str, float]] = {}
+    wall: Dict[str, float] = {}
+    for item in recorded:
+        totals = phases.setdefault(item.phase, {
+            'calls': 0, 'seconds': 0.0, 'bytes': 0, 'blocks': 0,
+        })
+        totals['calls'] += 1
+        totals['seconds'] += item.self_seconds
+        if item.outermost:
+            totals['bytes'] += item.byte_count
+            totals['blocks'] += item.block_count
+            wall[item.phase] = wall.get(item.phase, 0.0) + item.seconds
+
+    for phase, totals in phases.items():
+        seconds = max(wall.get(phase, 0.0), 1e-9)
+        megabytes = totals['bytes'] / (1024 * 1024)
+        totals['seconds'] = round(totals['seconds'], 6)
+        totals['mb_per_s'] = round(megabytes / seconds, 2)
+        totals['blocks_per_s'] = round(totals['blocks'] / seconds, 1)
+
+    order = {phase: position for position, phase in enumerate(PHASES)}
+    return dict(sorted(
+        phases.items(), key=lambda item: (order.get(item[0], 99), item[0])
+    ))
+
+
+def report(
+    recorded: List[Span], wall_seconds: Optional[float] = None
+) -> Dict[str, object]:
+    """JSON-ready report of every span and the phase totals"""
+    data: Dict[str, object] = {
+        'phases': summary(recorded),
+        'spans': [item.as_dict() for item in recorded],
+    }
+    if wall_seconds is not None:
+        data['wall_seconds'] = round(wall_seconds, 6)
+        data['untracked_seconds'] = round(max(wall_seconds - sum(
+            item.seconds for item in recorded if item.depth == 0
+        ), 0.0), 6)
+    return data
+
+
+def to_json(
+    recorded: List[Span], wall_seconds: Optional[float] = None
+) -> str:
+    return json.dumps(report(recorded, wall_seconds), indent=2)
+
+
+def format_table(
+    recorded: List[Span], wall_seconds: Optional[float] = None
+) -> str:
+    """Phase totals as a fixed-width table, busiest phase first"""
+    phases = summary(recorded)
+    lines = [
+        f"{'Phase':<10} {'Calls':>7} {'Seconds':>10} {'Share':>7} "
+        f"{'MB':>10} {'MB/s':>9} {'Blocks':>10}",
+        '-' * 69,
+    ]
+    tracked = sum(totals['seconds'] for totals in phases.values())
+    total = wall_seconds or tracked or 1e-9
+    for phase, totals in sorted(
+        phases.items(), key=lambda item: -item[1]['seconds']
+    ):
+        lines.append(
+            f"{phase:<10} {int(totals['calls']):>7} "
+            f"{totals['seconds']:>10.3f} "
+            f"{totals['seconds'] / total:>7.1%} "
+            f"{totals['bytes'] / (1024 * 1024):>10.1f} "
+            f"{totals['mb_per_s']:>9.1f} "
+            f"{int(totals['blocks']):>10}"
+        )
+    if wall_seconds is not None:
+        lines.append('-' * 69)
+        lines.append(
+            f"{'other':<10} {'':>7} "
+            f"{max(wall_seconds - tracked, 0.0):>10.3f}"
+        )
+        lines.append(f"{'total':<10} {'':>7} {wall_seconds:>10.3f}")
+    return '\n'.join(lines)
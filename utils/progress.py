@@ -0,0 +1,233 @@
+"""Byte progress reporting and cooperative cancellation
+
+Long file operations open a task with ``track(description, total)``
+and the copy and scan loops underneath report bytes with
+``advance(n)``, which counts towards the innermost open task. Updates
+(bytes done, total, throughput and ETA) reach the reporter at most
+every REPORT_INTERVAL seconds; tasks that finish sooner are never
+reported, and nothing is reported until a reporter is set.
+
+``cancel()`` - or the first Ctrl-C inside ``cancel_on_interrupt()`` -
+makes the next ``advance`` raise OperationCancelled. Rewrites go
+through atomic_write, so the exception unwinds through its cleanup and
+no temp file is left behind.
+"""
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, TextIO
+import signal
+import sys
+import threading
+import time
+
+REPORT_INTERVAL = 0.5  # Seconds between updates to the reporter
+
+
+class OperationCancelled(Exception):
+    """Raised inside an operation after cancel() was called"""
+
+
+@dataclass
+class ProgressUpdate:
+    """Snapshot of a task handed to the reporter"""
+    description: str
+    done: int
+    total: int
+    elapsed: float
+    finished: bool = False
+    stopped: bool = False  # Finished by an exception or cancellation
+
+    @property
+    def fraction(self) -> float:
+        return min(self.done / self.total, 1.0) if self.total else 1.0
+
+    @property
+    def rate(self) -> float:
+        """Bytes per second so far"""
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Seconds left at the current rate, if it can be estimated"""
+        if not self.rate or self.done >= self.total:
+            return None
+        return (self.total - self.done) / self.rate
+
+
+Reporter = Callable[[ProgressUpdate], None]
+
+
+class Task:
+    """A tracked operation; use as a context manager"""
+
+    def __init__(self, description: str, total: int) -> None:
+        self.description = description
+        self.total = total
+        self.done = 0
+        self._start = 0.0
+        self._next_report = 0.0
+        self._reported = False
+
+    def __enter__(self) -> 'Task':
+        self._start = time.monotonic()
+        self._next_report = self._start + REPORT_INTERVAL
+        _tasks.append(self)
+        return self
+
+    def __exit__(self, exc_type: object, *exc_info: object) -> None:
+        _tasks.remove(self)
+        if not _tasks:
+            # Cancellation ends with the outermost operation
+            _cancelled.clear()
+        if _reporter is not None and self._reported:
+            if exc_type is None:
+                self.done = max(self.done, self.total)
+            _reporter(self.update(
+                finished=True, stopped=exc_type is not None
+            ))
+
+    def advance(self, count: int) -> None:
+        self.done += count
+        if _reporter is not None:
+            now = time.monotonic()
+            if now >= self._next_report:
+                self._next_report = now + REPORT_INTERVAL
+                self._reported = True
+                _reporter(self.update())
+
+    def update(
+        self, finished: bool = False, stopped: bool = False
+    ) -> ProgressUpdate:
+        return ProgressUpdate(
+            self.description, self.done, self.total,
+            time.monotonic() - self._start, finished, stopped
+        )
+
+
+_reporter: Optional[Reporter] = None
+_tasks: List[Task] = []
+_cancelled = threading.Event()
+
+
+def set_reporter(reporter: Optional[Reporter]) -> None:
+    """Send progress updates to ``reporter``; None turns reporting off"""
+    global _reporter
+    _reporter = reporter
+
+
+def track(description: str, total: int) -> Task:
+    """Open a task that nested ``advance`` calls count towards"""
+    return Task(description, total)
+
+
+def advance(count: int) -> None:
+    """Count bytes towards the innermost task and honour cancellation"""
+    if _cancelled.is_set():
+        raise OperationCancelled("Operation cancelled")
+    if _tasks:
+        _tasks[-1].advance(count)
+
+
+def check_cancelled() -> None:
+    """Raise OperationCancelled if cancellation was requested"""
+    if _cancelled.is_set():
+        raise OperationCancelled("Operation cancelled")
+
+
+def cancel() -> None:
+    """Ask the running operation to stop at its next progress check"""
+    _cancelled.set()
+
+
+def is_busy() -> bool:
+    """Whether a tracked operation is running"""
+    return bool(_tasks)
+
+
+@contextmanager
+def cancel_on_interrupt() -> Iterator[None]:
+    """Turn Ctrl-C during a tracked operation into a clean cancel
+
+    The first Ctrl-C cancels the operation at its next progress check;
+    a second one, or any Ctrl-C while no operation is running (at a
+    prompt, say), raises KeyboardInterrupt as usual.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def handle(signum: int, frame: object) -> None:
+        if not _tasks or _cancelled.is_set():
+            raise KeyboardInterrupt
+        print("\nCancelling...", file=sys.stderr)
+        cancel()
+
+    previous = signal.signal(signal.SIGINT, handle)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGINT, previous)
+        _cancelled.clear()
+
+
+def format_bytes(count: float) -> str:
+    """Human readable size, e.g. 512B, 3.4MB, 1.25GB"""
+    if count < 1024:
+        return f"{count:.0f}B"
+    for unit in ('KB', 'MB'):
+        count /= 1024
+        if count < 1024:
+            return f"{count:.1f}{unit}"
+    return f"{count / 1024:.2f}GB"
+
+
+def format_seconds(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    return f"{minutes}m{seconds:02d}s" if minutes else f"{seconds}s"
+
+
+class ConsoleReporter:
+    """Print progress to a stream, usually stderr
+
+    On a terminal one line is redrawn in place; otherwise (logs, CI)
+    a plain line is printed at most every ``log_interval`` seconds.
+    """
+
+    def __init__(
+        self, stream: Optional[TextIO] = None, log_interval: float = 10.0
+    ) -> None:
+        self.stream = stream or sys.stderr
+        self.log_interval = log_interval
+        self.interactive = self.stream.isatty()
+        self._last_log = 0.0
+
+    def __call__(self, update: ProgressUpdate) -> None:
+        line = self.format(update)
+        if self.interactive:
+            end = '\n' if update.finished else ''
+            self.stream.write(f"\r{line:<79}{end}")
+        elif update.finished or (
+            time.monotonic() - self._last_log >= self.log_interval
+        ):
+            self._last_log = time.monotonic()
+            self.stream.write(line + '\n')
+        self.stream.flush()
+
+    @staticmethod
+    def format(update: ProgressUpdate) -> str:
+        line = (
+            f"{update.description}: {update.fraction:>4.0%} "
+            f"{format_bytes(update.done)}/{format_bytes(update.total)} "
+            f"{format_bytes(update.rate)}/s"
+        )
+        if update.stopped:
+            return f"{line} - stopped"
+        if update.finished:
+            return f"{line} in {format_seconds(update.elapsed)}"
+        if update.eta is not None:
+            line += f" ETA {format_seconds(update.eta)}"
+        return line